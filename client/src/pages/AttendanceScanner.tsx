@@ -13,6 +13,28 @@ interface ScanResult {
   recognitionMethod?: string;
 }
 
+// Default pause between frames; the server may ask for a longer one
+// (next_frame_ms in the scan response, Retry-After when it is overloaded)
+const SCAN_INTERVAL_MS = 500;
+
+// Stable id of this device. The server keeps vote windows, the frame gate,
+// face tracks and recently recognized students per kiosk; without it every
+// kiosk of a school shares one window.
+const KIOSK_ID_KEY = "kioskId";
+
+function getKioskId(): string {
+  let id = localStorage.getItem(KIOSK_ID_KEY);
+  if (!id) {
+    // randomUUID needs a secure context (https or localhost)
+    id =
+      typeof crypto !== "undefined" && typeof crypto.randomUUID === "function"
+        ? crypto.randomUUID()
+        : `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+    localStorage.setItem(KIOSK_ID_KEY, id);
+  }
+  return id;
+}
+
 const AttendanceScanner: React.FC = () => {
   const videoRef = useRef<HTMLVideoElement>(null);
   const canvasRef = useRef<HTMLCanvasElement>(null);
@@ -28,8 +50,9 @@ const AttendanceScanner: React.FC = () => {
   } | null>(null);
   const navigate = useNavigate();
 
-  async function captureAndScan() {
-    if (!videoRef.current || !canvasRef.current) return;
+  // Returns how long to wait before the next frame (ms)
+  async function captureAndScan(): Promise<number> {
+    if (!videoRef.current || !canvasRef.current) return SCAN_INTERVAL_MS;
 
     const video = videoRef.current;
     const canvas = canvasRef.current;
@@ -44,6 +67,9 @@ const AttendanceScanner: React.FC = () => {
       canvas.width = width;
       canvas.height = height;
 
+      // Monotonic clock: only the delay until sending is reported, never wall time
+      const capturedAt = performance.now();
+
       // Draw mirrored for processing to match display
       context.translate(width, 0);
       context.scale(-1, 1);
@@ -56,6 +82,8 @@ const AttendanceScanner: React.FC = () => {
       try {
         const response = await api.post("/attendance/scan", {
           image: imageBase64,
+          kiosk_id: getKioskId(),
+          capture_delay_ms: Math.round(performance.now() - capturedAt),
         });
 
         // Update Face Box if detected
@@ -123,10 +151,17 @@ const AttendanceScanner: React.FC = () => {
           });
           setTimeout(() => setLastScanResult(null), 3000);
         }
-      } catch (error) {
+        return Math.max(SCAN_INTERVAL_MS, response.data.next_frame_ms || 0);
+      } catch (error: any) {
+        if (error?.response?.status === 503) {
+          // Server is shedding frames: back off as asked
+          const retryAfter = Number(error.response.headers?.["retry-after"]) || 1;
+          return Math.max(SCAN_INTERVAL_MS, retryAfter * 1000);
+        }
         console.error("Scan error", error);
       }
     }
+    return SCAN_INTERVAL_MS;
   }
 
   useEffect(() => {
@@ -167,10 +202,10 @@ const AttendanceScanner: React.FC = () => {
     const scanLoop = async () => {
       if (!mounted || !isStreaming || !scanning) return;
 
-      await captureAndScan();
+      const delay = await captureAndScan();
 
       if (mounted && isStreaming && scanning) {
-        timeoutId = setTimeout(scanLoop, 500);
+        timeoutId = setTimeout(scanLoop, delay);
       }
     };
 
@@ -38,14 +38,28 @@ export interface StudentCreatePayload {
 
 export type StudentUpdatePayload = Partial<StudentCreatePayload>;
 
+// Face photos are embedded by the inference server (POST /students/{id}/faces);
+// the student record itself is plain CRUD on the API server.
+const enrollFaces = async (studentId: string | number, images: string[]) => {
+    if (images.length === 0) return undefined;
+    const response = await api.post(`/students/${studentId}/faces`, { photos: images });
+    return response.data.quality_summary;
+};
+
 export const createStudent = async (data: StudentCreatePayload) => {
-    const response = await api.post('/students/', data);
-    return response.data;
+    const { photos, ...student } = data;
+    const response = await api.post('/students/', student);
+    // Single profile photo only when no photo set was given (as before)
+    const images = photos?.length ? photos : data.photo_url?.startsWith('data:image') ? [data.photo_url] : [];
+    const quality_summary = await enrollFaces(data.student_id, images);
+    return quality_summary ? { ...response.data, quality_summary } : response.data;
 };
 
 export const updateStudent = async (id: number, data: StudentUpdatePayload) => {
-    const response = await api.put(`/students/${id}`, data);
-    return response.data;
+    const { photos, ...student } = data;
+    const response = await api.put(`/students/${id}`, student);
+    const quality_summary = await enrollFaces(data.student_id ?? id, photos || []);
+    return quality_summary ? { ...response.data, quality_summary } : response.data;
 };
 
 export const deleteStudent = async (id: number) => {
@@ -0,0 +1,159 @@
+"""
+Cascade search vs exact search: memory, latency and agreement.
+
+The gallery is one mean vector per identity from extract_embeddings output,
+optionally padded with random unit vectors to reach a large-tenant size
+(--gallery). Probes are single embeddings of real gallery identities, so the
+best match is meaningful. For every cascade mode the report gives:
+
+    top1_agreement     share of probes whose best candidate equals exact search
+    top2_agreement     same for the runner-up (what the MARGIN rule reads)
+    max_dist_error     largest |distance - exact distance| over best and second
+    ms_per_query       search latency per probe (batch of one, like /scan)
+    compressed_bytes   first-pass representation
+    exact_bytes        float32 vectors kept for the rerank
+
+Usage (from the repository root):
+    python -m server.benchmarks.cascade_search_benchmark --gallery 100000 --probes 500 \\
+        --modes pca,sq8,pq --shortlist 64 --out cascade.json
+"""
+import argparse
+import json
+import os
+import platform
+import time
+from datetime import datetime
+import numpy as np
+
+from server.ml.extract_embeddings import load_embeddings, DEFAULT_OUTPUT
+from server.controllers.attendance.cascade_search import CascadeIndex
+from server.controllers.attendance.face_cache import _import_faiss
+from server.benchmarks.recognition_benchmark import percentiles
+
+def normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.maximum(norms, 1e-8)).astype(np.float32)
+
+def build_gallery(embeddings_dir, size, probes, rng):
+    """Returns (gallery (n, d), probe vectors (p, d), probe gallery rows (p,))."""
+    matrix, identities, _ = load_embeddings(embeddings_dir)
+    matrix = normalize(np.asarray(matrix, dtype=np.float32))
+    names = sorted(set(identities))
+    rows = {name: np.flatnonzero(identities == name) for name in names}
+    gallery = normalize(np.stack([matrix[rows[name]].mean(axis=0) for name in names]))
+
+    probe_rows = rng.integers(0, len(matrix), size=probes)
+    name_to_row = {name: i for i, name in enumerate(names)}
+    probe_targets = np.array([name_to_row[identities[r]] for r in probe_rows])
+
+    if size > len(gallery):
+        filler = normalize(rng.standard_normal((size - len(gallery), gallery.shape[1])).astype(np.float32))
+        gallery = np.vstack([gallery, filler])
+    return gallery, matrix[probe_rows], probe_targets
+
+class ExactSearch:
+    """Flat inner-product search (FAISS IndexFlatIP when available, else numpy)."""
+    def __init__(self, gallery, faiss):
+        self.gallery = gallery
+        self.ntotal = len(gallery)
+        self.index = None
+        if faiss is not None:
+            self.index = faiss.IndexFlatIP(gallery.shape[1])
+            self.index.add(gallery)
+
+    def search(self, embs, k):
+        if self.index is not None:
+            return self.index.search(embs, k)
+        sims = embs @ self.gallery.T
+        rows = np.argsort(-sims, axis=1)[:, :k]
+        return np.take_along_axis(sims, rows, axis=1), rows
+
+    def memory_bytes(self):
+        return {"compressed_bytes": 0, "exact_bytes": int(self.gallery.nbytes)}
+
+def run(index, probes, warmup):
+    for q in probes[:warmup]:
+        index.search(q[None, :], 2)
+    latencies, sims, rows = [], [], []
+    for q in probes:
+        start = time.perf_counter()
+        D, I = index.search(q[None, :], 2)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        sims.append(D[0])
+        rows.append(I[0])
+    return np.array(sims), np.array(rows), latencies
+
+def main():
+    parser = argparse.ArgumentParser(description="Cascade vs exact gallery search")
+    parser.add_argument("--embeddings", default=DEFAULT_OUTPUT)
+    parser.add_argument("--gallery", type=int, default=100000, help="Gallery size after padding with random vectors")
+    parser.add_argument("--probes", type=int, default=500)
+    parser.add_argument("--modes", default="pca,sq8,pq")
+    parser.add_argument("--shortlist", type=int, default=64)
+    parser.add_argument("--pca-dim", type=int, default=32)
+    parser.add_argument("--pq-m", type=int, default=16)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    gallery, probes, targets = build_gallery(args.embeddings, args.gallery, args.probes, rng)
+    faiss = _import_faiss()
+    print(f"[INFO] gallery={len(gallery)} probes={len(probes)} faiss={'yes' if faiss else 'no'}")
+
+    exact = ExactSearch(gallery, faiss)
+    exact_sims, exact_rows, exact_lat = run(exact, probes, args.warmup)
+    results = [{
+        "mode": "exact",
+        "build_seconds": 0.0,
+        "top1_agreement": 1.0,
+        "top2_agreement": 1.0,
+        "max_dist_error": 0.0,
+        "top1_is_identity": round(float(np.mean(exact_rows[:, 0] == targets)), 4),
+        "ms_per_query": percentiles(exact_lat),
+        **exact.memory_bytes(),
+    }]
+
+    for mode in [m.strip() for m in args.modes.split(",") if m.strip()]:
+        start = time.perf_counter()
+        try:
+            index = CascadeIndex(gallery, mode, args.shortlist, pca_dim=args.pca_dim, pq_m=args.pq_m,
+                                 faiss=faiss if mode != "pca" else None)
+        except Exception as e:
+            print(f"[SKIP] {mode}: {e}")
+            continue
+        build_seconds = time.perf_counter() - start
+        sims, rows, lat = run(index, probes, args.warmup)
+        results.append({
+            "mode": mode,
+            "build_seconds": round(build_seconds, 3),
+            "top1_agreement": round(float(np.mean(rows[:, 0] == exact_rows[:, 0])), 4),
+            "top2_agreement": round(float(np.mean(rows[:, 1] == exact_rows[:, 1])), 4),
+            "max_dist_error": round(float(np.max(np.abs(sims - exact_sims))), 6),
+            "top1_is_identity": round(float(np.mean(rows[:, 0] == targets)), 4),
+            "ms_per_query": percentiles(lat),
+            **index.memory_bytes(),
+        })
+
+    for r in results:
+        print(f"[{r['mode']:5s}] p50={r['ms_per_query']['p50']}ms top1={r['top1_agreement']} "
+              f"top2={r['top2_agreement']} err={r['max_dist_error']} "
+              f"compressed={r['compressed_bytes'] / 1e6:.1f}MB exact={r['exact_bytes'] / 1e6:.1f}MB")
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "gallery": len(gallery),
+        "probes": len(probes),
+        "shortlist": args.shortlist,
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
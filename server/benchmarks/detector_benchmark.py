@@ -0,0 +1,108 @@
+"""
+Face detector speed/recall benchmark on dataset/DataSet.
+
+Every dataset image contains exactly one enrolled face, so "detection rate"
+is the share of images where the detector finds at least one face, and
+"single-face rate" the share where it finds exactly one. Each backend runs at
+each requested input size (longest side in pixels, 0 = original), and the
+report marks the Pareto-optimal (faster and/or higher recall) configurations.
+
+Usage (from the repository root):
+    python -m server.benchmarks.detector_benchmark --backends haar,yunet,ssd --sizes 0,320,480,640 --limit 500
+Pick a point, then set FACE_DETECTOR / FACE_DETECTOR_INPUT_SIZE or server/config/detectors.json.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import time
+from datetime import datetime
+
+from server.ml.extract_embeddings import list_dataset, DEFAULT_DATASET
+from server.utils.face_detectors import get_detector, available_detectors
+from server.benchmarks.recognition_benchmark import percentiles
+
+def load_images(dataset_dir, limit, seed):
+    import cv2
+    items = list_dataset(dataset_dir)
+    random.Random(seed).shuffle(items)
+    images = []
+    for _, path in items[:limit]:
+        img = cv2.imread(path)
+        if img is not None:
+            images.append(img)
+    return images
+
+def run_config(backend, input_size, images, warmup):
+    detector = get_detector(backend, input_size)
+    for img in images[:warmup]:
+        detector.detect(img)
+    latencies, detected, single = [], 0, 0
+    for img in images:
+        start = time.perf_counter()
+        boxes = detector.detect(img)
+        latencies.append((time.perf_counter() - start) * 1000.0)
+        detected += bool(boxes)
+        single += len(boxes) == 1
+    n = len(images)
+    return {
+        "backend": backend,
+        "input_size": input_size,
+        "detection_rate": round(detected / n, 4) if n else None,
+        "single_face_rate": round(single / n, 4) if n else None,
+        "ms_per_frame": percentiles(latencies),
+    }
+
+def mark_pareto(results):
+    """A config is Pareto-optimal if no other one is both faster (p50) and at least as accurate."""
+    for r in results:
+        r["pareto"] = not any(
+            o is not r
+            and o["ms_per_frame"]["p50"] <= r["ms_per_frame"]["p50"]
+            and o["detection_rate"] >= r["detection_rate"]
+            and (o["ms_per_frame"]["p50"] < r["ms_per_frame"]["p50"] or o["detection_rate"] > r["detection_rate"])
+            for o in results
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Face detector detection-rate vs latency")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--backends", default=",".join(available_detectors()))
+    parser.add_argument("--sizes", default="0,320,480,640", help="Comma-separated input sizes (0 = original)")
+    parser.add_argument("--limit", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    images = load_images(args.dataset, args.limit, args.seed)
+    print(f"[INFO] {len(images)} images")
+    results = []
+    for backend in [b.strip() for b in args.backends.split(",") if b.strip()]:
+        for size in [int(s) for s in args.sizes.split(",") if s.strip()]:
+            try:
+                result = run_config(backend, size, images, args.warmup)
+            except FileNotFoundError as e:
+                print(f"[SKIP] {backend}: {e}")
+                break
+            results.append(result)
+            print(f"[DET ] {backend:6s} size={size:4d} detected={result['detection_rate']} "
+                  f"single={result['single_face_rate']} p50={result['ms_per_frame']['p50']}ms")
+    mark_pareto(results)
+
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "images": len(images),
+        "results": sorted(results, key=lambda r: r["ms_per_frame"]["p50"]),
+    }
+    print("[INFO] Pareto-optimal:", [f"{r['backend']}@{r['input_size']}" for r in report["results"] if r["pareto"]])
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
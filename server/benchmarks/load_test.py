@@ -0,0 +1,265 @@
+"""
+HTTP load generator for /scan and the dashboard endpoints.
+
+Each kiosk is a thread posting recorded JPEG frames to /api/attendance/scan
+at a fixed rate (open loop: the schedule does not slow down when the server
+does). Dashboard users poll /stats, /logs, /students and /classes in parallel.
+The kiosk count is stepped through --stages. For each stage the generator
+reports latency histograms, percentiles and error rates, and flags the first
+stage where the server saturates.
+
+Run against a real server (MySQL + DeepFace) or the stand-in:
+    INFERENCE_BACKEND=stub python -m server.benchmarks.standin_server --frames-dir server/dataset/DataSet
+    python -m server.benchmarks.load_test --frames-dir server/dataset/DataSet --stages 1,2,4,8,16 --out load.json
+
+Against a real server, pass --username/--password (or --token).
+"""
+import argparse
+import base64
+import glob
+import http.client
+import json
+import os
+import threading
+import time
+import urllib.parse
+from datetime import datetime
+import numpy as np
+
+HISTOGRAM_BUCKETS_MS = [5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000]
+DASHBOARD_PATHS = [
+    "/api/attendance/stats",
+    "/api/attendance/logs?limit=50",
+    "/api/students/",
+    "/api/classes/",
+]
+
+class Recorder:
+    """Thread-safe latency/error collection per endpoint."""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}
+
+    def record(self, endpoint, latency_ms, ok, status):
+        with self.lock:
+            entry = self.samples.setdefault(endpoint, {"latencies": [], "errors": 0, "status": {}})
+            entry["latencies"].append(latency_ms)
+            if not ok:
+                entry["errors"] += 1
+            entry["status"][str(status)] = entry["status"].get(str(status), 0) + 1
+
+    def summary(self, duration):
+        out = {}
+        with self.lock:
+            for endpoint, entry in self.samples.items():
+                lat = np.asarray(entry["latencies"], dtype=np.float64)
+                count = int(lat.size)
+                counts, _ = np.histogram(lat, bins=[0] + HISTOGRAM_BUCKETS_MS + [np.inf])
+                out[endpoint] = {
+                    "requests": count,
+                    "rps": round(count / duration, 2) if duration > 0 else None,
+                    "errors": entry["errors"],
+                    "error_rate": round(entry["errors"] / count, 4) if count else 0.0,
+                    "status_codes": entry["status"],
+                    "latency_ms": {
+                        "p50": round(float(np.percentile(lat, 50)), 2) if count else None,
+                        "p90": round(float(np.percentile(lat, 90)), 2) if count else None,
+                        "p95": round(float(np.percentile(lat, 95)), 2) if count else None,
+                        "p99": round(float(np.percentile(lat, 99)), 2) if count else None,
+                        "max": round(float(lat.max()), 2) if count else None,
+                    },
+                    "histogram_ms": {
+                        (f"<={b}" if b != np.inf else f">{HISTOGRAM_BUCKETS_MS[-1]}"): int(c)
+                        for b, c in zip(HISTOGRAM_BUCKETS_MS + [np.inf], counts)
+                    },
+                }
+        return out
+
+class Client:
+    """One keep-alive HTTP connection per worker thread, like a real kiosk."""
+    def __init__(self, base_url, token, timeout):
+        parsed = urllib.parse.urlparse(base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port or (443 if parsed.scheme == "https" else 80)
+        self.https = parsed.scheme == "https"
+        self.timeout = timeout
+        self.headers = {"Authorization": f"Bearer {token}"} if token else {}
+        self.conn = None
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.https else http.client.HTTPConnection
+        self.conn = cls(self.host, self.port, timeout=self.timeout)
+
+    def request(self, method, path, body=None, headers=None):
+        if self.conn is None:
+            self._connect()
+        all_headers = dict(self.headers)
+        if headers:
+            all_headers.update(headers)
+        try:
+            self.conn.request(method, path, body=body, headers=all_headers)
+            resp = self.conn.getresponse()
+            data = resp.read()
+            return resp.status, data
+        except Exception:
+            # Drop the broken connection; the next call reconnects
+            try:
+                self.conn.close()
+            finally:
+                self.conn = None
+            raise
+
+def login(base_url, username, password, timeout):
+    client = Client(base_url, None, timeout)
+    body = urllib.parse.urlencode({"username": username, "password": password})
+    status, data = client.request("POST", "/api/auth/login", body=body,
+                                  headers={"Content-Type": "application/x-www-form-urlencoded"})
+    if status != 200:
+        raise SystemExit(f"Login failed ({status}): {data[:200]!r}")
+    return json.loads(data)["access_token"]
+
+def load_frames(frames_dir, limit):
+    paths = sorted(glob.glob(os.path.join(frames_dir, "**", "*.jpg"), recursive=True))[:limit]
+    if not paths:
+        raise SystemExit(f"No JPEG frames found under {frames_dir}")
+    payloads = []
+    for path in paths:
+        with open(path, "rb") as f:
+            b64 = "data:image/jpeg;base64," + base64.b64encode(f.read()).decode("ascii")
+        payloads.append(json.dumps({"image": b64}).encode("utf-8"))
+    return payloads
+
+def kiosk_worker(kiosk_no, args, token, payloads, recorder, stop_at, lag_samples):
+    client = Client(args.base_url, token, args.timeout)
+    interval = 1.0 / args.fps
+    next_send = time.perf_counter() + (kiosk_no % 10) * interval / 10.0
+    frame = kiosk_no * 7
+    while True:
+        now = time.perf_counter()
+        if now >= stop_at:
+            break
+        if now < next_send:
+            time.sleep(min(next_send - now, stop_at - now))
+            continue
+        # Open loop: how far behind schedule this frame is being sent
+        lag_samples.append((now - next_send) * 1000.0)
+        body = payloads[frame % len(payloads)]
+        frame += 1
+        start = time.perf_counter()
+        try:
+            status, _ = client.request("POST", "/api/attendance/scan", body=body,
+                                       headers={"Content-Type": "application/json"})
+            ok = status == 200
+        except Exception:
+            status, ok = "exception", False
+        recorder.record("scan", (time.perf_counter() - start) * 1000.0, ok, status)
+        next_send += interval
+
+def dashboard_worker(user_no, args, token, recorder, stop_at):
+    client = Client(args.base_url, token, args.timeout)
+    i = user_no
+    while time.perf_counter() < stop_at:
+        path = DASHBOARD_PATHS[i % len(DASHBOARD_PATHS)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            status, _ = client.request("GET", path)
+            ok = status == 200
+        except Exception:
+            status, ok = "exception", False
+        recorder.record(path.split("?")[0], (time.perf_counter() - start) * 1000.0, ok, status)
+        time.sleep(args.dashboard_interval)
+
+def run_stage(kiosks, args, token, payloads):
+    recorder = Recorder()
+    lag_samples = []
+    stop_at = time.perf_counter() + args.stage_duration
+    threads = [threading.Thread(target=kiosk_worker, args=(k, args, token, payloads, recorder, stop_at, lag_samples), daemon=True)
+               for k in range(kiosks)]
+    threads += [threading.Thread(target=dashboard_worker, args=(u, args, token, recorder, stop_at), daemon=True)
+                for u in range(args.dashboard_users)]
+    started = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join(args.stage_duration + args.timeout + 5)
+    duration = time.perf_counter() - started
+
+    endpoints = recorder.summary(duration)
+    scan = endpoints.get("scan", {"rps": 0.0, "error_rate": 1.0, "latency_ms": {"p95": None}})
+    offered = kiosks * args.fps
+    lag = np.asarray(lag_samples) if lag_samples else np.zeros(1)
+    saturated_reasons = []
+    if scan["latency_ms"]["p95"] is None or scan["latency_ms"]["p95"] > args.slo_p95_ms:
+        saturated_reasons.append("p95_over_slo")
+    if scan["error_rate"] > args.max_error_rate:
+        saturated_reasons.append("error_rate")
+    if (scan["rps"] or 0.0) < 0.9 * offered:
+        saturated_reasons.append("throughput_below_offered")
+    return {
+        "kiosks": kiosks,
+        "offered_scan_rps": offered,
+        "achieved_scan_rps": scan["rps"],
+        "schedule_lag_ms_p95": round(float(np.percentile(lag, 95)), 2),
+        "saturated": bool(saturated_reasons),
+        "saturation_reasons": saturated_reasons,
+        "endpoints": endpoints,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Kiosk + dashboard HTTP load generator")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    parser.add_argument("--token", default=None)
+    parser.add_argument("--username", default=None)
+    parser.add_argument("--password", default=None)
+    parser.add_argument("--frames-dir", required=True)
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--stages", default="1,2,4,8,16", help="Comma-separated kiosk counts")
+    parser.add_argument("--stage-duration", type=float, default=30.0)
+    parser.add_argument("--fps", type=float, default=2.0, help="Frames per second per kiosk")
+    parser.add_argument("--dashboard-users", type=int, default=2)
+    parser.add_argument("--dashboard-interval", type=float, default=5.0)
+    parser.add_argument("--slo-p95-ms", type=float, default=500.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--stop-on-saturation", action="store_true")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    token = args.token
+    if not token and args.username:
+        token = login(args.base_url, args.username, args.password, args.timeout)
+    payloads = load_frames(args.frames_dir, args.frames)
+
+    stages = []
+    saturation_point = None
+    for kiosks in [int(k) for k in args.stages.split(",") if k.strip()]:
+        print(f"[STAGE] {kiosks} kiosks x {args.fps} fps for {args.stage_duration}s ...")
+        result = run_stage(kiosks, args, token, payloads)
+        stages.append(result)
+        scan = result["endpoints"].get("scan", {})
+        print(f"        scan rps={result['achieved_scan_rps']} p95={scan.get('latency_ms', {}).get('p95')}ms "
+              f"errors={scan.get('error_rate')} saturated={result['saturated']} {result['saturation_reasons']}")
+        if result["saturated"] and saturation_point is None:
+            saturation_point = kiosks
+            if args.stop_on_saturation:
+                break
+
+    sustainable = [s["kiosks"] for s in stages if saturation_point is None or s["kiosks"] < saturation_point]
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "base_url": args.base_url,
+        "fps_per_kiosk": args.fps,
+        "slo_p95_ms": args.slo_p95_ms,
+        "saturation_kiosks": saturation_point,
+        "max_sustainable_kiosks": max(sustainable) if sustainable else 0,
+        "stages": stages,
+    }
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Results written to {args.out}")
+    print(f"[RESULT] max sustainable kiosks: {report['max_sustainable_kiosks']} (saturation at {saturation_point})")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""
+Accuracy-parity and latency benchmark: TensorFlow (DeepFace) vs ONNX Runtime Facenet.
+
+Two comparisons on dataset/DataSet:
+  embedder   identical preprocessed face crops go through the Keras model, the
+             fp32 ONNX model and (if present) the int8 ONNX model; reports
+             cosine similarity to the TF vector and batch-of-one latency.
+  pipeline   full represent() of each engine on the raw image (DeepFace detector
+             + alignment vs Haar + letterbox); reports detection rate and latency.
+Both report rank-1 leave-one-out identification accuracy per backend, so a
+drop in parity can be read as a drop in recognition quality.
+
+Usage (from the repository root, after python -m server.ml.export_onnx --int8):
+    python -m server.benchmarks.onnx_parity_benchmark --identities 50 --per-identity 5 --threads 2 --out onnx.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import time
+from datetime import datetime
+import numpy as np
+
+from server.ml.extract_embeddings import list_dataset, DEFAULT_DATASET
+from server.utils.embedding_engine import (
+    DeepFaceEngine, OnnxFacenetEngine, ONNX_MODEL_PATH, int8_model_path, preprocess_face
+)
+from server.utils.face_detectors import get_detector
+from server.benchmarks.recognition_benchmark import percentiles
+
+def sample_items(dataset_dir, identities, per_identity, seed):
+    by_id = {}
+    for identity, path in list_dataset(dataset_dir):
+        by_id.setdefault(identity, []).append(path)
+    rng = random.Random(seed)
+    chosen = sorted(i for i, paths in by_id.items() if len(paths) >= 2)
+    rng.shuffle(chosen)
+    items = []
+    for identity in chosen[:identities]:
+        for path in by_id[identity][:per_identity]:
+            items.append((identity, path))
+    return items
+
+def rank1_accuracy(embeddings, labels):
+    """Leave-one-out nearest neighbour on L2-normalized vectors."""
+    if len(embeddings) < 2:
+        return None
+    x = np.asarray(embeddings, dtype=np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True) + 1e-8
+    sims = x @ x.T
+    np.fill_diagonal(sims, -np.inf)
+    nearest = np.argmax(sims, axis=1)
+    labels = np.asarray(labels)
+    return round(float(np.mean(labels[nearest] == labels)), 4)
+
+def cosine_rows(a, b):
+    a = np.asarray(a, dtype=np.float32)
+    b = np.asarray(b, dtype=np.float32)
+    num = np.sum(a * b, axis=1)
+    den = np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1) + 1e-8
+    return num / den
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    out = fn(*args)
+    return out, (time.perf_counter() - start) * 1000.0
+
+def run_embedder(items, onnx_engines):
+    import cv2
+    from deepface import DeepFace
+
+    keras_model = DeepFace.build_model("Facenet")
+    keras_model = getattr(keras_model, "model", keras_model)
+    detector = get_detector("haar", 0)
+
+    crops, labels = [], []
+    for identity, path in items:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        boxes = detector.detect(img)
+        if not boxes:
+            continue
+        box = max(boxes, key=lambda b: (b[2] - b[0]) * (b[1] - b[3]))
+        crops.append(preprocess_face(img, box))
+        labels.append(identity)
+
+    outputs = {"tf": [], **{k: [] for k in onnx_engines}}
+    latency = {k: [] for k in outputs}
+    for crop in crops:
+        batch = crop[None, ...]
+        vec, ms = timed(lambda b: keras_model(b, training=False).numpy()[0], batch)
+        outputs["tf"].append(vec)
+        latency["tf"].append(ms)
+        for key, engine in onnx_engines.items():
+            vec, ms = timed(lambda b: engine.embed_batch(b)[0], batch)
+            outputs[key].append(vec)
+            latency[key].append(ms)
+
+    report = {"faces": len(crops), "backends": {}}
+    for key, vecs in outputs.items():
+        entry = {
+            "latency_ms": percentiles(latency[key]),
+            "rank1_accuracy": rank1_accuracy(vecs, labels),
+        }
+        if key != "tf" and vecs:
+            cos = cosine_rows(vecs, outputs["tf"])
+            entry["cosine_to_tf"] = {
+                "mean": round(float(cos.mean()), 6),
+                "min": round(float(cos.min()), 6),
+                "p1": round(float(np.percentile(cos, 1)), 6),
+            }
+        report["backends"][key] = entry
+    return report
+
+def run_pipeline(items, engines):
+    import cv2
+
+    report = {}
+    for key, engine in engines.items():
+        engine.load()
+        vecs, labels, latency, detected = [], [], [], 0
+        for identity, path in items:
+            img = cv2.imread(path)
+            if img is None:
+                continue
+            pairs, ms = timed(engine.represent, img)
+            latency.append(ms)
+            if pairs:
+                detected += 1
+                vecs.append(pairs[0][0])
+                labels.append(identity)
+        report[key] = {
+            "images": len(latency),
+            "detection_rate": round(detected / len(latency), 4) if latency else None,
+            "latency_ms": percentiles(latency),
+            "rank1_accuracy": rank1_accuracy(vecs, labels),
+        }
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description="TF vs ONNX Runtime Facenet parity/latency")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--model", default=ONNX_MODEL_PATH)
+    parser.add_argument("--identities", type=int, default=50)
+    parser.add_argument("--per-identity", type=int, default=5)
+    parser.add_argument("--threads", type=int, default=0, help="ONNX intra-op threads (0 = ORT default)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--skip-pipeline", action="store_true")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    items = sample_items(args.dataset, args.identities, args.per_identity, args.seed)
+    onnx_engines = {"fp32": OnnxFacenetEngine(args.model, int8=False, intra_op_threads=args.threads)}
+    if os.path.exists(int8_model_path(args.model)):
+        onnx_engines["int8"] = OnnxFacenetEngine(args.model, int8=True, intra_op_threads=args.threads)
+    else:
+        print("[WARNING] No int8 model found; run export_onnx --int8 to include it.")
+
+    print(f"[INFO] {len(items)} images, ONNX backends: {sorted(onnx_engines)}")
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "onnx_intra_op_threads": args.threads,
+        "images": len(items),
+        "embedder": run_embedder(items, onnx_engines),
+    }
+    if not args.skip_pipeline:
+        report["pipeline"] = run_pipeline(items, {"deepface": DeepFaceEngine(), **{f"onnx_{k}": v for k, v in onnx_engines.items()}})
+
+    for key, entry in report["embedder"]["backends"].items():
+        print(f"[EMBED] {key:5s} p50={entry['latency_ms']['p50']}ms rank1={entry['rank1_accuracy']} "
+              f"cos={entry.get('cosine_to_tf', {}).get('mean', '-')}")
+    for key, entry in report.get("pipeline", {}).items():
+        print(f"[PIPE ] {key:10s} p50={entry['latency_ms']['p50']}ms detected={entry['detection_rate']} rank1={entry['rank1_accuracy']}")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+End-to-end recognition accuracy and latency benchmark.
+
+Replays per-identity frame sequences built from dataset/DataSet through the
+same stages as scan_service.process_scan (decode -> detect/embed ->
+evaluate_embedding) against an in-memory gallery, so no MySQL is needed.
+A share of identities is kept out of the gallery to measure false accepts.
+
+Modes:
+    live         decode + DeepFace embedding for every probe frame (needs TensorFlow)
+    precomputed  reuse extract_embeddings output; only evaluate_embedding is timed
+
+Usage (from the repository root):
+    python -m server.benchmarks.recognition_benchmark --mode precomputed --out bench.json
+    python -m server.benchmarks.recognition_benchmark --mode live --identities 50 \\
+        --t-dist 0.45 --margin 0.05 --consensus 3 --window 5
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import random
+import time
+from datetime import datetime
+import numpy as np
+
+from server.controllers.attendance import decision_engine
+from server.controllers.attendance.face_cache import build_search_context
+from server.controllers.attendance.session_store import session_key, LocalSessionStore
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATASET = os.path.join(BASE_DIR, "dataset", "DataSet")
+DEFAULT_EMBEDDINGS_DIR = os.path.join(BASE_DIR, "ml", "output", "embeddings")
+BENCH_SCHOOL = "__bench__"
+
+def percentiles(values, qs=(50, 90, 95, 99)):
+    if not values:
+        return {f"p{q}": None for q in qs} | {"mean": None, "count": 0}
+    arr = np.asarray(values, dtype=np.float64)
+    out = {f"p{q}": round(float(np.percentile(arr, q)), 4) for q in qs}
+    out["mean"] = round(float(arr.mean()), 4)
+    out["count"] = int(arr.size)
+    return out
+
+class StageTimer:
+    """Collects per-stage latencies in milliseconds."""
+    def __init__(self):
+        self.samples = {}
+
+    def time(self, stage, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        self.samples.setdefault(stage, []).append((time.perf_counter() - start) * 1000.0)
+        return result
+
+    def report(self):
+        return {stage: percentiles(vals) for stage, vals in self.samples.items()}
+
+def apply_overrides(args):
+    """Patch decision parameters in place so runs with different settings can be compared."""
+    decision_engine.DEBUG_MODE = False
+    if args.t_dist is not None:
+        decision_engine.T_DIST = args.t_dist
+    if args.margin is not None:
+        decision_engine.MARGIN = args.margin
+    if args.consensus is not None:
+        decision_engine.CONSENSUS_COUNT = args.consensus
+    if args.window is not None:
+        decision_engine.WINDOW_SIZE = args.window
+        # Session ring buffers are sized when the store is created
+        decision_engine.sessions = LocalSessionStore(args.window)
+    if args.no_profiles:
+        decision_engine.identity_profiles = {}
+    return {
+        "T_DIST": decision_engine.T_DIST,
+        "T_STRICT_FALLBACK": decision_engine.T_STRICT_FALLBACK,
+        "MARGIN": decision_engine.MARGIN,
+        "CONSENSUS_COUNT": decision_engine.CONSENSUS_COUNT,
+        "WINDOW_SIZE": decision_engine.WINDOW_SIZE,
+        "UNKNOWN_FRAMES": decision_engine.UNKNOWN_FRAMES,
+        "profiles_loaded": len(decision_engine.identity_profiles),
+    }
+
+def load_dataset_index(args):
+    """Returns { identity: [(path, precomputed_row or None), ...] }."""
+    index = {}
+    if args.mode == "precomputed":
+        from server.ml.extract_embeddings import load_embeddings
+        matrix, identities, paths = load_embeddings(args.embeddings)
+        for row, (identity, path) in enumerate(zip(identities, paths)):
+            index.setdefault(str(identity), []).append((path, row))
+        return index, matrix
+    from server.ml.extract_embeddings import list_dataset
+    for identity, path in list_dataset(args.dataset):
+        index.setdefault(identity, []).append((path, None))
+    return index, None
+
+def split_identities(index, args, rng):
+    eligible = sorted(i for i, items in index.items() if len(items) > args.gallery_size)
+    rng.shuffle(eligible)
+    chosen = eligible[:args.identities]
+    n_impostors = int(round(len(chosen) * args.impostor_ratio))
+    return chosen[n_impostors:], chosen[:n_impostors]
+
+def embed_live(path, timer):
+    """decode + detect/embed exactly as the scan path does; returns list of embeddings."""
+    from server.utils import face_utils
+
+    with open(path, "rb") as f:
+        b64 = "data:image/jpeg;base64," + base64.b64encode(f.read()).decode("ascii")
+    img = timer.time("decode", face_utils.decode_base64_image, b64)
+    if img is None:
+        return []
+    pairs = timer.time("embed", face_utils.get_face_encodings_and_boxes_from_image, img)
+    return [emb for emb, _ in pairs]
+
+def frame_embeddings(item, matrix, args, timer):
+    path, row = item
+    if args.mode == "precomputed":
+        return [matrix[row]]
+    return embed_live(path, timer)
+
+def run_session(frames, matrix, args, context, timer):
+    """
+    Feed one person's frames until an ACCEPT/UNKNOWN decision.
+    Returns (decision, accepted_id, frames_used).
+    """
+    decision_engine.reset_history(session_key(BENCH_SCHOOL))
+    for n, item in enumerate(frames, start=1):
+        embs = frame_embeddings(item, matrix, args, timer)
+        for emb in embs:
+            result = timer.time("evaluate", decision_engine.evaluate_embedding, emb, BENCH_SCHOOL, context)
+            status = result.get("status")
+            if status == "ACCEPT":
+                return "ACCEPT", str(result["student_id"]), n
+            if status == "UNKNOWN":
+                return "UNKNOWN", None, n
+    return "TIMEOUT", None, len(frames)
+
+def build_gallery(index, enrolled, matrix, args):
+    grouped = {}
+    for identity in enrolled:
+        items = index[identity][:args.gallery_size]
+        if args.mode == "precomputed":
+            grouped[identity] = [matrix[row] for _, row in items]
+        else:
+            scratch = StageTimer()
+            embs = []
+            for item in items:
+                found = frame_embeddings(item, matrix, args, scratch)
+                if found:
+                    embs.append(found[0])
+            if embs:
+                grouped[identity] = embs
+    return build_search_context(grouped)
+
+def make_sequence(items, length, rng):
+    seq = list(items)
+    rng.shuffle(seq)
+    while len(seq) < length:
+        seq.extend(seq[:length - len(seq)])
+    return seq[:length]
+
+def run(args):
+    rng = random.Random(args.seed)
+    config = apply_overrides(args)
+    index, matrix = load_dataset_index(args)
+    enrolled, impostors = split_identities(index, args, rng)
+    if not enrolled:
+        raise SystemExit("No identities with enough images for the requested gallery size.")
+
+    t0 = time.perf_counter()
+    context = build_gallery(index, enrolled, matrix, args)
+    gallery_seconds = time.perf_counter() - t0
+
+    timer = StageTimer()
+    genuine = {"correct": 0, "wrong": 0, "no_accept": 0, "frames_to_accept": []}
+    impostor = {"accepted": 0, "rejected": 0}
+    frames_total = 0
+    t0 = time.perf_counter()
+
+    for identity in enrolled:
+        probes = index[identity][args.gallery_size:]
+        decision, accepted_id, used = run_session(make_sequence(probes, args.frames, rng), matrix, args, context, timer)
+        frames_total += used
+        if decision == "ACCEPT" and accepted_id == identity:
+            genuine["correct"] += 1
+            genuine["frames_to_accept"].append(used)
+        elif decision == "ACCEPT":
+            genuine["wrong"] += 1
+        else:
+            genuine["no_accept"] += 1
+
+    for identity in impostors:
+        decision, _, used = run_session(make_sequence(index[identity], args.frames, rng), matrix, args, context, timer)
+        frames_total += used
+        if decision == "ACCEPT":
+            impostor["accepted"] += 1
+        else:
+            impostor["rejected"] += 1
+
+    wall = time.perf_counter() - t0
+    n_gen = max(1, len(enrolled))
+    n_imp = len(impostors)
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "mode": args.mode,
+        "seed": args.seed,
+        "platform": {"python": platform.python_version(), "machine": platform.machine(), "cpus": os.cpu_count()},
+        "config": config,
+        "workload": {
+            "enrolled_identities": len(enrolled),
+            "impostor_identities": n_imp,
+            "gallery_size": args.gallery_size,
+            "frames_per_session": args.frames,
+            "gallery_build_seconds": round(gallery_seconds, 3),
+        },
+        "accuracy": {
+            "true_accept_rate": round(genuine["correct"] / n_gen, 4),
+            "false_reject_rate": round(genuine["no_accept"] / n_gen, 4),
+            "misidentification_rate": round(genuine["wrong"] / n_gen, 4),
+            "false_accept_rate": round(impostor["accepted"] / n_imp, 4) if n_imp else None,
+            "frames_to_accept": percentiles(genuine["frames_to_accept"]),
+        },
+        "latency_ms": timer.report(),
+        "throughput": {
+            "frames": frames_total,
+            "seconds": round(wall, 3),
+            "frames_per_second": round(frames_total / wall, 2) if wall > 0 else None,
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Recognition accuracy/latency benchmark")
+    parser.add_argument("--mode", choices=["live", "precomputed"], default="precomputed")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--embeddings", default=DEFAULT_EMBEDDINGS_DIR)
+    parser.add_argument("--identities", type=int, default=200)
+    parser.add_argument("--impostor-ratio", type=float, default=0.2)
+    parser.add_argument("--gallery-size", type=int, default=5, help="Enrollment images per identity")
+    parser.add_argument("--frames", type=int, default=10, help="Max frames per person session")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--t-dist", type=float, default=None)
+    parser.add_argument("--margin", type=float, default=None)
+    parser.add_argument("--consensus", type=int, default=None)
+    parser.add_argument("--window", type=int, default=None)
+    parser.add_argument("--no-profiles", action="store_true", help="Ignore identity_profiles.pkl")
+    parser.add_argument("--out", default=None, help="Write JSON results to this path")
+    args = parser.parse_args()
+
+    results = run(args)
+    text = json.dumps(results, indent=2)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text)
+        print(f"[INFO] Results written to {args.out}")
+    print(text)
+
+if __name__ == "__main__":
+    main()
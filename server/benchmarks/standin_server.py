@@ -0,0 +1,161 @@
+"""
+API server with an in-memory stand-in for the database, for load tests.
+
+Mounts the real attendance, student and class routers but swaps the DB-backed
+service functions for in-memory equivalents and bypasses JWT auth, so the web
+layer can be benchmarked without MySQL. Combine with INFERENCE_BACKEND=stub to
+take the model out of the picture as well.
+
+The gallery is enrolled from the same frames the load generator sends, so
+scans run the full decision path through to ACCEPT and mark_attendance.
+
+Usage (from the repository root):
+    INFERENCE_BACKEND=stub STUB_INFERENCE_LATENCY_MS=40 \\
+        python -m server.benchmarks.standin_server --frames-dir server/dataset/DataSet --frames 200
+"""
+import argparse
+import glob
+import os
+import threading
+from datetime import datetime
+import cv2
+from fastapi import FastAPI
+import uvicorn
+
+from server.config.security import get_current_user, get_current_admin
+from server.controllers import attendance_controller, student_controller, class_controller
+from server.controllers.attendance import scan_service, events_service, decision_engine
+from server.controllers.attendance.face_cache import build_search_context
+from server.routes import student_routes, class_routes
+from server.utils import face_utils
+
+STANDIN_SCHOOL_ID = 1
+STANDIN_USER = {"username": "loadtest", "role": "admin", "school_id": STANDIN_SCHOOL_ID}
+
+class InMemoryStore:
+    """Just enough state for the endpoints exercised by the load generator."""
+    def __init__(self, students, classes):
+        self.students = students
+        self.by_id = {s["student_id"]: s for s in students}
+        self.classes = classes
+        self.attendance = []
+        self.marked = {}
+        self.lock = threading.Lock()
+
+    def mark_attendance_batch(self, student_ids):
+        return {sid: self.mark_attendance(sid) for sid in dict.fromkeys(student_ids)}
+
+    def mark_attendance(self, student_id):
+        student = self.by_id.get(str(student_id))
+        if not student:
+            return {"status": "error", "message": "Öğrenci bulunamadı"}
+        now = datetime.now()
+        key = (student["student_id"], now.date())
+        with self.lock:
+            existing = self.marked.get(key)
+            if existing:
+                return {
+                    "status": "exists",
+                    "message": f"Daha önce yoklama alındı ({existing['timestamp'][11:16]})",
+                    "student_name": student["full_name"],
+                    "class_name": student["class_name"],
+                    "attendance_status": existing["status"]
+                }
+            row = {
+                "id": len(self.attendance) + 1,
+                "student_id": student["student_id"],
+                "full_name": student["full_name"],
+                "class_name": student["class_name"],
+                "timestamp": now.strftime('%Y-%m-%d %H:%M:%S'),
+                "status": "present"
+            }
+            self.attendance.append(row)
+            self.marked[key] = row
+        events_service.record_arrival(STANDIN_SCHOOL_ID, {
+            "student_id": row["student_id"], "student_name": row["full_name"],
+            "class_name": row["class_name"], "attendance_status": row["status"], "timestamp": row["timestamp"]
+        })
+        return {
+            "status": "success",
+            "message": "Yoklama başarıyla alındı",
+            "student_name": student["full_name"],
+            "class_name": student["class_name"],
+            "attendance_status": "present"
+        }
+
+    def get_attendance_logs(self, school_id, limit=100, cursor_token=None, **filters):
+        with self.lock:
+            items = list(reversed(self.attendance[-limit:]))
+        return {"items": items, "next_cursor": None, "total_estimate": len(self.attendance)}
+
+    def get_stats(self, school_id):
+        today = datetime.now().date()
+        with self.lock:
+            today_count = sum(1 for (_, day) in self.marked if day == today)
+        return {
+            "total_students": len(self.students),
+            "total_classes": len(self.classes),
+            "today_count": today_count,
+            "weekly_stats": []
+        }
+
+def enroll_frames(frames_dir, limit):
+    """One synthetic student per frame, embedded with the active inference backend."""
+    paths = sorted(glob.glob(os.path.join(frames_dir, "**", "*.jpg"), recursive=True))[:limit]
+    classes = [{"id": i + 1, "name": f"{9 + i // 4}-{'ABCD'[i % 4]}", "school_id": STANDIN_SCHOOL_ID} for i in range(16)]
+    students = []
+    grouped = {}
+    for i, path in enumerate(paths):
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        pairs = face_utils.get_face_encodings_and_boxes_from_image(img)
+        if not pairs:
+            continue
+        sid = str(100000 + i)
+        cls = classes[i % len(classes)]
+        students.append({
+            "id": sid, "student_id": sid, "full_name": f"Load Test {i}",
+            "class_id": cls["id"], "class_name": cls["name"], "school_id": STANDIN_SCHOOL_ID
+        })
+        grouped[sid] = [pairs[0][0]]
+    print(f"[INFO] Stand-in gallery: {len(students)} students from {len(paths)} frames.")
+    return students, classes, build_search_context(grouped)
+
+def create_app(store, context):
+    app = FastAPI(title="Attendance System API (stand-in DB)")
+
+    scan_service.get_cached_encodings = lambda school_id, force_refresh=False: context
+    scan_service.mark_attendance = store.mark_attendance
+    scan_service.mark_attendance_batch = store.mark_attendance_batch
+    scan_service.check_and_update_embedding = lambda *args, **kwargs: None
+    attendance_controller.get_attendance_logs = store.get_attendance_logs
+    attendance_controller.get_stats = store.get_stats
+    student_controller.get_all_students = lambda school_id: store.students
+    class_controller.get_all_classes = lambda school_id: store.classes
+
+    app.dependency_overrides[get_current_user] = lambda: STANDIN_USER
+    app.dependency_overrides[get_current_admin] = lambda: STANDIN_USER
+
+    app.include_router(student_routes.router, prefix="/api/students")
+    app.include_router(attendance_controller.router, prefix="/api/attendance")
+    app.include_router(attendance_controller.inference_router, prefix="/api/attendance")
+    app.include_router(class_routes.router, prefix="/api/classes")
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Stand-in API server for load testing")
+    parser.add_argument("--frames-dir", required=True)
+    parser.add_argument("--frames", type=int, default=200, help="Frames to enroll as students")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    decision_engine.DEBUG_MODE = False
+    students, classes, context = enroll_frames(args.frames_dir, args.frames)
+    app = create_app(InMemoryStore(students, classes), context)
+    print(f"[INFO] Inference backend: {face_utils.INFERENCE_BACKEND}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
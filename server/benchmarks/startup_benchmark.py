@@ -0,0 +1,98 @@
+"""
+Startup time and memory benchmark for the API and inference worker roles.
+
+Each run starts a fresh interpreter with SERVER_ROLE set, imports server.main
+(no DB access happens at import time) and reports wall time, RSS and which
+heavy ML modules got loaded. Inference runs also time face_utils.warmup(),
+i.e. what the startup hook pays before the first kiosk frame is served.
+
+Usage (from the repository root):
+    python -m server.benchmarks.startup_benchmark --repeats 5 --out startup.json
+    INFERENCE_BACKEND=stub python -m server.benchmarks.startup_benchmark --roles api,inference
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+from datetime import datetime
+import numpy as np
+
+HEAVY_MODULES = ["cv2", "faiss", "deepface", "tensorflow", "keras", "face_recognition", "dlib", "onnxruntime"]
+
+# Runs inside the child interpreter; prints one JSON line
+_PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+import server.main
+import_seconds = time.perf_counter() - start
+from server.utils import profiler
+result = {
+    "import_seconds": import_seconds,
+    "rss_after_import_bytes": profiler._rss_bytes(),
+    "heavy_modules_after_import": [m for m in HEAVY_MODULES if m in sys.modules],
+}
+if WARMUP:
+    from server.utils import face_utils
+    result["warmup_seconds"] = face_utils.warmup()
+    result["rss_after_warmup_bytes"] = profiler._rss_bytes()
+    result["heavy_modules_after_warmup"] = [m for m in HEAVY_MODULES if m in sys.modules]
+print("RESULT " + json.dumps(result))
+"""
+
+def run_once(role, warmup, cwd):
+    env = dict(os.environ, SERVER_ROLE=role)
+    code = f"HEAVY_MODULES = {HEAVY_MODULES!r}\nWARMUP = {bool(warmup)!r}\n" + _PROBE
+    proc = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith("RESULT "):
+            return json.loads(line[len("RESULT "):])
+    raise RuntimeError(f"{role} probe failed (exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+
+def summarize(runs):
+    out = {"runs": len(runs), "heavy_modules_after_import": runs[-1]["heavy_modules_after_import"]}
+    for key in ("import_seconds", "warmup_seconds"):
+        values = [r[key] for r in runs if key in r]
+        if values:
+            out[key] = {"median": round(float(np.median(values)), 3), "max": round(float(max(values)), 3)}
+    for key in ("rss_after_import_bytes", "rss_after_warmup_bytes"):
+        values = [r[key] for r in runs if r.get(key)]
+        if values:
+            out[key.replace("_bytes", "_mb")] = round(float(np.median(values)) / (1024 * 1024), 1)
+    if "heavy_modules_after_warmup" in runs[-1]:
+        out["heavy_modules_after_warmup"] = runs[-1]["heavy_modules_after_warmup"]
+    return out
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time / RSS per server role")
+    parser.add_argument("--roles", default="api,inference,all")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--no-warmup", action="store_true", help="Skip model warmup for the inference role")
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args()
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    report = {
+        "timestamp": datetime.now().isoformat(),
+        "python": sys.version.split()[0],
+        "inference_backend": os.environ.get("INFERENCE_BACKEND", "deepface"),
+        "roles": {},
+    }
+    for role in [r.strip() for r in args.roles.split(",") if r.strip()]:
+        warmup = role == "inference" and not args.no_warmup
+        print(f"[ROLE] {role} x{args.repeats} (warmup={warmup}) ...")
+        runs = [run_once(role, warmup, repo_root) for _ in range(args.repeats)]
+        summary = summarize(runs)
+        report["roles"][role] = summary
+        print(f"       import {summary['import_seconds']['median']}s, "
+              f"RSS {summary.get('rss_after_import_mb')} MB, heavy={summary['heavy_modules_after_import']}")
+        if "warmup_seconds" in summary:
+            print(f"       warmup {summary['warmup_seconds']['median']}s, RSS {summary.get('rss_after_warmup_mb')} MB")
+
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"[INFO] Results written to {args.out}")
+
+if __name__ == "__main__":
+    main()
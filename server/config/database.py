@@ -1,5 +1,7 @@
 import mysql.connector
 import sys
+import time
+from server.utils import metrics
 
 # Veritabanı bağlantı ayarları
 DB_CONFIG = {
@@ -11,12 +13,17 @@ DB_CONFIG = {
 
 def get_db_connection():
     """Veritabanı bağlantısı oluştur ve döndür"""
+    start = time.perf_counter()
     try:
         conn = mysql.connector.connect(**DB_CONFIG)
+        metrics.DB_CONNECTIONS.inc(result="ok")
         return conn
     except mysql.connector.Error as e:
+        metrics.DB_CONNECTIONS.inc(result="error")
         print(f"Hata: Veritabanına bağlanılamadı: {e}")
         return None
+    finally:
+        metrics.DB_CONNECT_SECONDS.observe(time.perf_counter() - start)
 
 def init_db():
     """Başlangıçta veritabanını ve tabloları başlat"""
@@ -195,6 +202,29 @@ def init_db():
             cursor.execute("ALTER TABLE users ADD FOREIGN KEY (school_id) REFERENCES schools(id) ON DELETE CASCADE")
         except mysql.connector.Error: pass
         
+        # Her yüz vektörünün hangi modelle üretildiğini kaydet (farklı modellerin vektörleri karşılaştırılamaz)
+        try:
+            cursor.execute("ALTER TABLE face_embeddings ADD COLUMN model_name VARCHAR(50)")
+        except mysql.connector.Error: pass
+
+        try:
+            cursor.execute("ALTER TABLE student_face_profile ADD COLUMN model_name VARCHAR(50)")
+        except mysql.connector.Error: pass
+
+        # Model etiketi olmayan eski vektörler aramaya girmez; tek seferlik geçiş betiği etiketler
+        try:
+            cursor.execute("SELECT COUNT(*) FROM face_embeddings WHERE model_name IS NULL OR model_name = 'untagged'")
+            untagged = cursor.fetchone()[0]
+            if untagged:
+                print(f"Uyarı: {untagged} yüz vektörünün model etiketi yok ve tanımada kullanılmıyor. "
+                      f"Etiketlemek için: python -m server.ml.migrate_embedding_tags --apply")
+        except mysql.connector.Error: pass
+
+        # Yoklama kayıtlarında keyset sayfalama için indeks
+        try:
+            cursor.execute("CREATE INDEX idx_attendance_school_ts ON attendance (school_id, timestamp, attendance_id)")
+        except mysql.connector.Error: pass
+
         conn.commit()
         conn.close()
         print("Veritabanı ve tablolar başarıyla başlatıldı.")
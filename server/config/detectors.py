@@ -0,0 +1,85 @@
+import json
+import os
+import threading
+
+# Yüz algılayıcı seçimi (kiosk > okul > varsayılan)
+# FACE_DETECTOR boş veya "native" ise gömme motorunun kendi algılayıcısı kullanılır
+# (deepface: DeepFace opencv + hizalama, onnx: tam çözünürlükte Haar).
+#
+# detectors.json örneği:
+# {
+#   "default": {"backend": "yunet", "input_size": 320},
+#   "schools": {"1": {"backend": "haar", "input_size": 480}},
+#   "kiosks":  {"giris-1": {"backend": "ssd"}}
+# }
+DEFAULT_DETECTOR = os.environ.get("FACE_DETECTOR", "native")
+DEFAULT_DETECTOR_INPUT_SIZE = os.environ.get("FACE_DETECTOR_INPUT_SIZE")
+DETECTOR_CONFIG_PATH = os.environ.get(
+    "DETECTOR_CONFIG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "detectors.json")
+)
+
+_config = {"mtime": None, "data": {}}
+_config_lock = threading.Lock()
+# Aynı uyarıyı her taramada tekrar yazmamak için
+_warned = set()
+
+def _load_config():
+    """detectors.json dosyasını okur; dosya değişirse yeniden yükler."""
+    try:
+        mtime = os.path.getmtime(DETECTOR_CONFIG_PATH)
+    except OSError:
+        return {}
+    if mtime != _config["mtime"]:
+        with _config_lock:
+            if mtime != _config["mtime"]:
+                try:
+                    with open(DETECTOR_CONFIG_PATH) as f:
+                        _config["data"] = json.load(f)
+                except (OSError, ValueError) as e:
+                    print(f"Hata: Algılayıcı ayarları okunamadı: {e}")
+                    _config["data"] = {}
+                _config["mtime"] = mtime
+    return _config["data"]
+
+def resolve_detector_settings(school_id=None, kiosk_id=None):
+    """(backend, input_size) döndürür; input_size None ise algılayıcının varsayılanı kullanılır."""
+    settings = {"backend": DEFAULT_DETECTOR}
+    if DEFAULT_DETECTOR_INPUT_SIZE:
+        settings["input_size"] = int(DEFAULT_DETECTOR_INPUT_SIZE)
+    config = _load_config()
+    settings.update(config.get("default", {}))
+    if school_id is not None:
+        settings.update(config.get("schools", {}).get(str(school_id), {}))
+    if kiosk_id:
+        settings.update(config.get("kiosks", {}).get(str(kiosk_id), {}))
+    return settings.get("backend") or "native", settings.get("input_size")
+
+def _usable_backend(backend):
+    """
+    Ayarlanan algılayıcı çalışamıyorsa (bilinmeyen ad, eksik model dosyası)
+    tarama 500 vermesin: uyarı yazılır ve Haar'a düşülür.
+    """
+    from server.utils.face_detectors import available_detectors, missing_model_files
+    if backend not in available_detectors():
+        reason = f"bilinmeyen algılayıcı (mevcut: {available_detectors()})"
+    else:
+        missing = missing_model_files(backend)
+        if not missing:
+            return backend
+        reason = f"model dosyası bulunamadı: {', '.join(missing)}"
+    if backend not in _warned:
+        _warned.add(backend)
+        print(f"Uyarı: '{backend}' algılayıcısı kullanılamıyor ({reason}); Haar kullanılıyor.")
+    return "haar"
+
+def get_detector_for(school_id=None, kiosk_id=None):
+    """Okul/kiosk için algılayıcı nesnesi; "native" ise None."""
+    backend, input_size = resolve_detector_settings(school_id, kiosk_id)
+    if backend == "native":
+        return None
+    from server.utils.face_detectors import get_detector
+    usable = _usable_backend(backend)
+    if usable != backend:
+        # Giriş boyutu diğer algılayıcı için seçilmişti; Haar kendi varsayılanını kullanır
+        return get_detector(usable)
+    return get_detector(backend, input_size)
@@ -0,0 +1,156 @@
+import asyncio
+import math
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from server.utils import metrics
+from .config import (
+    SCAN_MAX_IN_FLIGHT, SCAN_SCHOOL_QUEUE_LIMIT, SCAN_DEADLINE_SECONDS,
+    SCAN_MIN_FRAME_INTERVAL_MS, SCAN_MAX_FRAME_INTERVAL_MS
+)
+
+# Admission control for /scan (one controller per worker process).
+#
+# At most SCAN_MAX_IN_FLIGHT frames are processed at once. Further frames wait
+# in one FIFO queue per school, and a freed slot goes to the schools in turn
+# (round robin), so one busy school cannot starve the others. A frame is shed
+# instead of processed when it is already older than SCAN_DEADLINE_SECONDS,
+# when its school's queue is full, or when it is still waiting at the
+# deadline: by then the kiosk has newer frames. Runs on the event loop; the
+# scan itself is handed to the thread pool only after admission.
+
+ADMISSIONS = metrics.Counter(
+    "scan_admission_total",
+    "Scan frames by admission outcome (admitted, queued, shed_stale, shed_queue_full, shed_deadline).",
+    ["result"]
+)
+
+class ScanShed(Exception):
+    """Frame rejected by admission control; answer 503 with Retry-After."""
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class AdmissionController:
+    def __init__(self, max_in_flight=SCAN_MAX_IN_FLIGHT, queue_limit=SCAN_SCHOOL_QUEUE_LIMIT,
+                 deadline=SCAN_DEADLINE_SECONDS):
+        self.max_in_flight = max(1, max_in_flight)
+        self.queue_limit = queue_limit
+        self.deadline = deadline
+        self.in_flight = 0
+        # { school_id: deque of (future, frame_started_at) }, rotated for round robin
+        self.queues = OrderedDict()
+        self.service_ms = None  # moving average of scan processing time
+
+    def queued(self):
+        return sum(len(q) for q in self.queues.values())
+
+    def recommended_interval_ms(self):
+        """
+        Next-frame interval for kiosks: the time it takes to drain the work in
+        front of a new frame, never below SCAN_MIN_FRAME_INTERVAL_MS.
+        """
+        per_slot = (self.in_flight + self.queued()) / self.max_in_flight
+        interval = (self.service_ms or 0.0) * per_slot
+        return int(min(SCAN_MAX_FRAME_INTERVAL_MS, max(SCAN_MIN_FRAME_INTERVAL_MS, interval)))
+
+    def _shed(self, reason):
+        # Counted exactly once per frame: call it where the frame leaves (or never enters) the queue
+        ADMISSIONS.inc(result=f"shed_{reason}")
+        return ScanShed(reason, max(1, math.ceil(self.recommended_interval_ms() / 1000.0)))
+
+    def _dequeue(self, school_id, future):
+        """Remove a waiting frame from its school's queue (no-op if release() already popped it)."""
+        queue = self.queues.get(school_id)
+        entry = next((e for e in queue or () if e[0] is future), None)
+        if entry is not None:
+            queue.remove(entry)
+            if not queue:
+                del self.queues[school_id]
+
+    async def acquire(self, school_id, frame_age=0.0):
+        # frame_age: seconds the frame spent before this request arrived (kiosk-side delay)
+        started_at = time.monotonic() - frame_age
+        if frame_age > self.deadline:
+            raise self._shed("stale")
+        if self.in_flight < self.max_in_flight and not self.queues:
+            self.in_flight += 1
+            ADMISSIONS.inc(result="admitted")
+            return
+
+        queue = self.queues.setdefault(school_id, deque())
+        if len(queue) >= self.queue_limit:
+            if not queue:
+                del self.queues[school_id]
+            raise self._shed("queue_full")
+        future = asyncio.get_running_loop().create_future()
+        queue.append((future, started_at))
+        ADMISSIONS.inc(result="queued")
+
+        timeout = max(0.0, self.deadline - (time.monotonic() - started_at))
+        try:
+            # shield: on timeout we decide below whether the slot was already handed over
+            await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # release() got there first: it either granted the slot or shed (and counted) the frame
+                if future.exception() is None:
+                    return
+                raise future.exception()
+            future.cancel()
+            self._dequeue(school_id, future)
+            raise self._shed("deadline")
+        except asyncio.CancelledError:
+            # Client went away: give back a slot that was already granted
+            if future.done() and not future.cancelled() and future.exception() is None:
+                self.release()
+            else:
+                future.cancel()
+                self._dequeue(school_id, future)
+            raise
+
+    def release(self, service_seconds=None):
+        """Free a slot, or hand it straight to the next waiting frame (round robin over schools)."""
+        if service_seconds is not None:
+            ms = service_seconds * 1000.0
+            self.service_ms = ms if self.service_ms is None else 0.8 * self.service_ms + 0.2 * ms
+        now = time.monotonic()
+        while self.queues:
+            school_id, queue = next(iter(self.queues.items()))
+            future, started_at = queue.popleft()
+            if queue:
+                self.queues.move_to_end(school_id)
+            else:
+                del self.queues[school_id]
+            if future.done():
+                continue
+            if now - started_at > self.deadline:
+                future.set_exception(self._shed("deadline"))
+                continue
+            future.set_result(True)
+            ADMISSIONS.inc(result="admitted")
+            return
+        self.in_flight -= 1
+
+    @asynccontextmanager
+    async def slot(self, school_id, frame_age=0.0):
+        await self.acquire(school_id, frame_age)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.release(time.perf_counter() - start)
+
+scan_admission = AdmissionController()
+
+metrics.Gauge(
+    "scan_admission_in_flight",
+    "Scan frames being processed by this worker.",
+    callback=lambda: scan_admission.in_flight
+)
+metrics.Gauge(
+    "scan_admission_queued",
+    "Scan frames waiting for admission in this worker.",
+    callback=scan_admission.queued
+)
@@ -0,0 +1,85 @@
+import numpy as np
+
+# Two-stage search for large galleries.
+#
+# Pass 1 scores every student against a compressed copy of the gallery and
+# keeps a shortlist; pass 2 recomputes exact float32 cosine similarities for
+# the shortlist only, so the best / second-best distances used by the MARGIN
+# rule are exact whenever the true neighbours made the shortlist.
+#
+# Compressed representations (CASCADE_MODE):
+#     pca   gallery projected on its top CASCADE_PCA_DIM principal directions (numpy)
+#     sq8   FAISS 8-bit scalar quantizer, 1 byte per dimension
+#     pq    FAISS product quantizer, CASCADE_PQ_M bytes per vector (needs training data)
+
+class CascadeIndex:
+    def __init__(self, matrix, mode, shortlist, pca_dim=32, pq_m=16, faiss=None):
+        """matrix: (n, d) L2-normalized float32 gallery vectors."""
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.mode = mode
+        self.shortlist = shortlist
+        self.ntotal = len(self.matrix)
+        d = self.matrix.shape[1]
+        self._projection = None
+        self._reduced = None
+        self._index = None
+
+        if mode == "pca":
+            # Uncentered PCA (SVD) keeps inner products comparable after projection
+            _, _, vt = np.linalg.svd(self.matrix, full_matrices=False)
+            self._projection = np.ascontiguousarray(vt[:pca_dim].T, dtype=np.float32)
+            self._reduced = self.matrix @ self._projection
+        elif mode in ("sq8", "pq"):
+            if faiss is None:
+                raise RuntimeError(f"Cascade mode '{mode}' needs FAISS")
+            if mode == "sq8":
+                index = faiss.IndexScalarQuantizer(d, faiss.ScalarQuantizer.QT_8bit, faiss.METRIC_INNER_PRODUCT)
+            else:
+                index = faiss.IndexPQ(d, pq_m, 8, faiss.METRIC_INNER_PRODUCT)
+            index.train(self.matrix)
+            index.add(self.matrix)
+            self._index = index
+        else:
+            raise ValueError(f"Unknown cascade mode '{mode}' (pca, sq8, pq)")
+
+    def _first_pass(self, embs, shortlist):
+        """(N, shortlist) gallery rows with the highest approximate similarity."""
+        if self._index is not None:
+            _, rows = self._index.search(embs, shortlist)
+            return rows
+        scores = (embs @ self._projection) @ self._reduced.T
+        if shortlist >= self.ntotal:
+            return np.argsort(-scores, axis=1)
+        return np.argpartition(-scores, shortlist - 1, axis=1)[:, :shortlist]
+
+    def search(self, embs, k):
+        """
+        Same contract as faiss_index.search on an IndexFlatIP:
+        returns (similarities, rows), both (N, k), best first, -1 where missing.
+        """
+        embs = np.ascontiguousarray(embs, dtype=np.float32)
+        shortlist = min(max(self.shortlist, k), self.ntotal)
+        rows = self._first_pass(embs, shortlist)
+
+        # Exact rerank of the shortlist against the float32 vectors
+        valid = rows >= 0
+        candidates = self.matrix[np.where(valid, rows, 0)]
+        sims = np.einsum("nsd,nd->ns", candidates, embs)
+        sims[~valid] = -np.inf
+
+        k = min(k, shortlist)
+        order = np.argsort(-sims, axis=1, kind="stable")[:, :k]
+        top_sims = np.take_along_axis(sims, order, axis=1)
+        top_rows = np.take_along_axis(rows, order, axis=1)
+        missing = ~np.isfinite(top_sims)
+        top_rows[missing] = -1
+        top_sims[missing] = 0.0
+        return top_sims, top_rows
+
+    def memory_bytes(self):
+        """Bytes of the compressed first pass and of the exact vectors kept for reranking."""
+        if self._index is not None:
+            compressed = int(self._index.sa_code_size()) * self.ntotal
+        else:
+            compressed = self._reduced.nbytes + self._projection.nbytes
+        return {"compressed_bytes": int(compressed), "exact_bytes": int(self.matrix.nbytes)}
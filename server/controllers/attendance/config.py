@@ -1,3 +1,5 @@
+import os
+
 T_CONF = 0.55
 T_DIST = 0.50  # Search Radius (Loose)
 T_STRICT_FALLBACK = 0.32  # Safety Net for Unprofiled (Strict)
@@ -8,3 +10,49 @@ IGNORE_CONF = True
 STRICT_MODE = True
 MARGIN = 0.04
 UNKNOWN_FRAMES = 6
+SEARCH_TOP_K = int(os.environ.get("SEARCH_TOP_K", "2"))  # neighbours per query (rules use the best two)
+
+# Cascade search for large galleries (see cascade_search): compressed first pass + exact rerank
+CASCADE_MODE = os.environ.get("CASCADE_MODE", "")  # "", "pca", "sq8" or "pq"; empty = exact search only
+CASCADE_MIN_VECTORS = int(os.environ.get("CASCADE_MIN_VECTORS", "20000"))  # smaller schools keep exact search
+CASCADE_SHORTLIST = int(os.environ.get("CASCADE_SHORTLIST", "64"))  # candidates reranked exactly per query
+CASCADE_PCA_DIM = int(os.environ.get("CASCADE_PCA_DIM", "32"))
+CASCADE_PQ_M = int(os.environ.get("CASCADE_PQ_M", "16"))  # PQ sub-quantizers (bytes per vector)
+
+# Frame change gating (per kiosk; needs kiosk_id in the scan request)
+FRAME_GATE_ENABLED = os.environ.get("FRAME_GATE_ENABLED", "1") == "1"
+FRAME_GATE_DIFF_THRESHOLD = float(os.environ.get("FRAME_GATE_DIFF_THRESHOLD", "3.0"))  # mean |gray diff| (0-255) on a 32x24 thumbnail
+FRAME_GATE_MAX_REUSE_SECONDS = float(os.environ.get("FRAME_GATE_MAX_REUSE_SECONDS", "3.0"))  # re-process a static scene at least this often
+FRAME_GATE_IDLE_TTL_SECONDS = 600  # forget kiosks that stopped sending frames
+# kiosk_id comes from the client: per-kiosk maps (frame gate, tracker, recent identities) keep at most this many
+KIOSK_STATE_MAX_ENTRIES = int(os.environ.get("KIOSK_STATE_MAX_ENTRIES", "2000"))
+
+# Decision sessions (vote windows per school / kiosk / track), see session_store
+SESSION_STORE_URL = os.environ.get("SESSION_STORE_URL", "")  # e.g. redis://localhost:6379/0; empty = in-process
+SESSION_IDLE_TTL_SECONDS = int(os.environ.get("SESSION_IDLE_TTL_SECONDS", "300"))
+SESSION_MAX_ENTRIES = int(os.environ.get("SESSION_MAX_ENTRIES", "10000"))  # memory cap of the in-process store
+
+# Recently accepted students per kiosk (see recent_identities)
+RECENT_IDENTITY_ENABLED = os.environ.get("RECENT_IDENTITY_ENABLED", "1") == "1"
+RECENT_IDENTITY_TTL_SECONDS = float(os.environ.get("RECENT_IDENTITY_TTL_SECONDS", "10"))  # since the last match
+RECENT_IDENTITY_MAX_DIST = 0.25     # cosine distance; stricter than T_STRICT_FALLBACK
+RECENT_IDENTITY_MAX_PER_KIOSK = 8
+
+# ROI quality gate (blur / brightness / size) before a scanned face is embedded
+SCAN_QUALITY_GATE = os.environ.get("SCAN_QUALITY_GATE", "1") == "1"
+
+# Face tracking (per kiosk; needs kiosk_id in the scan request)
+TRACKING_ENABLED = os.environ.get("TRACKING_ENABLED", "1") == "1"
+TRACK_IOU_THRESHOLD = 0.3           # min IoU to continue a track
+TRACK_CENTROID_MAX_SHIFT = 0.5      # else: centroid moved less than this x box width
+TRACK_MAX_IDLE_SECONDS = 5.0        # track ends when unseen this long (> FRAME_GATE_MAX_REUSE_SECONDS: gated frames skip the tracker)
+TRACK_QUALITY_GAIN = 1.2            # re-embed when the face box grows by this factor
+TRACK_REEMBED_PENDING = int(os.environ.get("TRACK_REEMBED_PENDING", "1"))   # undecided track: embed every N frames (each embedding is one vote)
+TRACK_REEMBED_DECIDED = int(os.environ.get("TRACK_REEMBED_DECIDED", "10"))  # decided track: re-check identity every N frames
+
+# /scan admission control, per worker (see admission)
+SCAN_MAX_IN_FLIGHT = int(os.environ.get("SCAN_MAX_IN_FLIGHT", str(os.cpu_count() or 4)))  # frames processed at once
+SCAN_SCHOOL_QUEUE_LIMIT = int(os.environ.get("SCAN_SCHOOL_QUEUE_LIMIT", "8"))  # waiting frames per school
+SCAN_DEADLINE_SECONDS = float(os.environ.get("SCAN_DEADLINE_SECONDS", "1.5"))  # older frames are shed, not processed
+SCAN_MIN_FRAME_INTERVAL_MS = 200    # recommended next-frame interval bounds
+SCAN_MAX_FRAME_INTERVAL_MS = 3000
@@ -1,48 +1,163 @@
 import os
 import pickle
 import numpy as np
-from server.utils import face_utils
-from .config import T_DIST, T_STRICT_FALLBACK, MARGIN, DEBUG_MODE, UNKNOWN_FRAMES
+from server.utils import face_utils, metrics
+from .config import T_DIST, T_STRICT_FALLBACK, MARGIN, DEBUG_MODE, UNKNOWN_FRAMES, SEARCH_TOP_K
+from . import session_store
 
 # Paths to model files
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 IDENTITY_PROFILES_PATH = os.path.join(BASE_DIR, "ml", "output", "identity_profiles.pkl")
 
 # Load Identity Profiles (Decision Model)
+# Built by: python -m server.ml.build_profiles
 identity_profiles = {}
-try:
-    if os.path.exists(IDENTITY_PROFILES_PATH):
-        with open(IDENTITY_PROFILES_PATH, 'rb') as f:
-            identity_profiles = pickle.load(f)
-        print(f"[INFO] Loaded {len(identity_profiles)} identity profiles (Verification Model).")
-    else:
-        print(f"[WARNING] Identity profiles not found at {IDENTITY_PROFILES_PATH}. Using Distance-Only fallback.")
-except Exception as e:
-    print(f"[ERROR] Failed to load identity profiles: {e}")
+
+def reload_identity_profiles():
+    """(Re)load identity_profiles.pkl, e.g. after an incremental profile rebuild."""
+    global identity_profiles
+    try:
+        if os.path.exists(IDENTITY_PROFILES_PATH):
+            with open(IDENTITY_PROFILES_PATH, 'rb') as f:
+                identity_profiles = pickle.load(f)
+            print(f"[INFO] Loaded {len(identity_profiles)} identity profiles (Verification Model).")
+        else:
+            print(f"[WARNING] Identity profiles not found at {IDENTITY_PROFILES_PATH}. Using Distance-Only fallback.")
+    except Exception as e:
+        print(f"[ERROR] Failed to load identity profiles: {e}")
+    return len(identity_profiles)
+
+reload_identity_profiles()
 
 # Sliding Window Settings
 WINDOW_SIZE = 5
 CONSENSUS_COUNT = 3
 
-# State: { school_id: [ (candidate_id, decision_type), ... ] }
-# decision_type: "verified", "rejected"
-temporal_history = {}
+# Vote windows and unknown streaks, one session per (school_id, kiosk_id, track_id)
+# Observation status: "verified", "reject_..."
+sessions = session_store.create_store(WINDOW_SIZE)
 
-# Unknown State: { school_id: consecutive_unknown_count }
-unknown_state = {}
+metrics.Gauge(
+    "decision_sessions_active",
+    "Decision sessions held in the in-process session store.",
+    callback=lambda: sessions.stats().get("sessions", 0)
+)
 
-def evaluate_embedding(embedding, school_id, search_context):
-    global temporal_history, unknown_state
-    
+def reset_history(history_key):
+    """Forget the votes of one session (e.g. a face track that left the frame)."""
+    sessions.reset(history_key)
+
+def evaluate_embedding(embedding, school_id, search_context, history_key=None):
+    """
+    Search + decision for one embedding. Votes are accumulated in the session
+    `history_key` (session_store.session_key; defaults to the whole school).
+    """
+    return evaluate_embeddings([embedding], school_id, search_context, [history_key])[0]
+
+def evaluate_embeddings(embeddings, school_id, search_context, history_keys=None):
+    """
+    evaluate_embedding for every face of one frame: evaluate_batch for the
+    search and decision rules, then each row's observation is added to its
+    session (`history_keys`, default: the school for all rows) in order.
+    """
+    if not len(embeddings):
+        return []
+    rows = evaluate_batch(embeddings, search_context)
+
+    results = []
+    with metrics.stage("decision"):
+        for i, row in enumerate(rows):
+            key = history_keys[i] if history_keys is not None else None
+            if key is None:
+                key = session_store.session_key(school_id)
+            result = _apply_temporal(row, key)
+            _count_decision(result, row["observation"])
+            results.append(result)
+    return results
+
+def evaluate_batch(embeddings, search_context, k=SEARCH_TOP_K):
+    """
+    Stateless decisions for an (N, 128) batch: one index search for the top-k
+    neighbours of every row, then the distance, margin and profile-threshold
+    rules as array operations. Nothing is written to any session, so this is
+    also usable for enrollment checks and offline replay.
+
+    Returns one dict per row:
+        candidate_id   best match (None if the gallery is empty)
+        dist           cosine distance to it
+        second_dist    distance to the runner-up (10.0 if none)
+        observation    "verified", "reject_ambiguous_or_dist", "reject_profile" or None
+        neighbors      [(candidate_id, dist), ...] up to k entries
+    """
+    if not len(embeddings):
+        return []
+    # Copy: rows are normalized in place below
+    embs = np.array(embeddings, dtype=np.float32).reshape(len(embeddings), -1)
     # Normalize input once
-    emb = face_utils.l2_normalize(embedding)
-    
-    # ----------------------------------------------------
-    # 1. Search (FAISS + Linear Fallback)
-    # ----------------------------------------------------
-    best_candidate_id = None
-    best_candidate_dist = 10.0 # Large init
-    second_best_dist = 10.0
+    norms = np.linalg.norm(embs, axis=1, keepdims=True)
+    embs = np.divide(embs, norms + 1e-8, out=embs, where=norms > 0)
+
+    with metrics.stage("search"):
+        ids, dists = _search_batch(embs, search_context, max(2, k))
+
+    with metrics.stage("decision_rules"):
+        n = len(embs)
+        best_ids = ids[:, 0]
+        best = dists[:, 0]
+        second = dists[:, 1]
+        has_candidate = np.array([bool(cid) for cid in best_ids], dtype=bool)
+
+        # Logic: Reject if (Dist > Global) OR (Margin < MARGIN)
+        ambiguous = (best > T_DIST) | ((second != 10.0) & ((second - best) < MARGIN))
+
+        # Passed Stage 1 -> specific profile threshold, else strict fallback
+        thresholds = np.full(n, T_STRICT_FALLBACK)
+        for i, cid in enumerate(best_ids):
+            profile = identity_profiles.get(str(cid)) if cid else None
+            if profile:
+                thresholds[i] = profile.get("threshold", T_DIST)
+        verified = ~ambiguous & (best <= thresholds)
+
+    rows = []
+    for i in range(n):
+        if not has_candidate[i]:
+            observation = None
+        elif ambiguous[i]:
+            observation = "reject_ambiguous_or_dist"
+        elif verified[i]:
+            observation = "verified"
+        else:
+            observation = "reject_profile"
+        rows.append({
+            "candidate_id": best_ids[i],
+            "dist": float(best[i]),
+            "second_dist": float(second[i]),
+            "threshold": float(thresholds[i]),
+            "observation": observation,
+            "neighbors": [(ids[i, j], float(dists[i, j])) for j in range(k) if ids[i, j] is not None],
+        })
+    return rows
+
+def _count_decision(result, observation):
+    status = result.get("status")
+    if status == "ACCEPT":
+        metrics.DECISIONS.inc(decision="accept")
+    elif status == "UNKNOWN":
+        metrics.DECISIONS.inc(decision="unknown")
+    elif observation and observation.startswith("reject"):
+        metrics.DECISIONS.inc(decision="reject")
+    else:
+        metrics.DECISIONS.inc(decision="pending")
+
+def _search_batch(embs, search_context, k):
+    """
+    1. Search (FAISS + Linear Fallback) for a batch of normalized embeddings.
+    Returns (ids, dists): (N, k) arrays of candidate ids (None where missing)
+    and cosine distances (10.0 where missing), best first.
+    """
+    n = len(embs)
+    ids = np.full((n, k), None, dtype=object)
+    dists = np.full((n, k), 10.0)
     
     # Check if we have FAISS index
     faiss_index = None
@@ -50,133 +165,74 @@ def evaluate_embedding(embedding, school_id, search_context):
     legacy_encodings = search_context
     
     if isinstance(search_context, dict) and "faiss_index" in search_context:
-        faiss_index = search_context.get("faiss_index")
+        # A cascade index answers the same search() calls as the flat FAISS index
+        faiss_index = search_context.get("cascade")
+        if faiss_index is None:
+            faiss_index = search_context.get("faiss_index")
         id_map = search_context.get("id_map", [])
         legacy_encodings = search_context.get("legacy_dict", {})
     
     if faiss_index is not None and len(id_map) > 0:
         # --- FAISS SEARCH ---
         try:
-            query_np = np.array([emb]).astype('float32')
-            k = 2 if faiss_index.ntotal >= 2 else 1
-            D, I = faiss_index.search(query_np, k)
-            
-            # Best Match
-            if k >= 1 and I[0][0] != -1:
-                idx = I[0][0]
-                sim = float(D[0][0])
-                sim = max(-1.0, min(1.0, sim))
-                best_candidate_dist = 1.0 - sim
-                if idx < len(id_map):
-                    best_candidate_id = id_map[idx]
-            
-            # Second Best Match
-            if k >= 2 and I[0][1] != -1:
-                sim2 = float(D[0][1])
-                sim2 = max(-1.0, min(1.0, sim2))
-                second_best_dist = 1.0 - sim2
-                
+            kk = min(k, faiss_index.ntotal)
+            D, I = faiss_index.search(np.ascontiguousarray(embs, dtype=np.float32), kk)
+            found = (I >= 0) & (I < len(id_map))
+            id_lookup = np.array(id_map + [None], dtype=object)
+            ids[:, :kk] = id_lookup[np.where(found, I, len(id_map))]
+            dists[:, :kk] = np.where(I >= 0, 1.0 - np.clip(D, -1.0, 1.0), 10.0)
+            return ids, dists
         except Exception as e:
             print(f"FAISS Search Error: {e}")
-            faiss_index = None 
-
-    if faiss_index is None:
-        # --- LINEAR SEARCH FALLBACK ---
-        for sid, mean_emb in legacy_encodings.items():
-            mean_emb_norm = face_utils.l2_normalize(mean_emb)
-            sim = face_utils.cosine_similarity(emb, mean_emb_norm)
-            dist = 1.0 - float(sim if sim >= 0.0 else 0.0)
-            
-            if dist < best_candidate_dist:
-                second_best_dist = best_candidate_dist
-                best_candidate_dist = dist
-                best_candidate_id = sid
-            elif dist < second_best_dist:
-                second_best_dist = dist
-            
+
+    # --- LINEAR SEARCH FALLBACK ---
+    # One matrix product for the whole batch; negative similarity counts as 0
+    if not legacy_encodings:
+        return ids, dists
+    keys = np.array(list(legacy_encodings.keys()) + [None], dtype=object)
+    matrix = np.array([face_utils.l2_normalize(v) for v in legacy_encodings.values()], dtype=np.float32)
+    all_dists = 1.0 - np.maximum(embs @ matrix.T, 0.0)
+    kk = min(k, matrix.shape[0])
+    order = np.argsort(all_dists, axis=1, kind="stable")[:, :kk]
+    ids[:, :kk] = keys[order]
+    dists[:, :kk] = np.take_along_axis(all_dists, order, axis=1)
+    return ids, dists
+
+def _apply_temporal(row, history_key):
+    """
+    3. Temporal smoothing: add one evaluate_batch row to its session.
+    Returns the result dict (ACCEPT / UNKNOWN / pending).
+    """
+    best_candidate_id = row["candidate_id"]
+    best_candidate_dist = row["dist"]
+    
     # If no candidate found (empty DB), reject
-    if not best_candidate_id:
+    if row["observation"] is None:
          return {"status": "pending", "message": "Veri yok"}
 
-    # ----------------------------------------------------
-    # 2. Decision Logic (Reverted)
-    # ----------------------------------------------------
-    
-    # Logic: Reject if (Dist > Global) OR (Margin < MARGIN)
-    if best_candidate_dist > T_DIST or (second_best_dist != 10.0 and (second_best_dist - best_candidate_dist) < MARGIN):
-         current_observation = (None, "reject_ambiguous_or_dist")
+    if row["observation"] == "reject_ambiguous_or_dist":
+         current_observation = (None, row["observation"])
          if DEBUG_MODE:
-             print(f"🚫 [Reject] Best={best_candidate_id} Dist={best_candidate_dist:.4f} Margin={second_best_dist - best_candidate_dist:.4f}")
-    
+             print(f"🚫 [Reject] Best={best_candidate_id} Dist={best_candidate_dist:.4f} Margin={row['second_dist'] - best_candidate_dist:.4f}")
     else:
-        # Passed Stage 1 -> Check Profile
-        is_verified = False
-        profile = identity_profiles.get(str(best_candidate_id))
-        
-        if profile:
-            # Check specific threshold
-            specific_threshold = profile.get("threshold", T_DIST)
-            if best_candidate_dist <= specific_threshold:
-                is_verified = True
-            else:
-                if DEBUG_MODE:
-                    print(f"🚫 [Profile Reject] ID={best_candidate_id} Dist={best_candidate_dist:.4f} > Specific={specific_threshold:.4f}")
-        else:
-            # Fallback strict
-            if best_candidate_dist <= T_STRICT_FALLBACK:
-                is_verified = True
-                if DEBUG_MODE: print(f"✅ [Fallback Pass] {best_candidate_dist:.4f}")
-            else:
-                 if DEBUG_MODE: print(f"🚫 [Fallback Fail] {best_candidate_dist:.4f}")
-        
-        if is_verified:
-            current_observation = (best_candidate_id, "verified")
-        else:
-            current_observation = (best_candidate_id, "reject_profile")
-
-    # ----------------------------------------------------
-    # 3. Temporal Smoothing
-    # ----------------------------------------------------
+        current_observation = (best_candidate_id, row["observation"])
+        if DEBUG_MODE and row["observation"] == "reject_profile":
+            print(f"🚫 [Profile Reject] ID={best_candidate_id} Dist={best_candidate_dist:.4f} > Threshold={row['threshold']:.4f}")
     
-    if school_id not in temporal_history:
-        temporal_history[school_id] = []
+    consensus_id, reject_count = sessions.observe(
+        history_key, current_observation[0], current_observation[1], CONSENSUS_COUNT
+    )
         
-    history = temporal_history[school_id]
-    history.append(current_observation)
-    
-    if len(history) > WINDOW_SIZE:
-        history.pop(0)
-        
-    # Consensus Check
-    counts = {}
-    for obs in history:
-        cid, status = obs
-        if status == "verified" and cid:
-            counts[cid] = counts.get(cid, 0) + 1
-            
-    final_decision_id = None
-    for cid, count in counts.items():
-        if count >= CONSENSUS_COUNT:
-            final_decision_id = cid
-            break
-            
-    # Unknown State Logic
-    if school_id not in unknown_state:
-        unknown_state[school_id] = 0
-        
-    if final_decision_id:
-        unknown_state[school_id] = 0
+    if consensus_id:
+        sessions.reset_unknown(history_key)
         # Clear history to prevent this user's frames from affecting the next user
-        temporal_history[school_id] = [] 
-        if DEBUG_MODE: print(f"✅ [ACCEPT] {final_decision_id}")
-        return {"status": "ACCEPT", "student_id": final_decision_id, "confidence": 1.0 - best_candidate_dist}
+        sessions.clear_votes(history_key)
+        if DEBUG_MODE: print(f"✅ [ACCEPT] {consensus_id}")
+        return {"status": "ACCEPT", "student_id": consensus_id, "confidence": 1.0 - best_candidate_dist}
     else:
-        reject_count = sum(1 for _, s in history if s.startswith("reject"))
         if reject_count >= CONSENSUS_COUNT:
-             unknown_state[school_id] += 1
-        
-        if unknown_state[school_id] > UNKNOWN_FRAMES:
-             unknown_state[school_id] = 0
-             return {"status": "UNKNOWN", "message": "Kişi tanınamadı"}
+             if sessions.incr_unknown(history_key) > UNKNOWN_FRAMES:
+                 sessions.reset_unknown(history_key)
+                 return {"status": "UNKNOWN", "message": "Kişi tanınamadı"}
              
         return {"status": "pending", "message": "Doğrulanıyor..."}
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from server.config.database import get_db_connection
+from server.utils import metrics
+
+# Live event settings
+SUBSCRIBER_QUEUE_SIZE = 100
+STATS_INTERVAL_SECONDS = 10
+HEARTBEAT_SECONDS = 25
+# The in-process counter only sees arrivals scanned by this worker; re-read the DB this often
+TODAY_COUNT_REFRESH_SECONDS = 60
+
+# State: { school_id: set(Subscriber) }
+_subscribers = {}
+# Today's arrival counter: { school_id: {"date": date, "count": int, "loaded_at": float} }
+_today_counts = {}
+_lock = threading.Lock()
+
+class Subscriber:
+    """
+    Bounded per-connection event queue.
+    Publishers run in worker threads, so the asyncio side is woken thread-safely.
+    """
+    def __init__(self, school_id, loop, maxsize=SUBSCRIBER_QUEUE_SIZE):
+        self.school_id = school_id
+        self.loop = loop
+        self.maxsize = maxsize
+        self.queue = deque()
+        self.dropped = 0
+        self.last_sent_count = None
+        self._lock = threading.Lock()
+        self._wakeup = asyncio.Event()
+
+    def push(self, event):
+        with self._lock:
+            if len(self.queue) >= self.maxsize:
+                # Slow consumer: drop the oldest event
+                self.queue.popleft()
+                self.dropped += 1
+            self.queue.append(event)
+        try:
+            self.loop.call_soon_threadsafe(self._wakeup.set)
+        except RuntimeError:
+            # Event loop already closed (client gone)
+            pass
+
+    async def next_events(self, timeout):
+        """Returns (queued events, events dropped since the last call)."""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+        with self._lock:
+            events = list(self.queue)
+            self.queue.clear()
+            dropped, self.dropped = self.dropped, 0
+        return events, dropped
+
+def subscribe(school_id, loop):
+    sub = Subscriber(school_id, loop)
+    with _lock:
+        _subscribers.setdefault(school_id, set()).add(sub)
+    return sub
+
+def unsubscribe(sub):
+    with _lock:
+        subs = _subscribers.get(sub.school_id)
+        if subs:
+            subs.discard(sub)
+            if not subs:
+                _subscribers.pop(sub.school_id, None)
+
+def subscriber_count(school_id=None):
+    with _lock:
+        if school_id is None:
+            return sum(len(s) for s in _subscribers.values())
+        return len(_subscribers.get(school_id, ()))
+
+metrics.Gauge(
+    "attendance_event_subscribers",
+    "Open live event (SSE) connections.",
+    callback=subscriber_count
+)
+
+def publish(school_id, event_type, data):
+    """Fan an event out to every subscriber of the school. Never blocks."""
+    with _lock:
+        subs = list(_subscribers.get(school_id, ()))
+    if not subs:
+        return
+    event = {"type": event_type, "data": data}
+    for sub in subs:
+        sub.push(event)
+
+def _load_today_count(school_id):
+    conn = get_db_connection()
+    if not conn: return 0
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COUNT(DISTINCT student_id) FROM attendance WHERE school_id = %s AND timestamp >= %s",
+            (school_id, datetime.combine(datetime.now().date(), datetime.min.time()))
+        )
+        row = cursor.fetchone()
+        return int(row[0]) if row else 0
+    except Exception as e:
+        print(f"Error loading today count: {e}")
+        return 0
+    finally:
+        conn.close()
+
+def get_today_count(school_id):
+    """
+    Today's arrival count. Read from the DB on first use, at midnight and
+    every TODAY_COUNT_REFRESH_SECONDS; in between, record_arrival() keeps it
+    current for arrivals scanned by this worker process. Arrivals handled by
+    other workers therefore show up within one refresh interval.
+    """
+    today = datetime.now().date()
+    now = time.time()
+    with _lock:
+        entry = _today_counts.get(school_id)
+        if entry and entry["date"] == today and now - entry["loaded_at"] < TODAY_COUNT_REFRESH_SECONDS:
+            return entry["count"]
+    count = _load_today_count(school_id)
+    with _lock:
+        entry = _today_counts.get(school_id)
+        if entry and entry["date"] == today and entry["loaded_at"] > now:
+            # Another caller refreshed while we were querying
+            return entry["count"]
+        _today_counts[school_id] = {"date": today, "count": count, "loaded_at": time.time()}
+    return count
+
+def record_arrival(school_id, data):
+    """Called after mark_attendance inserts a new row."""
+    today = datetime.now().date()
+    with _lock:
+        entry = _today_counts.get(school_id)
+        if entry and entry["date"] == today:
+            entry["count"] += 1
+    publish(school_id, "attendance", data)
+
+def format_sse(event):
+    payload = json.dumps(event["data"], ensure_ascii=False, default=str)
+    return f"event: {event['type']}\ndata: {payload}\n\n"
+
+async def event_stream(request, school_id):
+    """
+    Async generator producing SSE frames: attendance events as they happen,
+    a stats delta every STATS_INTERVAL_SECONDS when the count changed,
+    and a comment heartbeat to keep proxies from closing idle connections.
+    """
+    loop = asyncio.get_running_loop()
+    sub = subscribe(school_id, loop)
+    try:
+        sub.last_sent_count = await loop.run_in_executor(None, get_today_count, school_id)
+        yield format_sse({"type": "stats", "data": {"today_count": sub.last_sent_count, "delta": 0}})
+
+        idle = 0.0
+        while True:
+            if await request.is_disconnected():
+                break
+            events, dropped = await sub.next_events(STATS_INTERVAL_SECONDS)
+            for event in events:
+                yield format_sse(event)
+
+            if dropped:
+                yield format_sse({"type": "dropped", "data": {"count": dropped}})
+
+            count = await loop.run_in_executor(None, get_today_count, school_id)
+            if count != sub.last_sent_count:
+                delta = count - sub.last_sent_count
+                sub.last_sent_count = count
+                yield format_sse({"type": "stats", "data": {"today_count": count, "delta": delta}})
+                idle = 0.0
+            elif not events:
+                idle += STATS_INTERVAL_SECONDS
+                if idle >= HEARTBEAT_SECONDS:
+                    idle = 0.0
+                    yield ": keep-alive\n\n"
+            else:
+                idle = 0.0
+    finally:
+        unsubscribe(sub)
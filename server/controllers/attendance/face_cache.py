@@ -1,41 +1,127 @@
 from datetime import datetime, timedelta
 import json
 import numpy as np
-try:
-    import faiss
-except ImportError:
-    faiss = None
-    print("WARNING: FAISS not found. Falling back to linear search.")
 
 from server.config.database import get_db_connection
-from server.utils import face_utils
+from server.utils import face_utils, metrics
+from server.utils.embedding_engine import active_model_name
+from .config import CASCADE_MODE, CASCADE_MIN_VECTORS, CASCADE_SHORTLIST, CASCADE_PCA_DIM, CASCADE_PQ_M
+from .cascade_search import CascadeIndex
+
+_faiss = None
+_faiss_checked = False
+
+def _import_faiss():
+    """FAISS is imported on the first index build so CRUD-only workers never load it."""
+    global _faiss, _faiss_checked
+    if not _faiss_checked:
+        try:
+            import faiss
+            _faiss = faiss
+        except ImportError:
+            print("WARNING: FAISS not found. Falling back to linear search.")
+        _faiss_checked = True
+    return _faiss
 
 encodings_cache = {}
 CACHE_DURATION = timedelta(minutes=10)
 
+def build_search_context(grouped_embeddings):
+    """
+    Build the search context used by decision_engine from
+    { student_id: [embedding, ...] } without touching the database.
+    """
+    known_encodings = {}
+    id_map = []
+    matrix_list = []
+    
+    # Calculate mean for cache
+    for sid, embs in grouped_embeddings.items():
+        if len(embs):
+            mean_vec = np.mean(embs, axis=0)
+            known_encodings[sid] = mean_vec
+            
+            # Prepare for FAISS
+            # Normalize for Cosine Similarity (IndexFlatIP)
+            norm_vec = face_utils.l2_normalize(mean_vec)
+            matrix_list.append(norm_vec)
+            id_map.append(sid)
+    
+    # Large schools: compressed first pass + exact rerank instead of a flat index
+    cascade = None
+    if CASCADE_MODE and len(matrix_list) >= CASCADE_MIN_VECTORS:
+        try:
+            cascade = CascadeIndex(
+                np.array(matrix_list, dtype=np.float32), CASCADE_MODE, CASCADE_SHORTLIST,
+                pca_dim=CASCADE_PCA_DIM, pq_m=CASCADE_PQ_M,
+                faiss=_import_faiss() if CASCADE_MODE != "pca" else None
+            )
+            print(f"DEBUG: Cascade index ({CASCADE_MODE}) built with {cascade.ntotal} vectors.")
+        except Exception as e:
+            print(f"WARNING: Cascade index could not be built ({e}). Using exact search.")
+
+    # Build FAISS Index
+    faiss_index = None
+    faiss = _import_faiss() if matrix_list and cascade is None else None
+    if faiss and matrix_list:
+        matrix_np = np.array(matrix_list).astype('float32')
+        if matrix_np.ndim == 1:
+            matrix_np = matrix_np.reshape(1, -1)
+            
+        # Dimension 128
+        d = 128
+        faiss_index = faiss.IndexFlatIP(d)
+        faiss_index.add(matrix_np)
+        print(f"DEBUG: FAISS Index built with {faiss_index.ntotal} vectors.")
+    
+    return {
+        "legacy_dict": known_encodings,
+        "faiss_index": faiss_index,
+        "cascade": cascade,
+        "id_map": id_map
+    }
+
+def _cached_vector_counts():
+    return {sid: len(entry['data'].get('id_map', [])) for sid, entry in list(encodings_cache.items())}
+
+metrics.Gauge(
+    "face_cache_vectors",
+    "Students in the cached search index per school.",
+    ["school_id"],
+    callback=_cached_vector_counts
+)
+
 def get_cached_encodings(school_id, force_refresh: bool = False):
+    with metrics.stage("cache_lookup"):
+        return _get_cached_encodings(school_id, force_refresh)
+
+def _get_cached_encodings(school_id, force_refresh):
     now = datetime.now()
     
     if not force_refresh and school_id in encodings_cache:
         cache_entry = encodings_cache[school_id]
         if now - cache_entry['last_updated'] < CACHE_DURATION:
+            metrics.FACE_CACHE_REQUESTS.inc(result="hit")
             return cache_entry['data']
-            
+    
+    metrics.FACE_CACHE_REQUESTS.inc(result="miss")
+    metrics.FACE_CACHE_REBUILDS.inc()
     conn = get_db_connection()
     if not conn: return {"legacy_dict": {}, "faiss_index": None, "id_map": []}
     
     try:
         cursor = conn.cursor(dictionary=True)
         # Use face_embeddings table directly if profiles table is empty/not used
+        # Only vectors from the active model: embeddings of different models are not comparable
         cursor.execute("""
             SELECT s.student_id, fe.embedding as mean_embedding
             FROM face_embeddings fe
             JOIN students s ON fe.student_id = s.student_id
             WHERE s.school_id = %s AND COALESCE(s.is_active, 1) = 1
-        """, (school_id,))
+              AND fe.model_name = %s
+        """, (school_id, active_model_name()))
         rows = cursor.fetchall()
         
-        known_encodings = {}
         # Group by student and take average if multiple embeddings exist
         temp_encodings = {}
         
@@ -50,41 +136,8 @@ def get_cached_encodings(school_id, force_refresh: bool = False):
                 except:
                     continue
         
-        # Calculate mean for cache
-        id_map = []
-        matrix_list = []
-        
-        for sid, embs in temp_encodings.items():
-            if embs:
-                mean_vec = np.mean(embs, axis=0)
-                known_encodings[sid] = mean_vec
-                
-                # Prepare for FAISS
-                # Normalize for Cosine Similarity (IndexFlatIP)
-                norm_vec = face_utils.l2_normalize(mean_vec)
-                matrix_list.append(norm_vec)
-                id_map.append(sid)
-        
-        # Build FAISS Index
-        faiss_index = None
-        if faiss and matrix_list:
-            matrix_np = np.array(matrix_list).astype('float32')
-            if matrix_np.ndim == 1:
-                matrix_np = matrix_np.reshape(1, -1)
-                
-            # Dimension 128
-            d = 128
-            faiss_index = faiss.IndexFlatIP(d)
-            faiss_index.add(matrix_np)
-            print(f"DEBUG: FAISS Index built with {faiss_index.ntotal} vectors.")
-        
-        print(f"DEBUG: Okul {school_id} için {len(known_encodings)} öğrenci yüz verisi önbelleğe alınıyor.")
-        
-        result_data = {
-            "legacy_dict": known_encodings,
-            "faiss_index": faiss_index,
-            "id_map": id_map
-        }
+        result_data = build_search_context(temp_encodings)
+        print(f"DEBUG: Okul {school_id} için {len(result_data['legacy_dict'])} öğrenci yüz verisi önbelleğe alınıyor.")
         
         encodings_cache[school_id] = {
             'last_updated': now,
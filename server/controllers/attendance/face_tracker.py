@@ -0,0 +1,159 @@
+import threading
+import time
+from server.utils import metrics
+from .session_store import LruTtlMap, session_key
+from .config import (
+    TRACK_IOU_THRESHOLD, TRACK_CENTROID_MAX_SHIFT, TRACK_MAX_IDLE_SECONDS,
+    TRACK_QUALITY_GAIN, TRACK_REEMBED_PENDING, TRACK_REEMBED_DECIDED, KIOSK_STATE_MAX_ENTRIES
+)
+
+# Per-kiosk IoU/centroid tracker. Boxes in consecutive frames are matched to
+# tracks; each track votes in its own decision_engine history, so several
+# people in view are decided independently, and a track is only re-embedded
+# when it is new, its face got bigger (closer to the camera), or enough
+# frames have passed since its last embedding.
+
+KIOSK_IDLE_TTL_SECONDS = 600
+
+TRACK_FRAMES = metrics.Counter(
+    "face_track_frames_total",
+    "Tracked faces per frame by whether the embedding model ran (embedded, reused, low_quality).",
+    ["result"]
+)
+
+def box_area(box):
+    top, right, bottom, left = box
+    return max(0, bottom - top) * max(0, right - left)
+
+def iou(a, b):
+    top, bottom = max(a[0], b[0]), min(a[2], b[2])
+    left, right = max(a[3], b[3]), min(a[1], b[1])
+    inter = max(0, bottom - top) * max(0, right - left)
+    union = box_area(a) + box_area(b) - inter
+    return inter / union if union > 0 else 0.0
+
+def _centroid(box):
+    top, right, bottom, left = box
+    return (left + right) / 2.0, (top + bottom) / 2.0
+
+class Track:
+    def __init__(self, key, box, now):
+        self.key = key  # decision session of this track: (school_id, kiosk_id, track_id)
+        self.box = box
+        self.last_seen = now
+        self.embedding = None
+        self.embedded_area = 0
+        self.frames_since_embed = 0
+        self.result = None
+        self.decided = False
+        self.accepted_student_id = None
+
+    def needs_embedding(self):
+        if self.embedding is None:
+            return True
+        if box_area(self.box) >= self.embedded_area * TRACK_QUALITY_GAIN:
+            return True
+        every = TRACK_REEMBED_DECIDED if self.decided else TRACK_REEMBED_PENDING
+        return self.frames_since_embed + 1 >= every
+
+    def mark_embedded(self, embedding):
+        self.embedding = embedding
+        self.embedded_area = max(self.embedded_area, box_area(self.box))
+        self.frames_since_embed = 0
+
+class KioskTracker:
+    def __init__(self, school_id, kiosk_id):
+        self.school_id = school_id
+        self.kiosk_id = kiosk_id
+        self.tracks = []
+        self.next_id = 1
+        self.last_used = time.time()
+        # Frames of one kiosk are processed one at a time
+        self.lock = threading.Lock()
+
+    def update(self, boxes, now=None):
+        """
+        Match this frame's boxes to tracks. Returns (tracks aligned with boxes,
+        tracks that expired). Unmatched tracks survive TRACK_MAX_IDLE_SECONDS.
+        """
+        now = now or time.time()
+        self.last_used = now
+        candidates = sorted(
+            ((iou(t.box, b), ti, bi) for ti, t in enumerate(self.tracks) for bi, b in enumerate(boxes)),
+            reverse=True
+        )
+        assigned = [None] * len(boxes)
+        used_tracks = set()
+        for score, ti, bi in candidates:
+            if score < TRACK_IOU_THRESHOLD:
+                break
+            if ti in used_tracks or assigned[bi] is not None:
+                continue
+            assigned[bi] = self.tracks[ti]
+            used_tracks.add(ti)
+
+        # Fast movers: fall back to centroid distance relative to the box width
+        for bi, box in enumerate(boxes):
+            if assigned[bi] is not None:
+                continue
+            cx, cy = _centroid(box)
+            width = max(1, box[1] - box[3])
+            best = None
+            for ti, t in enumerate(self.tracks):
+                if ti in used_tracks:
+                    continue
+                tx, ty = _centroid(t.box)
+                shift = ((cx - tx) ** 2 + (cy - ty) ** 2) ** 0.5 / width
+                if shift <= TRACK_CENTROID_MAX_SHIFT and (best is None or shift < best[0]):
+                    best = (shift, ti)
+            if best is not None:
+                assigned[bi] = self.tracks[best[1]]
+                used_tracks.add(best[1])
+
+        for bi, box in enumerate(boxes):
+            track = assigned[bi]
+            if track is None:
+                track = Track(session_key(self.school_id, self.kiosk_id, self.next_id), box, now)
+                self.next_id += 1
+                self.tracks.append(track)
+                assigned[bi] = track
+            else:
+                track.box = box
+                track.last_seen = now
+
+        expired = [t for t in self.tracks if now - t.last_seen > TRACK_MAX_IDLE_SECONDS]
+        if expired:
+            self.tracks = [t for t in self.tracks if now - t.last_seen <= TRACK_MAX_IDLE_SECONDS]
+        return assigned, expired
+
+# State: { (school_id, kiosk_id): KioskTracker }, LRU with idle TTL
+_trackers = LruTtlMap(KIOSK_IDLE_TTL_SECONDS, KIOSK_STATE_MAX_ENTRIES)
+_trackers_lock = threading.Lock()
+
+def get_tracker(school_id, kiosk_id):
+    """
+    Tracker of one kiosk. Also drops kiosks idle for KIOSK_IDLE_TTL_SECONDS
+    (or least recently used beyond KIOSK_STATE_MAX_ENTRIES); returns their
+    tracks as expired so their decision sessions get reset.
+    """
+    now = time.time()
+    with _trackers_lock:
+        tracker = _trackers.get((school_id, kiosk_id), now)
+        if tracker is None:
+            tracker = KioskTracker(school_id, kiosk_id)
+            _trackers.put((school_id, kiosk_id), tracker, now)
+        tracker.last_used = now
+        expired = []
+        for _, stale, _ in _trackers.evict(now):
+            expired.extend(stale.tracks)
+    return tracker, expired
+
+def _active_tracks():
+    with _trackers_lock:
+        return sum(len(t.tracks) for t in _trackers.values())
+
+metrics.Gauge(
+    "face_tracks_active",
+    "Face tracks currently alive across all kiosks.",
+    callback=_active_tracks
+)
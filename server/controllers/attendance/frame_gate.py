@@ -0,0 +1,81 @@
+import threading
+import time
+import numpy as np
+from server.utils import face_utils, metrics
+from .config import (
+    FRAME_GATE_ENABLED, FRAME_GATE_DIFF_THRESHOLD, FRAME_GATE_MAX_REUSE_SECONDS, FRAME_GATE_IDLE_TTL_SECONDS,
+    KIOSK_STATE_MAX_ENTRIES
+)
+from .session_store import LruTtlMap
+
+# Per-kiosk change detection. A 32x24 grayscale thumbnail is decoded straight
+# from the JPEG (DCT scaling, no full decode) and compared with the thumbnail
+# of the last frame that went through the full pipeline. Near-identical frames
+# reuse that frame's result if it was final (a decision or "no face"), so
+# consensus-building "pending" frames are never skipped.
+
+THUMB_SIZE = (32, 24)
+
+# State: { (school_id, kiosk_id): {"thumb", "result", "processed_at"} }, LRU with idle TTL
+_kiosk_state = LruTtlMap(FRAME_GATE_IDLE_TTL_SECONDS, KIOSK_STATE_MAX_ENTRIES)
+_state_lock = threading.Lock()
+
+GATE_FRAMES = metrics.Counter(
+    "scan_gate_frames_total",
+    "Scan frames by frame-gate outcome (processed, reused, static_empty).",
+    ["result"]
+)
+
+def thumbnail(image_bytes):
+    cv2 = face_utils._import_cv2()
+    small = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+    if small is None:
+        return None
+    return cv2.resize(small, THUMB_SIZE, interpolation=cv2.INTER_AREA).astype(np.float32)
+
+def frame_difference(a, b):
+    """Mean absolute grayscale difference between two thumbnails (0-255)."""
+    return float(np.mean(np.abs(a - b)))
+
+def _is_reusable(result):
+    # Multi-face results: every face must be settled
+    if "faces" in result and not all(_is_reusable(f) for f in result["faces"]):
+        return False
+    # "pending" with a face means the temporal vote is still building, or the
+    # face failed the quality gate and the next frame may be sharper: keep processing
+    if result.get("status") != "pending":
+        return True
+    return result.get("message") == "Yüz algılanamadı"
+
+def check(school_id, kiosk_id, thumb):
+    """Returns the cached result to answer this frame with, or None to run the full pipeline."""
+    if not FRAME_GATE_ENABLED or not kiosk_id or thumb is None:
+        return None
+    now = time.time()
+    with _state_lock:
+        state = _kiosk_state.get((school_id, kiosk_id), now)
+        _kiosk_state.evict(now)
+        if state is None:
+            return None
+        if state["result"] is None or now - state["processed_at"] > FRAME_GATE_MAX_REUSE_SECONDS:
+            return None
+        if frame_difference(thumb, state["thumb"]) > FRAME_GATE_DIFF_THRESHOLD:
+            return None
+        result = state["result"]
+    GATE_FRAMES.inc(result="static_empty" if result.get("status") == "pending" else "reused")
+    return dict(result)
+
+def remember(school_id, kiosk_id, thumb, result):
+    if not FRAME_GATE_ENABLED or not kiosk_id:
+        return
+    GATE_FRAMES.inc(result="processed")
+    if thumb is None:
+        return
+    now = time.time()
+    with _state_lock:
+        _kiosk_state.put((school_id, kiosk_id), {
+            "thumb": thumb,
+            "result": dict(result) if _is_reusable(result) else None,
+            "processed_at": now,
+        }, now)
+        _kiosk_state.evict(now)
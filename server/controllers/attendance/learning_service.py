@@ -1,6 +1,8 @@
 import json
 import numpy as np
 from server.config.database import get_db_connection
+from server.utils import metrics
+from server.utils.embedding_engine import active_model_name
 
 # Threshold for adding new embeddings
 # High confidence required to avoid polluting the model with bad data.
@@ -12,6 +14,10 @@ def check_and_update_embedding(student_id, embedding, confidence):
     If confidence is high, add the new embedding to the database
     to improve future recognition (Active Learning).
     """
+    with metrics.stage("active_learning"):
+        _check_and_update_embedding(student_id, embedding, confidence)
+
+def _check_and_update_embedding(student_id, embedding, confidence):
     if confidence < LEARNING_THRESHOLD:
         return
         
@@ -22,8 +28,11 @@ def check_and_update_embedding(student_id, embedding, confidence):
             
         cursor = conn.cursor()
         
-        # Check current count
-        cursor.execute("SELECT COUNT(*) FROM face_embeddings WHERE student_id = %s", (student_id,))
+        # Check current count (active model only: quarantined or other-model rows do not fill the cap)
+        cursor.execute(
+            "SELECT COUNT(*) FROM face_embeddings WHERE student_id = %s AND model_name = %s",
+            (student_id, active_model_name())
+        )
         result = cursor.fetchone()
         count = result[0] if result else 0
         
@@ -42,8 +51,8 @@ def check_and_update_embedding(student_id, embedding, confidence):
             
         embedding_json = json.dumps(embedding_list)
         
-        sql = "INSERT INTO face_embeddings (student_id, embedding, source) VALUES (%s, %s, 'active_learning')"
-        cursor.execute(sql, (student_id, embedding_json))
+        sql = "INSERT INTO face_embeddings (student_id, embedding, source, model_name) VALUES (%s, %s, 'active_learning', %s)"
+        cursor.execute(sql, (student_id, embedding_json, active_model_name()))
         conn.commit()
         
         print(f"🧠 [Active Learning] Updated embedding for Student {student_id} (Conf: {confidence:.4f})")
@@ -0,0 +1,99 @@
+import threading
+import time
+import numpy as np
+from server.utils import face_utils, metrics
+from .config import (
+    RECENT_IDENTITY_ENABLED, RECENT_IDENTITY_TTL_SECONDS, RECENT_IDENTITY_MAX_DIST, RECENT_IDENTITY_MAX_PER_KIOSK,
+    KIOSK_STATE_MAX_ENTRIES
+)
+from .session_store import LruTtlMap
+
+# Per-kiosk cache of recently accepted students. A student accepted at a kiosk
+# usually stays in view for a few more seconds; their next embeddings are
+# compared with this handful of vectors first, and a confident match is
+# answered with the cached "already marked" response: no index search, no
+# consensus, no attendance query. Entries expire RECENT_IDENTITY_TTL_SECONDS
+# after the last match.
+
+# State: { (school_id, kiosk_id): { student_id: {"embedding", "result", "expires_at"} } }
+# A kiosk idle for the entry TTL only holds expired entries, so it is dropped
+# then; at most KIOSK_STATE_MAX_ENTRIES kiosks are kept (least recently used go first).
+_recent = LruTtlMap(RECENT_IDENTITY_TTL_SECONDS, KIOSK_STATE_MAX_ENTRIES)
+_recent_lock = threading.Lock()
+
+RECENT_LOOKUPS = metrics.Counter(
+    "recent_identity_lookups_total",
+    "Embeddings checked against the per-kiosk recent-identity cache (hit, miss).",
+    ["result"]
+)
+
+def _as_exists(result):
+    """The response a repeat frame would get from mark_attendance, without asking the DB."""
+    cached = {k: v for k, v in result.items() if k != "box"}
+    if cached.get("status") == "success":
+        cached["status"] = "exists"
+        cached["message"] = f"Daha önce yoklama alındı ({time.strftime('%H:%M')})"
+    cached["method"] = "recent"
+    return cached
+
+def remember(school_id, kiosk_id, student_id, embedding, result):
+    """Store an accepted student's embedding and attendance response (success / exists only)."""
+    if not RECENT_IDENTITY_ENABLED or not kiosk_id or result.get("status") not in ("success", "exists"):
+        return
+    now = time.time()
+    with _recent_lock:
+        entries = _recent.get((school_id, kiosk_id), now)
+        if entries is None:
+            entries = {}
+            _recent.put((school_id, kiosk_id), entries, now)
+        _recent.evict(now)
+        for sid in [s for s, e in entries.items() if e["expires_at"] < now]:
+            del entries[sid]
+        entries[student_id] = {
+            "embedding": face_utils.l2_normalize(embedding).astype(np.float32),
+            "result": _as_exists(result),
+            "expires_at": now + RECENT_IDENTITY_TTL_SECONDS,
+        }
+        if len(entries) > RECENT_IDENTITY_MAX_PER_KIOSK:
+            oldest = min(entries, key=lambda s: entries[s]["expires_at"])
+            del entries[oldest]
+
+def lookup(school_id, kiosk_id, embedding):
+    """
+    Cached response if the embedding confidently matches exactly one recent
+    student of this kiosk, else None.
+    """
+    if not RECENT_IDENTITY_ENABLED or not kiosk_id:
+        return None
+    now = time.time()
+    with _recent_lock:
+        entries = _recent.get((school_id, kiosk_id), now)
+        _recent.evict(now)
+        if entries:
+            for sid in [s for s, e in entries.items() if e["expires_at"] < now]:
+                del entries[sid]
+        if not entries:
+            if entries is not None:
+                _recent.pop((school_id, kiosk_id))
+            return None
+        ids = list(entries)
+        matrix = np.stack([entries[sid]["embedding"] for sid in ids])
+
+    emb = face_utils.l2_normalize(embedding).astype(np.float32)
+    dists = 1.0 - matrix @ emb
+    close = np.flatnonzero(dists <= RECENT_IDENTITY_MAX_DIST)
+    # Two recent students both close: let the full search decide
+    if len(close) != 1:
+        RECENT_LOOKUPS.inc(result="miss")
+        return None
+
+    student_id = ids[close[0]]
+    with _recent_lock:
+        entry = (_recent.get((school_id, kiosk_id), now) or {}).get(student_id)
+        if entry is None:
+            RECENT_LOOKUPS.inc(result="miss")
+            return None
+        entry["expires_at"] = now + RECENT_IDENTITY_TTL_SECONDS
+        result = dict(entry["result"])
+    RECENT_LOOKUPS.inc(result="hit")
+    return {**result, "confidence": float(1.0 - dists[close[0]])}
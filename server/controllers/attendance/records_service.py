@@ -1,102 +1,269 @@
-from datetime import datetime
+import base64
+import csv
+import io
+import json
+from datetime import datetime, timedelta
 from server.config.database import get_db_connection
+from server.utils import metrics
+from . import events_service
+
+# Log pagination settings
+LOGS_DEFAULT_LIMIT = 100
+LOGS_MAX_LIMIT = 500
+EXPORT_FETCH_SIZE = 1000
+EXPORT_COLUMNS = ["id", "student_id", "full_name", "class_name", "timestamp", "status"]
+
+# Timestamp is formatted by MySQL, so rows need no per-row Python conversion
+_LOG_SELECT = """
+    SELECT a.attendance_id as id, a.student_id,
+           CONCAT(s.first_name, ' ', s.last_name) as full_name,
+           c.class_name,
+           DATE_FORMAT(a.timestamp, '%%Y-%%m-%%d %%H:%%i:%%s') as timestamp, a.status
+    FROM attendance a
+    LEFT JOIN students s ON a.student_id = s.student_id
+    LEFT JOIN classes c ON a.class_id = c.class_id
+"""
+
+def encode_log_cursor(timestamp, log_id):
+    """Encode a (timestamp, id) pair as an opaque page cursor."""
+    raw = f"{timestamp}|{log_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+def decode_log_cursor(cursor_token):
+    """Decode a page cursor back into (timestamp, id). Raises ValueError if invalid."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor_token.encode("ascii")).decode("utf-8")
+        ts_str, id_str = raw.rsplit("|", 1)
+        return datetime.strptime(ts_str, "%Y-%m-%d %H:%M:%S"), int(id_str)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+def _build_log_filters(school_id, date_from=None, date_to=None, class_id=None, status=None):
+    """Build WHERE clauses and params for log queries (date_to is inclusive)."""
+    clauses = ["a.school_id = %s"]
+    params = [school_id]
+    if date_from:
+        clauses.append("a.timestamp >= %s")
+        params.append(datetime.combine(date_from, datetime.min.time()))
+    if date_to:
+        clauses.append("a.timestamp < %s")
+        params.append(datetime.combine(date_to, datetime.min.time()) + timedelta(days=1))
+    if class_id:
+        clauses.append("a.class_id = %s")
+        params.append(class_id)
+    if status:
+        clauses.append("a.status = %s")
+        params.append(status)
+    return clauses, params
+
+def _estimate_log_count(cursor, clauses, params):
+    """Use the optimizer row estimate instead of a full COUNT(*) scan."""
+    try:
+        cursor.execute(f"EXPLAIN SELECT 1 FROM attendance a WHERE {' AND '.join(clauses)}", tuple(params))
+        plan = cursor.fetchall()
+        if plan and plan[0].get('rows') is not None:
+            return int(plan[0]['rows'])
+    except Exception as e:
+        print(f"Error estimating log count: {e}")
+    return None
+
+def get_attendance_logs(school_id, limit=LOGS_DEFAULT_LIMIT, cursor_token=None,
+                        date_from=None, date_to=None, class_id=None, status=None):
+    """
+    Returns one page of attendance logs using keyset pagination on (timestamp, id).
+    The total estimate is only computed for the first page.
+    """
+    empty = {"items": [], "next_cursor": None, "total_estimate": 0}
+    limit = max(1, min(int(limit or LOGS_DEFAULT_LIMIT), LOGS_MAX_LIMIT))
+    after = decode_log_cursor(cursor_token) if cursor_token else None
 
-def get_attendance_logs(school_id):
     conn = get_db_connection()
-    if not conn: return []
+    if not conn: return empty
     try:
         cursor = conn.cursor(dictionary=True)
-        # Updated for 'ml' database schema
-        sql = """
-            SELECT a.attendance_id as id, a.student_id, 
-                   CONCAT(s.first_name, ' ', s.last_name) as full_name, 
-                   c.class_name, 
-                   a.timestamp, a.status 
-            FROM attendance a 
-            LEFT JOIN students s ON a.student_id = s.student_id 
-            LEFT JOIN classes c ON a.class_id = c.class_id 
-            WHERE s.school_id = %s 
-            ORDER BY a.timestamp DESC
+        clauses, params = _build_log_filters(school_id, date_from, date_to, class_id, status)
+
+        total_estimate = None
+        if after is None:
+            total_estimate = _estimate_log_count(cursor, clauses, params)
+
+        page_clauses = list(clauses)
+        page_params = list(params)
+        if after is not None:
+            page_clauses.append("(a.timestamp < %s OR (a.timestamp = %s AND a.attendance_id < %s))")
+            page_params.extend([after[0], after[0], after[1]])
+
+        # One extra row tells us whether another page exists
+        sql = f"""{_LOG_SELECT}
+            WHERE {' AND '.join(page_clauses)}
+            ORDER BY a.timestamp DESC, a.attendance_id DESC
+            LIMIT %s
         """
-        cursor.execute(sql, (school_id,))
+        page_params.append(limit + 1)
+        cursor.execute(sql, tuple(page_params))
         logs = cursor.fetchall()
-        for log in logs:
-            if log['timestamp']:
-                log['timestamp'] = str(log['timestamp'])
-        return logs
+
+        next_cursor = None
+        if len(logs) > limit:
+            logs = logs[:limit]
+            last = logs[-1]
+            next_cursor = encode_log_cursor(last['timestamp'], last['id'])
+
+        return {"items": logs, "next_cursor": next_cursor, "total_estimate": total_estimate}
     except Exception as e:
         print(f"Error fetching logs: {e}")
-        return []
+        return empty
     finally:
         if conn: conn.close()
 
+def iter_attendance_logs(school_id, date_from=None, date_to=None, class_id=None, status=None):
+    """
+    Yields every matching log row through an unbuffered (server-side) cursor,
+    so exports never hold the full result set in memory.
+    """
+    conn = get_db_connection()
+    if not conn: return
+    try:
+        cursor = conn.cursor(dictionary=True, buffered=False)
+        clauses, params = _build_log_filters(school_id, date_from, date_to, class_id, status)
+        sql = f"""{_LOG_SELECT}
+            WHERE {' AND '.join(clauses)}
+            ORDER BY a.timestamp DESC, a.attendance_id DESC
+        """
+        cursor.execute(sql, tuple(params))
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield row
+    finally:
+        conn.close()
+
+def export_attendance_logs(school_id, fmt="ndjson", **filters):
+    """Streams logs as NDJSON lines or CSV chunks."""
+    rows = iter_attendance_logs(school_id, **filters)
+    if fmt == "csv":
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS, extrasaction="ignore")
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            if buffer.tell() >= 64 * 1024:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate(0)
+        yield buffer.getvalue()
+    else:
+        for row in rows:
+            yield json.dumps(row, ensure_ascii=False, default=str) + "\n"
+
 def mark_attendance(student_id):
+    return mark_attendance_batch([student_id])[student_id]
+
+def mark_attendance_batch(student_ids):
+    """
+    Marks attendance for every student accepted in one frame using a single
+    connection and transaction. Returns { student_id: response }, each
+    response shaped like mark_attendance's.
+    """
+    student_ids = list(dict.fromkeys(student_ids))
+    if not student_ids:
+        return {}
+    with metrics.stage("attendance_write"):
+        return _mark_attendance_batch(student_ids)
+
+def _mark_attendance_batch(student_ids):
+    conn = None
     try:
         conn = get_db_connection()
         if not conn:
-            return {"status": "error", "message": "Veritabanı bağlantı hatası"}
+            return {sid: {"status": "error", "message": "Veritabanı bağlantı hatası"} for sid in student_ids}
             
         cursor = conn.cursor(dictionary=True)
         now = datetime.now()
         today_date = now.strftime('%Y-%m-%d')
+        placeholders = ", ".join(["%s"] * len(student_ids))
         
-        # 1. Get student's class_id and name FIRST
-        cursor.execute("""
-            SELECT s.class_id, s.school_id, s.first_name, s.last_name, c.class_name 
+        # 1. Get the students' class_id and name FIRST
+        cursor.execute(f"""
+            SELECT s.student_id, s.class_id, s.school_id, s.first_name, s.last_name, c.class_name 
             FROM students s 
             LEFT JOIN classes c ON s.class_id = c.class_id 
-            WHERE s.student_id = %s
-        """, (student_id,))
-        student_data = cursor.fetchone()
+            WHERE s.student_id IN ({placeholders})
+        """, tuple(student_ids))
+        students = {str(row['student_id']): row for row in cursor.fetchall()}
         
-        if not student_data:
-            conn.close()
-            return {"status": "error", "message": "Öğrenci bulunamadı"}
-            
-        class_id = student_data['class_id']
-        school_id = student_data['school_id']
-        student_name = f"{student_data['first_name']} {student_data['last_name']}"
-        class_name = student_data['class_name'] if student_data['class_name'] else "Bilinmeyen Sınıf"
-        
-        # 2. Check if attendance already exists for today
+        # 2. Check which of them already have attendance for today
         cursor.execute(
-            "SELECT status, timestamp FROM attendance WHERE student_id = %s AND DATE(timestamp) = %s", 
-            (student_id, today_date)
+            f"SELECT student_id, status, timestamp FROM attendance WHERE student_id IN ({placeholders}) AND DATE(timestamp) = %s", 
+            (*student_ids, today_date)
         )
-        existing = cursor.fetchone()
+        existing = {}
+        for row in cursor.fetchall():
+            existing.setdefault(str(row['student_id']), row)
         
-        if existing:
-            conn.close()
-            return {
-                "status": "exists", 
-                "message": f"Daha önce yoklama alındı ({existing['timestamp'].strftime('%H:%M')})",
+        responses = {}
+        new_rows = []
+        arrivals = []
+        for student_id in student_ids:
+            student_data = students.get(str(student_id))
+            if not student_data:
+                responses[student_id] = {"status": "error", "message": "Öğrenci bulunamadı"}
+                continue
+                
+            student_name = f"{student_data['first_name']} {student_data['last_name']}"
+            class_name = student_data['class_name'] if student_data['class_name'] else "Bilinmeyen Sınıf"
+            previous = existing.get(str(student_id))
+            if previous:
+                responses[student_id] = {
+                    "status": "exists", 
+                    "message": f"Daha önce yoklama alındı ({previous['timestamp'].strftime('%H:%M')})",
+                    "student_name": student_name,
+                    "class_name": class_name,
+                    "attendance_status": previous['status']
+                }
+                continue
+
+            # 3. Determine status
+            status = "present"
+            # Example late logic could be added here
+            
+            new_rows.append((student_id, student_data['school_id'], student_data['class_id'], now, status, 'face', 0.95))
+            arrivals.append((student_data['school_id'], {
+                "student_id": student_id,
                 "student_name": student_name,
                 "class_name": class_name,
-                "attendance_status": existing['status']
+                "attendance_status": status,
+                "timestamp": now.strftime('%Y-%m-%d %H:%M:%S')
+            }))
+            responses[student_id] = {
+                "status": "success", 
+                "message": "Yoklama başarıyla alındı", 
+                "student_name": student_name,
+                "class_name": class_name,
+                "attendance_status": status
             }
-
-        # 3. Determine status
-        status = "present"
-        # Example late logic could be added here
-        
-        # 4. Insert attendance record
-        insert_sql = """
-            INSERT INTO attendance (student_id, school_id, class_id, timestamp, status, verification_method, confidence_score) 
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-        """
-        cursor.execute(insert_sql, (student_id, school_id, class_id, now, status, 'face', 0.95))
         
-        conn.commit()
-        conn.close()
+        # 4. Insert all new attendance records in one transaction
+        if new_rows:
+            insert_sql = """
+                INSERT INTO attendance (student_id, school_id, class_id, timestamp, status, verification_method, confidence_score) 
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+            """
+            cursor.executemany(insert_sql, new_rows)
+            conn.commit()
+
+        for school_id, arrival in arrivals:
+            try:
+                events_service.record_arrival(school_id, arrival)
+            except Exception as e:
+                print(f"Error publishing attendance event: {e}")
         
-        return {
-            "status": "success", 
-            "message": "Yoklama başarıyla alındı", 
-            "student_name": student_name,
-            "class_name": class_name,
-            "attendance_status": status
-        }
+        return responses
         
     except Exception as e:
         print(f"Error marking attendance: {e}")
-        return {"status": "error", "message": str(e)}
+        return {sid: {"status": "error", "message": str(e)} for sid in student_ids}
+    finally:
+        if conn: conn.close()
@@ -1,24 +1,91 @@
-from server.utils import face_utils
+from server.utils import face_utils, metrics
+from server.config.detectors import get_detector_for
 from .face_cache import get_cached_encodings
-from .decision_engine import evaluate_embedding
-from .records_service import mark_attendance
+from .decision_engine import evaluate_embedding, evaluate_embeddings, reset_history
+from .records_service import mark_attendance, mark_attendance_batch
 from .learning_service import check_and_update_embedding
+from .config import TRACKING_ENABLED, SCAN_QUALITY_GATE
+from .session_store import session_key
+from . import frame_gate, face_tracker, recent_identities
 
-def process_scan(school_id, image_base64):
+NO_FACE = {"status": "pending", "message": "Yüz algılanamadı"}
+# A face is in view but failed the ROI quality gate; never reused by the frame gate
+LOW_QUALITY = {"status": "pending", "reason": "low_quality", "message": "Görüntü net değil, lütfen kameraya yaklaşın"}
+
+def process_scan(school_id, image_base64, kiosk_id=None, multi_face=False):
     """
     Orchestrates the face scan process.
+    With multi_face every face of the frame is decided and the response
+    also carries a "faces" list (one result with box per face).
+    """
+    with metrics.stage("scan_total"):
+        return _process_scan(school_id, image_base64, kiosk_id, multi_face)
+
+def _process_scan(school_id, image_base64, kiosk_id=None, multi_face=False):
+    try:
+        image_bytes = face_utils.decode_base64_bytes(image_base64)
+    except Exception as e:
+        print(f"Hata: Base64 resim çözülemedi: {e}")
+        return _response(dict(NO_FACE), [], multi_face)
+
+    # Static scene since the last processed frame: answer with its result
+    thumb = None
+    if kiosk_id and frame_gate.FRAME_GATE_ENABLED:
+        with metrics.stage("frame_gate"):
+            thumb = frame_gate.thumbnail(image_bytes)
+            cached = frame_gate.check(school_id, kiosk_id, thumb)
+        if cached is not None and ("faces" in cached) == multi_face:
+            return cached
+
+    result = _recognize(school_id, image_bytes, kiosk_id, multi_face)
+    frame_gate.remember(school_id, kiosk_id, thumb, result)
+    return result
+
+def _response(primary, faces, multi_face):
+    """Single-result shape; multi-face requests also get every face's result."""
+    if multi_face:
+        return {**primary, "faces": faces}
+    return primary
+
+def _mark_accepted(accepted):
     """
-    encs_boxes = face_utils.get_face_encodings_and_boxes_from_base64(image_base64)
+    accepted: [(student_id, embedding, confidence), ...] of one frame.
+    Active learning per face, then one attendance transaction for all of them.
+    """
+    for student_id, enc, confidence in accepted:
+        check_and_update_embedding(student_id, enc, confidence)
+    return mark_attendance_batch([student_id for student_id, _, _ in accepted])
+
+def _recognize(school_id, image_bytes, kiosk_id=None, multi_face=False):
+    """Full pipeline for one encoded frame."""
+    detector = get_detector_for(school_id, kiosk_id)
+    if kiosk_id and TRACKING_ENABLED:
+        return _recognize_tracked(school_id, image_bytes, kiosk_id, detector, multi_face)
+    quality_path = "scan" if SCAN_QUALITY_GATE else None
+    encs_boxes, low_quality = face_utils.get_gated_encodings_and_boxes_from_bytes(image_bytes, detector, quality_path)
+    if not encs_boxes and low_quality:
+        print(f"⚠️ [SCAN SERVICE] {low_quality} face(s) failed the quality gate.")
+        return _response(dict(LOW_QUALITY), [], multi_face)
     if not encs_boxes:
         print("⚠️ [SCAN SERVICE] No face detected in the incoming image frame.")
         # Handle no faces found logic (part of decision_engine now)
-        return {"status": "pending", "message": "Yüz algılanamadı"} # Or handle here
+        return _response(dict(NO_FACE), [], multi_face) # Or handle here
 
     print(f"📸 [SCAN SERVICE] Detected {len(encs_boxes)} face(s). Processing...")
     known = get_cached_encodings(school_id)
+    # Untracked faces of one kiosk share a session; kiosks no longer share votes
+    history_key = session_key(school_id, kiosk_id)
+    if multi_face:
+        return _recognize_all(school_id, kiosk_id, encs_boxes, known, history_key)
     
+    first_pending = None
     for enc, box in encs_boxes:
-        result = evaluate_embedding(enc, school_id, known)
+        # Student accepted here a moment ago: answer without search or DB
+        recent = recent_identities.lookup(school_id, kiosk_id, enc)
+        if recent is not None:
+            return {**recent, "box": box}
+
+        result = evaluate_embedding(enc, school_id, known, history_key=history_key)
         
         if result.get("status") == "ACCEPT":
             student_id = result["student_id"]
@@ -29,10 +96,144 @@ def process_scan(school_id, image_base64):
             
             attendance_response = mark_attendance(student_id)
             # Combine and return a rich response
-            return {**result, **attendance_response, "box": box}
+            response = {**result, **attendance_response}
+            recent_identities.remember(school_id, kiosk_id, student_id, enc, response)
+            return {**response, "box": box}
         
         # For now, return the first non-pending result
         if result.get("status") != "pending":
             return {**result, "box": box}
+        if first_pending is None:
+            first_pending = {**result, "box": box}
+
+    # All faces still voting: not "no face", or the frame gate would replay it
+    return first_pending
+
+def _recognize_all(school_id, kiosk_id, encs_boxes, known, history_key):
+    """Multi-face mode without tracking: batched search, one attendance write."""
+    results = [recent_identities.lookup(school_id, kiosk_id, enc) for enc, _ in encs_boxes]
+    todo = [i for i, r in enumerate(results) if r is None]
+    evaluated = evaluate_embeddings(
+        [encs_boxes[i][0] for i in todo], school_id, known, history_keys=[history_key] * len(todo)
+    )
+    for i, result in zip(todo, evaluated):
+        results[i] = result
+
+    accepted = [
+        (results[i]["student_id"], encs_boxes[i][0], results[i].get("confidence", 0.0))
+        for i in todo if results[i].get("status") == "ACCEPT"
+    ]
+    attendance = _mark_accepted(accepted)
+
+    faces = []
+    for (enc, box), result in zip(encs_boxes, results):
+        if result.get("status") == "ACCEPT":
+            result = {**result, **attendance[result["student_id"]]}
+            recent_identities.remember(school_id, kiosk_id, result["student_id"], enc, result)
+        faces.append({**result, "box": box})
+
+    # Same priority as the single-face loop: an accepted face, then any decision,
+    # then the first still-voting face (never "no face" while faces are in view,
+    # or the frame gate would replay it)
+    primary = next((f for f in faces if f.get("student_id") is not None), None) \
+        or next((f for f in faces if f.get("status") != "pending"), None) \
+        or (faces[0] if faces else dict(NO_FACE))
+    return _response(primary, faces, True)
+
+def _recognize_tracked(school_id, image_bytes, kiosk_id, detector, multi_face=False):
+    """
+    Kiosk pipeline: faces are tracked across frames and each track votes in
+    its own history, so only new, closer or due faces go through the
+    embedding model and attendance is marked once per track.
+    """
+    full, boxes = face_utils.detect_faces_from_bytes(image_bytes, detector)
+    tracker, expired = face_tracker.get_tracker(school_id, kiosk_id)
+    with tracker.lock:
+        tracks, ended = tracker.update(boxes)
+        for track in expired + ended:
+            reset_history(track.key)
+        if not tracks:
+            return _response(dict(NO_FACE), [], multi_face)
+
+        due = [t for t in tracks if t.needs_embedding()]
+        reused = len(tracks) - len(due)
+        low_quality = []
+        if due and SCAN_QUALITY_GATE:
+            # Low-quality faces stay tracked but wait for a better frame
+            low_quality = [t for t in due if face_utils.check_face_quality(full, t.box, "scan")[0] is not None]
+            due = [t for t in due if t not in low_quality]
+        for track in tracks:
+            if track not in due:
+                track.frames_since_embed += 1
+        face_tracker.TRACK_FRAMES.inc(len(due), result="embedded")
+        face_tracker.TRACK_FRAMES.inc(reused, result="reused")
+        face_tracker.TRACK_FRAMES.inc(len(low_quality), result="low_quality")
+
+        pending = {}
+        fresh_accepts = []
+        marked = []
+        if due:
+            known = get_cached_encodings(school_id)
+            encs = face_utils.embed_faces(full, [t.box for t in due])
+            for track, enc in zip(due, encs):
+                track.mark_embedded(enc)
+
+            # Recently accepted students (e.g. a track that broke and restarted) skip the search
+            to_search = []
+            for track, enc in zip(due, encs):
+                recent = recent_identities.lookup(school_id, kiosk_id, enc)
+                if recent is None:
+                    to_search.append((track, enc))
+                elif recent["student_id"] != track.accepted_student_id:
+                    track.result = recent
+                    track.accepted_student_id = recent["student_id"]
+                    track.decided = True
+
+            results = evaluate_embeddings(
+                [enc for _, enc in to_search], school_id, known, history_keys=[t.key for t, _ in to_search]
+            )
+            for (track, enc), result in zip(to_search, results):
+                status = result.get("status")
+                if status == "ACCEPT":
+                    # Same person confirmed again: already marked
+                    if result["student_id"] != track.accepted_student_id:
+                        fresh_accepts.append((track, enc, result))
+                elif status != "pending":
+                    track.result = result
+                    track.decided = True
+                else:
+                    pending[track] = result
+
+            attendance = _mark_accepted([
+                (result["student_id"], enc, result.get("confidence", 0.0)) for _, enc, result in fresh_accepts
+            ])
+            marked = []
+            for track, enc, result in fresh_accepts:
+                response = {**result, **attendance[result["student_id"]]}
+                if response.get("status") not in ("success", "exists"):
+                    # Not recorded (DB error, unknown student): show it once, then vote again
+                    reset_history(track.key)
+                    pending[track] = response
+                    continue
+                track.result = response
+                track.accepted_student_id = result["student_id"]
+                track.decided = True
+                marked.append(track)
+                recent_identities.remember(school_id, kiosk_id, result["student_id"], enc, track.result)
+
+        faces = []
+        for track in tracks:
+            if track.decided:
+                result = track.result
+            elif track in low_quality:
+                result = LOW_QUALITY
+            else:
+                result = pending.get(track, {"status": "pending", "message": "Doğrulanıyor..."})
+            faces.append({**result, "box": track.box})
 
-    return {"status": "pending", "message": "Yüz algılanamadı"} # Default response if all are pending
+    # One face in the single-result shape: a new attendance first, then any decided face
+    if marked:
+        primary = faces[tracks.index(marked[0])]
+    else:
+        primary = next((f for t, f in zip(tracks, faces) if t.decided), faces[0])
+    return _response(primary, faces, multi_face)
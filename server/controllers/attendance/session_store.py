@@ -0,0 +1,265 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from server.utils import metrics
+from .config import SESSION_STORE_URL, SESSION_IDLE_TTL_SECONDS, SESSION_MAX_ENTRIES
+
+# Vote state of the decision engine, one session per (school_id, kiosk_id, track_id)
+# (kiosk_id / track_id are None when the scan carries no kiosk / tracking is off).
+#
+# A session keeps the last `window_size` observations in a fixed-size ring
+# buffer with running vote counters, so adding an observation and reading the
+# consensus are O(1). Idle sessions expire after SESSION_IDLE_TTL_SECONDS and
+# at most SESSION_MAX_ENTRIES are kept (least recently used go first).
+#
+# SESSION_STORE_URL=redis://host:6379/0 keeps sessions in Redis instead, so
+# several inference workers behind one load balancer share votes.
+
+SESSION_EVICTIONS = metrics.Counter(
+    "decision_session_evictions_total",
+    "Decision sessions dropped from the local store by reason (ttl, cap).",
+    ["reason"]
+)
+
+def session_key(school_id, kiosk_id=None, track_id=None):
+    return (school_id, kiosk_id, track_id)
+
+def _as_session_key(key):
+    # Callers may still pass a bare school_id
+    return key if isinstance(key, tuple) else session_key(key)
+
+class Session:
+    __slots__ = ("buffer", "start", "size", "verified", "rejects", "unknown", "last_seen")
+
+    def __init__(self, window_size):
+        self.buffer = [None] * window_size
+        self.start = 0
+        self.size = 0
+        self.verified = {}  # candidate_id -> verified votes in the window
+        self.rejects = 0
+        self.unknown = 0
+        self.last_seen = time.time()
+
+    def push(self, candidate_id, status):
+        capacity = len(self.buffer)
+        if self.size == capacity:
+            self._count(self.buffer[self.start], -1)
+            self.buffer[self.start] = (candidate_id, status)
+            self.start = (self.start + 1) % capacity
+        else:
+            self.buffer[(self.start + self.size) % capacity] = (candidate_id, status)
+            self.size += 1
+        self._count((candidate_id, status), 1)
+
+    def _count(self, observation, delta):
+        candidate_id, status = observation
+        if status == "verified" and candidate_id:
+            count = self.verified.get(candidate_id, 0) + delta
+            if count:
+                self.verified[candidate_id] = count
+            else:
+                del self.verified[candidate_id]
+        elif status.startswith("reject"):
+            self.rejects += delta
+
+    def consensus(self, consensus_count):
+        for candidate_id, count in self.verified.items():
+            if count >= consensus_count:
+                return candidate_id
+        return None
+
+    def clear_votes(self):
+        self.buffer = [None] * len(self.buffer)
+        self.start = self.size = 0
+        self.verified = {}
+        self.rejects = 0
+
+    def observations(self):
+        capacity = len(self.buffer)
+        return [self.buffer[(self.start + i) % capacity] for i in range(self.size)]
+
+class LruTtlMap:
+    """
+    Bounded map for per-kiosk (client-keyed) state: entries idle for
+    ttl_seconds are dropped and at most max_entries are kept, least recently
+    used first. Reading or writing an entry refreshes it. Not thread-safe;
+    callers hold their own lock. evict() returns [(key, value, reason)] so
+    callers can clean up what an entry owned.
+    """
+    def __init__(self, ttl_seconds, max_entries, on_evict=None):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.on_evict = on_evict  # called with the reason ("ttl" or "cap")
+        self._entries = OrderedDict()  # key -> [value, last_seen]
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, now=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        entry[1] = now or time.time()
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, value, now=None):
+        self._entries[key] = [value, now or time.time()]
+        self._entries.move_to_end(key)
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def values(self):
+        return [entry[0] for entry in self._entries.values()]
+
+    def evict(self, now=None):
+        now = now or time.time()
+        evicted = []
+        # Least recently used first: stop at the first entry that is still fresh
+        while self._entries:
+            key, (value, last_seen) = next(iter(self._entries.items()))
+            if now - last_seen > self.ttl_seconds:
+                reason = "ttl"
+            elif len(self._entries) > self.max_entries:
+                reason = "cap"
+            else:
+                break
+            del self._entries[key]
+            evicted.append((key, value, reason))
+            if self.on_evict:
+                self.on_evict(reason)
+        return evicted
+
+class LocalSessionStore:
+    """In-process store (default), also the stand-in when Redis is not available."""
+    name = "local"
+
+    def __init__(self, window_size, ttl_seconds=SESSION_IDLE_TTL_SECONDS, max_entries=SESSION_MAX_ENTRIES):
+        self.window_size = window_size
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._sessions = LruTtlMap(ttl_seconds, max_entries, on_evict=lambda reason: SESSION_EVICTIONS.inc(reason=reason))
+        self._lock = threading.Lock()
+
+    def _session(self, key, now):
+        key = _as_session_key(key)
+        session = self._sessions.get(key, now)
+        if session is None:
+            session = Session(self.window_size)
+            self._sessions.put(key, session, now)
+        session.last_seen = now
+        self._sessions.evict(now)
+        return session
+
+    def observe(self, key, candidate_id, status, consensus_count):
+        """Add one observation. Returns (consensus candidate or None, reject votes in the window)."""
+        with self._lock:
+            session = self._session(key, time.time())
+            session.push(candidate_id, status)
+            return session.consensus(consensus_count), session.rejects
+
+    def clear_votes(self, key):
+        with self._lock:
+            self._session(key, time.time()).clear_votes()
+
+    def incr_unknown(self, key):
+        with self._lock:
+            session = self._session(key, time.time())
+            session.unknown += 1
+            return session.unknown
+
+    def reset_unknown(self, key):
+        with self._lock:
+            session = self._sessions.get(_as_session_key(key))
+            if session is not None:
+                session.unknown = 0
+
+    def reset(self, key):
+        with self._lock:
+            self._sessions.pop(_as_session_key(key), None)
+
+    def stats(self):
+        with self._lock:
+            sessions = self._sessions.values()
+        return {
+            "backend": self.name,
+            "sessions": len(sessions),
+            "observations": sum(s.size for s in sessions),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
+
+class RedisSessionStore:
+    """
+    Same interface backed by Redis: the window is a capped list (RPUSH + LTRIM)
+    and the unknown streak a counter, both with the idle TTL as key expiry.
+    The window holds at most window_size entries, so counting it stays O(1).
+    Memory is bounded by the TTL and Redis' own maxmemory policy.
+    """
+    name = "redis"
+    prefix = "attendance:session:"
+
+    def __init__(self, client, window_size, ttl_seconds=SESSION_IDLE_TTL_SECONDS):
+        self.client = client
+        self.window_size = window_size
+        self.ttl_seconds = int(ttl_seconds)
+
+    def _key(self, key, part):
+        return self.prefix + ":".join("" if k is None else str(k) for k in _as_session_key(key)) + ":" + part
+
+    def observe(self, key, candidate_id, status, consensus_count):
+        obs_key = self._key(key, "obs")
+        pipe = self.client.pipeline()
+        pipe.rpush(obs_key, json.dumps([candidate_id, status]))
+        pipe.ltrim(obs_key, -self.window_size, -1)
+        pipe.lrange(obs_key, 0, -1)
+        pipe.expire(obs_key, self.ttl_seconds)
+        pipe.expire(self._key(key, "unknown"), self.ttl_seconds)
+        window = [json.loads(item) for item in pipe.execute()[2]]
+
+        verified = {}
+        rejects = 0
+        for cid, s in window:
+            if s == "verified" and cid:
+                verified[cid] = verified.get(cid, 0) + 1
+            elif s.startswith("reject"):
+                rejects += 1
+        consensus = next((cid for cid, count in verified.items() if count >= consensus_count), None)
+        return consensus, rejects
+
+    def clear_votes(self, key):
+        self.client.delete(self._key(key, "obs"))
+
+    def incr_unknown(self, key):
+        unknown_key = self._key(key, "unknown")
+        pipe = self.client.pipeline()
+        pipe.incr(unknown_key)
+        pipe.expire(unknown_key, self.ttl_seconds)
+        return int(pipe.execute()[0])
+
+    def reset_unknown(self, key):
+        self.client.delete(self._key(key, "unknown"))
+
+    def reset(self, key):
+        self.client.delete(self._key(key, "obs"), self._key(key, "unknown"))
+
+    def stats(self):
+        return {"backend": self.name, "ttl_seconds": self.ttl_seconds}
+
+def create_store(window_size):
+    """Redis store when SESSION_STORE_URL is set and reachable, else the local store."""
+    if SESSION_STORE_URL:
+        try:
+            import redis
+            client = redis.Redis.from_url(SESSION_STORE_URL)
+            client.ping()
+            print(f"[INFO] Decision sessions stored in Redis ({SESSION_STORE_URL}).")
+            return RedisSessionStore(client, window_size)
+        except ImportError:
+            print("WARNING: redis package not found. Decision sessions stay in process memory.")
+        except Exception as e:
+            print(f"WARNING: Redis session store unavailable ({e}). Decision sessions stay in process memory.")
+    return LocalSessionStore(window_size)
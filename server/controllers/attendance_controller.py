@@ -1,19 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException, Request
+from datetime import date
+from fastapi import APIRouter, Depends, HTTPException, Request, Query
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Union
+from typing import List, Union, Optional
 
 # Import the refactored service functions
 from .attendance.scan_service import process_scan
-from .attendance.records_service import get_attendance_logs
+from .attendance.records_service import get_attendance_logs, export_attendance_logs, LOGS_DEFAULT_LIMIT, LOGS_MAX_LIMIT
 from .attendance.stats_service import get_stats
+from .attendance.events_service import event_stream
+from .attendance.admission import scan_admission, ScanShed
 from server.config.security import get_current_user
 
+# /scan and /events are served by inference workers (SERVER_ROLE=inference):
+# scans publish arrivals to the in-process event bus, so the SSE stream must
+# live in the same process. Everything else is plain CRUD on `router`.
 router = APIRouter()
+inference_router = APIRouter()
 
 class ScanRequest(BaseModel):
     image: str
+    kiosk_id: Optional[str] = None
+    # True: decide every face in the frame and return them in `faces`
+    multi_face: bool = False
+    # Milliseconds between capture and sending, measured on the kiosk. Relative,
+    # so kiosk clock skew does not matter; the server adds the time since arrival.
+    capture_delay_ms: Optional[float] = None
 
-class ScanResponse(BaseModel):
+class ScanFaceResult(BaseModel):
     status: str
     student_id: Union[str, int] = None
     student_name: str = None
@@ -23,33 +38,101 @@ class ScanResponse(BaseModel):
     message: str
     sim: float = None
     dist: float = None
+    # (top, right, bottom, left) in original-frame pixels
+    box: Optional[List[int]] = None
 
-@router.post("/scan", response_model=ScanResponse, tags=["Attendance"])
-def scan_face(scan_request: ScanRequest, current_user: dict = Depends(get_current_user)):
+class ScanResponse(ScanFaceResult):
+    # Only for multi_face requests; the top-level fields stay the single-face result
+    faces: Optional[List[ScanFaceResult]] = None
+    # Recommended wait before the kiosk sends its next frame
+    next_frame_ms: Optional[int] = None
+
+@inference_router.post("/scan", response_model=ScanResponse, tags=["Attendance"])
+async def scan_face(scan_request: ScanRequest, current_user: dict = Depends(get_current_user)):
     """
     Processes a single frame for face recognition and attendance marking.
+    Frames go through admission control first; shed frames get 503 with Retry-After.
     """
     school_id = current_user.get("school_id")
     if not school_id:
         raise HTTPException(status_code=403, detail="User is not associated with a school")
 
+    # Age is measured from request arrival; only the kiosk-side delay is added
+    frame_age = max(0.0, (scan_request.capture_delay_ms or 0.0) / 1000.0)
+
     try:
-        result = process_scan(school_id, scan_request.image)
-        return ScanResponse(**result)
+        async with scan_admission.slot(school_id, frame_age):
+            result = await run_in_threadpool(
+                process_scan, school_id, scan_request.image, scan_request.kiosk_id, scan_request.multi_face
+            )
+    except ScanShed as e:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Server busy ({e.reason}), retry later",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
         print(f"[ERROR] Exception in /scan: {e}")
         raise HTTPException(status_code=500, detail=f"An internal error occurred: {str(e)}")
 
+    return ScanResponse(**result, next_frame_ms=scan_admission.recommended_interval_ms())
+
 @router.get("/logs", tags=["Attendance"])
-def get_logs(current_user: dict = Depends(get_current_user)):
+def get_logs(
+    limit: int = Query(LOGS_DEFAULT_LIMIT, ge=1, le=LOGS_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    class_id: Optional[int] = None,
+    status: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
     """
-    Retrieves attendance logs for the current user's school.
+    Retrieves a page of attendance logs for the current user's school.
+    Pass the returned `next_cursor` back as `cursor` to fetch the next page.
     """
     school_id = current_user.get("school_id")
     if not school_id:
         raise HTTPException(status_code=403, detail="User is not associated with a school")
-    
-    return get_attendance_logs(school_id)
+
+    try:
+        return get_attendance_logs(
+            school_id, limit=limit, cursor_token=cursor,
+            date_from=date_from, date_to=date_to, class_id=class_id, status=status
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@router.get("/logs/export", tags=["Attendance"])
+def export_logs(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    class_id: Optional[int] = None,
+    status: Optional[str] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    Streams all matching attendance logs as NDJSON or CSV.
+    """
+    school_id = current_user.get("school_id")
+    if not school_id:
+        raise HTTPException(status_code=403, detail="User is not associated with a school")
+
+    chunks = export_attendance_logs(
+        school_id, fmt=format,
+        date_from=date_from, date_to=date_to, class_id=class_id, status=status
+    )
+    if format == "csv":
+        media_type = "text/csv"
+        filename = "attendance.csv"
+    else:
+        media_type = "application/x-ndjson"
+        filename = "attendance.ndjson"
+    return StreamingResponse(
+        chunks, media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
 
 @router.get("/stats", tags=["Attendance"])
 def get_statistics(current_user: dict = Depends(get_current_user)):
@@ -61,3 +144,19 @@ def get_statistics(current_user: dict = Depends(get_current_user)):
         raise HTTPException(status_code=403, detail="User is not associated with a school")
 
     return get_stats(school_id)
+
+@inference_router.get("/events", tags=["Attendance"])
+def stream_events(request: Request, current_user: dict = Depends(get_current_user)):
+    """
+    Server-sent event stream of live attendance events and stats deltas
+    for the current user's school. Replaces polling /logs and /stats.
+    """
+    school_id = current_user.get("school_id")
+    if not school_id:
+        raise HTTPException(status_code=403, detail="User is not associated with a school")
+
+    return StreamingResponse(
+        event_stream(request, school_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,258 @@
+from server.config.database import get_db_connection
+from fastapi import HTTPException
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import csv
+import io
+import os
+import re
+import threading
+import uuid
+import zipfile
+from server.controllers import student_controller
+from server.utils import face_utils
+
+# Bulk import settings
+IMPORT_WORKERS = 4
+IMPORT_INSERT_CHUNK = 500
+IMPORT_JOB_TTL_SECONDS = 24 * 60 * 60
+PHOTO_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Archive layout: <any prefix>/person_<student_id>/<photo>.jpg (same as dataset/DataSet)
+PERSON_DIR_PATTERN = re.compile(r"(?:^|/)person_([^/]+)/[^/]+$")
+
+# State: { job_id: {...job status...} }
+import_jobs = {}
+_jobs_lock = threading.Lock()
+# Jobs run one at a time; each job fans out over IMPORT_WORKERS threads
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="student-import")
+
+def parse_roster(roster_bytes):
+    """
+    Parse a CSV roster. Required columns: student_id and full_name
+    (or first_name + last_name). Optional: class_id, tc_no, birth_date.
+    Returns (rows, errors).
+    """
+    text = roster_bytes.decode("utf-8-sig")
+    reader = csv.DictReader(io.StringIO(text))
+    rows = []
+    errors = []
+    seen = set()
+    for line_no, raw in enumerate(reader, start=2):
+        rec = {k.strip().lower(): (v or "").strip() for k, v in raw.items() if k}
+        student_id = rec.get("student_id", "")
+        if not student_id.isdigit():
+            errors.append({"line": line_no, "student_id": student_id, "reason": "invalid_student_id"})
+            continue
+        if student_id in seen:
+            errors.append({"line": line_no, "student_id": student_id, "reason": "duplicate_in_roster"})
+            continue
+
+        first_name = rec.get("first_name", "")
+        last_name = rec.get("last_name", "")
+        if not first_name and rec.get("full_name"):
+            parts = rec["full_name"].split(" ")
+            last_name = parts.pop() if len(parts) > 1 else ""
+            first_name = " ".join(parts) if parts else rec["full_name"]
+        if not first_name:
+            errors.append({"line": line_no, "student_id": student_id, "reason": "missing_name"})
+            continue
+
+        tc_no = rec.get("tc_no") or "00000000000"
+        if len(tc_no) > 11:
+            errors.append({"line": line_no, "student_id": student_id, "reason": "tc_no_too_long"})
+            continue
+
+        class_id = rec.get("class_id") or None
+        if class_id is not None and not class_id.isdigit():
+            errors.append({"line": line_no, "student_id": student_id, "reason": "invalid_class_id"})
+            continue
+
+        seen.add(student_id)
+        rows.append({
+            "student_id": student_id,
+            "first_name": first_name,
+            "last_name": last_name,
+            "class_id": int(class_id) if class_id else None,
+            "tc_no": tc_no,
+            "birth_date": rec.get("birth_date") or "2000-01-01",
+        })
+    return rows, errors
+
+def insert_roster(school_id, rows):
+    """
+    Insert roster rows with executemany, skipping student_ids that already exist.
+    Returns (inserted_ids, existing_ids).
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise HTTPException(status_code=500, detail="Database error")
+    try:
+        cursor = conn.cursor()
+        existing = set()
+        ids = [r["student_id"] for r in rows]
+        for i in range(0, len(ids), IMPORT_INSERT_CHUNK):
+            chunk = ids[i:i + IMPORT_INSERT_CHUNK]
+            placeholders = ", ".join(["%s"] * len(chunk))
+            cursor.execute(f"SELECT student_id FROM students WHERE student_id IN ({placeholders})", tuple(chunk))
+            existing.update(str(r[0]) for r in cursor.fetchall())
+
+        new_rows = [r for r in rows if r["student_id"] not in existing]
+        sql = """
+        INSERT INTO students (student_id, school_id, first_name, last_name, tc_no, birth_date, class_id, is_active)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, 1)
+        """
+        for i in range(0, len(new_rows), IMPORT_INSERT_CHUNK):
+            chunk = new_rows[i:i + IMPORT_INSERT_CHUNK]
+            cursor.executemany(sql, [
+                (r["student_id"], school_id, r["first_name"], r["last_name"], r["tc_no"], r["birth_date"], r["class_id"])
+                for r in chunk
+            ])
+        conn.commit()
+        return [r["student_id"] for r in new_rows], sorted(existing)
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+def index_archive(zf):
+    """Map student_id -> sorted photo member names, without reading any photo data."""
+    photos = {}
+    for info in zf.infolist():
+        if info.is_dir() or not info.filename.lower().endswith(PHOTO_EXTENSIONS):
+            continue
+        m = PERSON_DIR_PATTERN.search(info.filename)
+        if not m:
+            continue
+        photos.setdefault(m.group(1), []).append(info.filename)
+    for names in photos.values():
+        names.sort()
+    return photos
+
+def _update_job(job_id, **fields):
+    with _jobs_lock:
+        job = import_jobs.get(job_id)
+        if job:
+            job.update(fields)
+
+def _enroll_from_archive(job_id, archive_path, student_id, member_names):
+    """Decode each photo straight from its archive member (nothing is extracted), then grade + embed."""
+    results = []
+    # Each task opens its own handle, so workers never share a file position
+    with zipfile.ZipFile(archive_path) as zf:
+        for idx, name in enumerate(member_names):
+            data = zf.read(name)
+            img = face_utils.decode_image_bytes(data)
+            if img is None:
+                results.append(({"index": idx, "status": "rejected", "reason": "decode_error"}, None))
+                continue
+            results.append(student_controller._analyze_image(idx, img))
+
+    summary = student_controller._finish_enrollment(student_id, results)
+    with _jobs_lock:
+        job = import_jobs.get(job_id)
+        if job:
+            job["results"][student_id] = summary
+            job["processed_students"] += 1
+            job["processed_photos"] += len(member_names)
+    return summary
+
+def _run_import_job(job_id, archive_path, targets):
+    _update_job(job_id, status="running", started_at=datetime.now().isoformat())
+    try:
+        # Photos of one student are processed sequentially; students run in parallel
+        with ThreadPoolExecutor(max_workers=IMPORT_WORKERS) as pool:
+            futures = [
+                pool.submit(_enroll_from_archive, job_id, archive_path, sid, names)
+                for sid, names in targets.items()
+            ]
+            for f in futures:
+                try:
+                    f.result()
+                except Exception as e:
+                    print(f"Error in import job {job_id}: {e}")
+                    with _jobs_lock:
+                        import_jobs[job_id]["failed_students"] += 1
+        _update_job(job_id, status="done", finished_at=datetime.now().isoformat())
+    except Exception as e:
+        print(f"Import job {job_id} failed: {e}")
+        _update_job(job_id, status="failed", error=str(e), finished_at=datetime.now().isoformat())
+    finally:
+        try:
+            os.remove(archive_path)
+        except OSError:
+            pass
+
+def _purge_old_jobs():
+    now = datetime.now()
+    with _jobs_lock:
+        for job_id in list(import_jobs):
+            finished = import_jobs[job_id].get("finished_at")
+            if finished and (now - datetime.fromisoformat(finished)).total_seconds() > IMPORT_JOB_TTL_SECONDS:
+                del import_jobs[job_id]
+
+def start_import(school_id, roster_bytes, archive_path):
+    """
+    Insert the roster synchronously, then queue embedding extraction for
+    students that have photos in the archive. archive_path is owned by the job.
+    """
+    # Until the job is submitted the archive is ours to delete
+    try:
+        _purge_old_jobs()
+        try:
+            rows, errors = parse_roster(roster_bytes)
+        except UnicodeDecodeError:
+            raise HTTPException(status_code=400, detail="Roster must be a UTF-8 encoded CSV")
+
+        # Validate the archive before touching the DB: a retry after a bad
+        # archive would otherwise see these students as existing and skip them
+        try:
+            with zipfile.ZipFile(archive_path) as zf:
+                photos = index_archive(zf)
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail="Invalid photo archive")
+
+        inserted, existing = insert_roster(school_id, rows) if rows else ([], [])
+
+        inserted_set = set(inserted)
+        targets = {sid: names for sid, names in photos.items() if sid in inserted_set}
+        unmatched = sorted(sid for sid in photos if sid not in inserted_set)
+
+        job_id = uuid.uuid4().hex
+        with _jobs_lock:
+            import_jobs[job_id] = {
+                "job_id": job_id,
+                "school_id": school_id,
+                "status": "queued",
+                "created_at": datetime.now().isoformat(),
+                "inserted_students": len(inserted),
+                "existing_students": existing,
+                "roster_errors": errors,
+                "unmatched_photo_dirs": unmatched,
+                "total_students": len(targets),
+                "total_photos": sum(len(n) for n in targets.values()),
+                "processed_students": 0,
+                "processed_photos": 0,
+                "failed_students": 0,
+                "results": {},
+            }
+    except Exception:
+        try:
+            os.remove(archive_path)
+        except OSError:
+            pass
+        raise
+    _executor.submit(_run_import_job, job_id, archive_path, targets)
+    return get_import_job(job_id, school_id)
+
+def get_import_job(job_id, school_id):
+    with _jobs_lock:
+        job = import_jobs.get(job_id)
+        if not job or job["school_id"] != school_id:
+            return None
+        snapshot = dict(job)
+        snapshot["results"] = dict(job["results"])
+    total = snapshot["total_photos"]
+    snapshot["progress"] = round(snapshot["processed_photos"] / total, 4) if total else 1.0
+    return snapshot
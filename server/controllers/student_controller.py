@@ -6,10 +6,13 @@ import os
 import uuid
 import json
 import numpy as np
-import cv2
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 from server.utils import face_utils
 
+# Enrollment settings
+ENROLLMENT_WORKERS = 4
+
 # Paths
 DATASET_PATH_STUDENTS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "ml", "dataset", "students")
 
@@ -71,8 +74,11 @@ def get_student_by_id(student_id):
             if student.get('birth_date'):
                 student['birth_date'] = str(student['birth_date'])
             
-            # Get face embeddings count
-            cursor.execute("SELECT COUNT(*) as face_count FROM face_embeddings WHERE student_id = %s", (student_id,))
+            # Get face embeddings count (active model only: quarantined vectors need re-enrollment)
+            cursor.execute(
+                "SELECT COUNT(*) as face_count FROM face_embeddings WHERE student_id = %s AND model_name = %s",
+                (student_id, face_utils.active_model_name())
+            )
             result = cursor.fetchone()
             student['face_count'] = result['face_count'] if result else 0
                 
@@ -129,65 +135,143 @@ def _insert_face_embedding(student_id, embedding, embedding_type="enrollment"):
         return
     try:
         cursor = conn.cursor()
-        sql = "INSERT INTO face_embeddings (student_id, embedding, embedding_type) VALUES (%s, %s, %s)"
-        cursor.execute(sql, (student_id, json.dumps(embedding), embedding_type))
+        sql = "INSERT INTO face_embeddings (student_id, embedding, embedding_type, model_name) VALUES (%s, %s, %s, %s)"
+        cursor.execute(sql, (student_id, json.dumps(embedding), embedding_type, face_utils.active_model_name()))
         conn.commit()
     except Exception as e:
         print(f"Error inserting embedding: {e}")
     finally:
         if conn: conn.close()
 
-def _upsert_face_profile(student_id, mean_embedding, sample_count):
-    # Optional: Update a face profile table if it exists, or just pass
-    pass
+def _refresh_face_profile(student_id):
+    conn = get_db_connection()
+    if not conn:
+        return
+    try:
+        cursor = conn.cursor()
+        _refresh_face_profile_with_cursor(cursor, student_id)
+        conn.commit()
+    except Exception as e:
+        print(f"Error refreshing face profile: {e}")
+    finally:
+        if conn: conn.close()
+
+def _refresh_face_profile_with_cursor(cursor, student_id):
+    """
+    Recompute the mean profile from all of the student's active-model
+    embeddings, so adding photos extends the profile instead of replacing it.
+    """
+    model_name = face_utils.active_model_name()
+    cursor.execute(
+        "SELECT embedding FROM face_embeddings WHERE student_id = %s AND model_name = %s",
+        (student_id, model_name)
+    )
+    vectors = []
+    for (emb,) in cursor.fetchall():
+        try:
+            vectors.append(json.loads(emb))
+        except (TypeError, ValueError):
+            continue
+    if not vectors:
+        return
+    mean_vec = np.mean(np.asarray(vectors, dtype=np.float64), axis=0)
+    _upsert_face_profile_with_cursor(cursor, student_id, json.dumps(mean_vec.tolist()), len(vectors))
+
+def _upsert_face_profile_with_cursor(cursor, student_id, mean_embedding, sample_count):
+    sql = """
+    INSERT INTO student_face_profile (student_id, mean_embedding, emb_count, model_name)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE mean_embedding = VALUES(mean_embedding), emb_count = VALUES(emb_count),
+                            model_name = VALUES(model_name)
+    """
+    cursor.execute(sql, (student_id, mean_embedding, sample_count, face_utils.active_model_name()))
+
+def _save_enrollment(student_id, encs, embedding_type="enrollment"):
+    """Write all accepted embeddings and the refreshed mean profile in a single transaction."""
+    conn = get_db_connection()
+    if not conn:
+        return False
+    try:
+        cursor = conn.cursor()
+        model_name = face_utils.active_model_name()
+        rows = [(student_id, json.dumps(emb.tolist()), embedding_type, model_name) for emb in encs]
+        cursor.executemany(
+            "INSERT INTO face_embeddings (student_id, embedding, embedding_type, model_name) VALUES (%s, %s, %s, %s)",
+            rows
+        )
+        try:
+            _refresh_face_profile_with_cursor(cursor, student_id)
+        except mysql.connector.Error as e:
+            # Profile table is optional; embeddings are still committed
+            print(f"Face profile not updated: {e}")
+        conn.commit()
+        return True
+    except Exception as e:
+        print(f"Error saving embeddings: {e}")
+        conn.rollback()
+        return False
+    finally:
+        if conn: conn.close()
+
+def _analyze_photo(idx, p):
+    """
+    Decode one photo once, detect + embed, and grade quality on the face ROI.
+    Returns (detail, embedding or None).
+    """
+    img = face_utils.decode_base64_image(p)
+    if img is None:
+        print(f"DEBUG: Photo {idx} decode failed")
+        return {"index": idx, "status": "rejected", "reason": "decode_error"}, None
+    return _analyze_image(idx, img)
+
+def _analyze_image(idx, img):
+    """
+    Quality-graded detection + embedding for an already decoded BGR image.
+    Quality is checked on the face ROI first, so rejected photos never reach
+    the embedding model.
+    """
+    boxes = face_utils.detect_faces(img)
+    print(f"DEBUG: Photo {idx} found {len(boxes)} faces")
+
+    if not boxes:
+        return {"index": idx, "status": "rejected", "reason": "no_face"}, None
+    if len(boxes) > 1:
+        return {"index": idx, "status": "rejected", "reason": "multiple_faces"}, None
+    box = boxes[0]
+
+    reason, quality = face_utils.check_face_quality(img, box, "enrollment")
+    print(f"DEBUG: Photo {idx} metrics: {quality}")
+    if reason:
+        return {"index": idx, "status": "rejected", "reason": reason}, None
+
+    embeddings = face_utils.embed_faces(img, [box])
+    if not embeddings:
+        return {"index": idx, "status": "rejected", "reason": "no_face"}, None
+    return {"index": idx, "status": "accepted"}, np.array(embeddings[0])
 
 def process_student_photos(student_id, photos):
     print(f"DEBUG: Processing photos for student_id: {student_id}, count: {len(photos)}")
-    from server.utils import face_utils
-    details = []
-    encs = []
-    
+    jobs = []
     for idx, p in enumerate(photos):
         # Skip if not base64 (e.g. existing URL)
         if not p or not isinstance(p, str) or not p.startswith('data:image'):
             print(f"DEBUG: Photo {idx} skipped (not base64)")
             continue
+        jobs.append((idx, p))
 
-        print(f"DEBUG: Processing photo {idx}")
-        img = face_utils.decode_base64_image(p)
-        if img is None:
-            print(f"DEBUG: Photo {idx} decode failed")
-            details.append({"index": idx, "status": "rejected", "reason": "decode_error"})
-            continue
-            
-        pairs = face_utils.get_face_encodings_and_boxes_from_base64(p)
-        print(f"DEBUG: Photo {idx} found {len(pairs)} faces")
-        
-        if not pairs or len(pairs) == 0:
-            details.append({"index": idx, "status": "rejected", "reason": "no_face"})
-            continue
-        if len(pairs) > 1:
-            details.append({"index": idx, "status": "rejected", "reason": "multiple_faces"})
-            continue
-        emb, box = pairs[0]
+    results = []
+    if jobs:
+        workers = min(ENROLLMENT_WORKERS, len(jobs))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            # map() keeps the original photo order in the details list
+            results = list(pool.map(lambda job: _analyze_photo(*job), jobs))
 
-        metrics = face_utils.get_quality_metrics(img, box)
-        print(f"DEBUG: Photo {idx} metrics: {metrics}")
-        
-        if metrics["area_ratio"] < 0.04:
-            details.append({"index": idx, "status": "rejected", "reason": "face_too_small"})
-            continue
-        if metrics["blur"] < 80.0:
-            details.append({"index": idx, "status": "rejected", "reason": "blurry"})
-            continue
-        if metrics["brightness"] < 40.0:
-            details.append({"index": idx, "status": "rejected", "reason": "too_dark"})
-            continue
-        if metrics["brightness"] > 215.0:
-            details.append({"index": idx, "status": "rejected", "reason": "too_bright"})
-            continue
-        details.append({"index": idx, "status": "accepted"})
-        encs.append(np.array(emb))
+    return _finish_enrollment(student_id, results)
+
+def _finish_enrollment(student_id, results):
+    """Build the quality summary from (detail, embedding) pairs and persist accepted embeddings."""
+    details = [detail for detail, _ in results]
+    encs = [emb for _, emb in results if emb is not None]
     
     accepted_count = sum(1 for d in details if d["status"] == "accepted")
     print(f"DEBUG: Accepted count: {accepted_count}")
@@ -200,16 +284,9 @@ def process_student_photos(student_id, photos):
     }
     
     if accepted_count > 0:
-        mean_vec = np.mean(np.stack(encs, axis=0), axis=0)
-        try:
-            print("DEBUG: Inserting embeddings into DB...")
-            for emb in encs:
-                _insert_face_embedding(student_id, emb.tolist(), "enrollment")
-            _upsert_face_profile(student_id, json.dumps(mean_vec.tolist()), accepted_count)
+        print("DEBUG: Inserting embeddings into DB...")
+        if _save_enrollment(student_id, encs, "enrollment"):
             print("DEBUG: Insert successful")
-        except Exception as e:
-            print(f"Error saving embeddings: {e}")
-            pass
             
     return quality_summary
 
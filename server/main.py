@@ -1,19 +1,28 @@
 import warnings
 warnings.filterwarnings("ignore", category=UserWarning, message="pkg_resources is deprecated as an API")
 warnings.filterwarnings("ignore", category=UserWarning, module="face_recognition_models")
+import os
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from server.config.database import init_db
-from server.routes import student_routes, auth_routes, school_routes, class_routes, teacher_routes
+from server.routes import student_routes, auth_routes, school_routes, class_routes, teacher_routes, debug_routes
 from server.controllers import attendance_controller
 from server.controllers.auth_controller import seed_admin_if_not_exists
 from server.middleware.error_handler import add_exception_handlers
+from server.utils import metrics
 import uvicorn
 
-# Başlangıçta veritabanını başlat
-# Not: Tablolar yoksa oluşturulacaktır
-init_db()
-seed_admin_if_not_exists()
+# Sunucu rolü (SERVER_ROLE ortam değişkeni):
+#   all       -> tüm endpoint'ler tek süreçte (varsayılan, geliştirme için)
+#   api       -> sadece CRUD/panel endpoint'leri; ML kütüphaneleri ve model hiç yüklenmez
+#   inference -> yüz vektörü üreten endpoint'ler: /api/attendance/scan ve /events,
+#                /api/students/{id}/faces ve /api/students/import; model başlangıçta yüklenir
+# Ayrık dağıtımda ters vekil (reverse proxy) bu yolları inference sürecine yönlendirir.
+# Ağır kütüphaneler (cv2, faiss, deepface/TensorFlow) ilk tanıma isteğinde yüklenir.
+SERVER_ROLE = os.environ.get("SERVER_ROLE", "all")
+if SERVER_ROLE not in ("all", "api", "inference"):
+    raise ValueError(f"Unknown SERVER_ROLE: {SERVER_ROLE}")
 
 app = FastAPI(title="Attendance System API", description="Akıllı Yoklama Sistemi - API Backend")
 
@@ -31,18 +40,44 @@ app.add_middleware(
 )
 
 # Router dosyalarını ana uygulamaya bağla
-app.include_router(auth_routes.router, prefix="/api/auth")
-app.include_router(student_routes.router, prefix="/api/students")
-app.include_router(attendance_controller.router, prefix="/api/attendance")
-app.include_router(school_routes.router, prefix="/api/school")
-app.include_router(class_routes.router, prefix="/api/classes")
-app.include_router(teacher_routes.router, prefix="/api/teachers")
+if SERVER_ROLE in ("all", "inference"):
+    # /import yolları /{student_id} yolundan önce eşleşmeli
+    app.include_router(student_routes.inference_router, prefix="/api/students")
+if SERVER_ROLE in ("all", "api"):
+    app.include_router(auth_routes.router, prefix="/api/auth")
+    app.include_router(student_routes.router, prefix="/api/students")
+    app.include_router(attendance_controller.router, prefix="/api/attendance")
+    app.include_router(school_routes.router, prefix="/api/school")
+    app.include_router(class_routes.router, prefix="/api/classes")
+    app.include_router(teacher_routes.router, prefix="/api/teachers")
+if SERVER_ROLE in ("all", "inference"):
+    app.include_router(attendance_controller.inference_router, prefix="/api/attendance")
+app.include_router(debug_routes.router, prefix="/api/debug")
+
+@app.on_event("startup")
+def on_startup():
+    # Başlangıçta veritabanını başlat (şema API sürecinin sorumluluğunda)
+    # Not: Tablolar yoksa oluşturulacaktır
+    if SERVER_ROLE in ("all", "api"):
+        init_db()
+        seed_admin_if_not_exists()
+    if SERVER_ROLE == "inference":
+        # İlk kiosk isteği model yüklemesini beklemesin
+        from server.utils import face_utils
+        print(f"[INFO] Inference models loaded in {face_utils.warmup():.2f}s")
 
 @app.get("/")
 def read_root():
-    return {"message": "Yoklama Sistemi API'sine Hoş Geldiniz. Swagger UI için /docs adresine gidin."}
+    return {"message": "Yoklama Sistemi API'sine Hoş Geldiniz. Swagger UI için /docs adresine gidin.", "role": SERVER_ROLE}
+
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    """Prometheus metrics (text exposition format)"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 if __name__ == "__main__":
     # Sunucuyu başlat
     # Terminalden çalıştırmak için: uvicorn server.main:app --reload
+    # Ayrık dağıtım: SERVER_ROLE=api uvicorn server.main:app --workers 4
+    #                SERVER_ROLE=inference uvicorn server.main:app --port 8001 --workers 2
     uvicorn.run("server.main:app", host="0.0.0.0", port=8000, reload=True)
@@ -43,6 +43,9 @@ TRANSLATIONS = {
     "Yönetici bir okula ait olmalıdır": "Yönetici bir okula ait olmalıdır",
     "Yetkisiz erişim": "Yetkisiz erişim",
     "Silme işlemi başarısız oldu": "Silme işlemi başarısız oldu",
+    "Import job not found": "İçe aktarma işi bulunamadı",
+    "Invalid photo archive": "Geçersiz fotoğraf arşivi",
+    "Server busy": "Sunucu yoğun, lütfen tekrar deneyin",
 }
 
 def translate_message(msg: str) -> str:
@@ -86,7 +89,9 @@ async def http_exception_handler(request: Request, exc: StarletteHTTPException):
             "success": False,
             "message": translated_detail,
             "code": exc.status_code
-        }
+        },
+        # e.g. Retry-After on 503, WWW-Authenticate on 401
+        headers=getattr(exc, "headers", None)
     )
 
 async def db_exception_handler(request: Request, exc: mysql.connector.Error):
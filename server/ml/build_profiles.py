@@ -0,0 +1,248 @@
+"""
+Identity profile builder producing ml/output/identity_profiles.pkl.
+
+For every identity the builder measures:
+  - the genuine distribution: cosine distance of its own samples to its mean embedding
+  - the nearest impostor: smallest distance from any other identity's sample to its mean
+and derives a per-identity acceptance threshold used by decision_engine.
+
+All distances come from blocked matrix products (samples x centroids), so memory
+stays bounded by PROFILE_BLOCK_ELEMENTS regardless of how many embeddings exist.
+
+Usage (from the repository root):
+    python -m server.ml.build_profiles                       # from extract_embeddings output
+    python -m server.ml.build_profiles --from-db             # from face_embeddings
+    python -m server.ml.build_profiles --from-db --incremental
+"""
+import argparse
+import json
+import os
+import pickle
+import time
+import numpy as np
+
+from server.controllers.attendance.config import T_DIST, MARGIN
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_PROFILES_PATH = os.path.join(BASE_DIR, "ml", "output", "identity_profiles.pkl")
+DEFAULT_EMBEDDINGS_DIR = os.path.join(BASE_DIR, "ml", "output", "embeddings")
+
+# Upper bound on elements of one similarity block (float32): 16M -> ~64 MB
+PROFILE_BLOCK_ELEMENTS = 16 * 1024 * 1024
+GENUINE_PERCENTILE = 95
+# Keep the threshold this far below the nearest impostor
+IMPOSTOR_GAP = MARGIN
+MIN_THRESHOLD = 0.20
+MIN_SAMPLES = 2
+
+def _normalize_rows(block):
+    block = np.asarray(block, dtype=np.float32)
+    norms = np.linalg.norm(block, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return block / norms
+
+def _row_blocks(n_rows, n_cols):
+    step = max(1, PROFILE_BLOCK_ELEMENTS // max(1, n_cols))
+    for start in range(0, n_rows, step):
+        yield start, min(n_rows, start + step)
+
+def compute_centroids(matrix, labels, n_ids):
+    """Normalized mean embedding per identity, accumulated block by block."""
+    dim = matrix.shape[1]
+    sums = np.zeros((n_ids, dim), dtype=np.float64)
+    counts = np.bincount(labels, minlength=n_ids)
+    for start, end in _row_blocks(matrix.shape[0], dim):
+        np.add.at(sums, labels[start:end], _normalize_rows(matrix[start:end]))
+    means = sums / np.maximum(counts, 1)[:, None]
+    return _normalize_rows(means), counts
+
+def genuine_distances(matrix, labels, centroids, rows=None):
+    """Distance of each sample to its own centroid (row-wise dot, no pair loops)."""
+    rows = np.arange(matrix.shape[0]) if rows is None else rows
+    out = np.empty(len(rows), dtype=np.float32)
+    for start, end in _row_blocks(len(rows), matrix.shape[1]):
+        idx = rows[start:end]
+        x = _normalize_rows(matrix[idx])
+        out[start:end] = 1.0 - np.einsum("ij,ij->i", x, centroids[labels[idx]])
+    return out
+
+def nearest_impostor(matrix, labels, centroids, cols, rows=None):
+    """
+    For each centroid in `cols`, the smallest distance from a sample of a
+    different identity. Computed in (rows x cols) blocks.
+    """
+    rows = np.arange(matrix.shape[0]) if rows is None else rows
+    cols = np.asarray(cols)
+    best_sim = np.full(len(cols), -np.inf, dtype=np.float32)
+    if len(cols) == 0 or len(rows) == 0:
+        return 1.0 - best_sim
+    c_block = centroids[cols].T
+    col_pos = np.full(centroids.shape[0], -1, dtype=np.int64)
+    col_pos[cols] = np.arange(len(cols))
+    for start, end in _row_blocks(len(rows), len(cols)):
+        idx = rows[start:end]
+        sims = _normalize_rows(matrix[idx]) @ c_block
+        # Mask each sample's own identity column
+        own = col_pos[labels[idx]]
+        hit = own >= 0
+        sims[np.nonzero(hit)[0], own[hit]] = -np.inf
+        np.maximum(best_sim, sims.max(axis=0), out=best_sim)
+    return 1.0 - best_sim
+
+def genuine_percentiles(dists, labels, n_ids, q):
+    """Per-identity percentile of genuine distances via one lexsort."""
+    order = np.lexsort((dists, labels))
+    sorted_d = dists[order]
+    counts = np.bincount(labels, minlength=n_ids)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    pos = starts + np.floor((q / 100.0) * np.maximum(counts - 1, 0)).astype(np.int64)
+    pos = np.minimum(pos, max(len(sorted_d) - 1, 0))
+    result = np.full(n_ids, np.nan, dtype=np.float32)
+    has = counts > 0
+    result[has] = sorted_d[pos[has]]
+    median_pos = np.minimum(starts + (np.maximum(counts - 1, 0) // 2), max(len(sorted_d) - 1, 0))
+    medians = np.full(n_ids, np.nan, dtype=np.float32)
+    medians[has] = sorted_d[median_pos[has]]
+    return result, medians
+
+def derive_threshold(genuine_hi, impostor_min):
+    """Accept up to the genuine percentile, but never within IMPOSTOR_GAP of an impostor."""
+    threshold = min(float(genuine_hi), float(impostor_min) - IMPOSTOR_GAP)
+    return float(min(T_DIST, max(MIN_THRESHOLD, threshold)))
+
+def build_profiles(matrix, identities, existing=None, targets=None):
+    """
+    matrix: (N, 128) embeddings (may be a read-only memmap)
+    identities: length-N array of identity ids (student_id strings)
+    existing/targets: for incremental rebuilds, the previous profiles and the
+        identities to recompute. Other profiles only get their nearest-impostor
+        distance tightened by the targets' samples.
+    """
+    identities = np.asarray(identities).astype(str)
+    ids, labels = np.unique(identities, return_inverse=True)
+    labels = labels.astype(np.int64)
+    centroids, counts = compute_centroids(matrix, labels, len(ids))
+
+    if existing is None or targets is None:
+        target_idx = np.arange(len(ids))
+        existing = {}
+    else:
+        wanted = set(str(t) for t in targets) | (set(ids) - set(existing))
+        target_idx = np.array([i for i, sid in enumerate(ids) if sid in wanted], dtype=np.int64)
+
+    is_target = np.zeros(len(ids), dtype=bool)
+    is_target[target_idx] = True
+    target_rows = np.nonzero(is_target[labels])[0]
+
+    # Genuine stats for recomputed identities only
+    g = genuine_distances(matrix, labels, centroids, target_rows)
+    hi, med = genuine_percentiles(g, labels[target_rows], len(ids), GENUINE_PERCENTILE)
+
+    # Impostors for target centroids come from every sample
+    imp_target = nearest_impostor(matrix, labels, centroids, target_idx)
+
+    profiles = dict(existing)
+    for pos, i in enumerate(target_idx):
+        if counts[i] < MIN_SAMPLES:
+            profiles.pop(ids[i], None)
+            continue
+        profiles[ids[i]] = {
+            "threshold": derive_threshold(hi[i], imp_target[pos]),
+            "genuine_median": float(med[i]),
+            "genuine_p95": float(hi[i]),
+            "nearest_impostor": float(imp_target[pos]),
+            "count": int(counts[i]),
+        }
+
+    # Existing identities: new samples may sit closer than their old nearest impostor
+    others = np.nonzero(~is_target)[0]
+    others = np.array([i for i in others if ids[i] in profiles], dtype=np.int64)
+    if len(others) and len(target_rows):
+        imp_other = nearest_impostor(matrix, labels, centroids, others, target_rows)
+        for pos, i in enumerate(others):
+            prof = profiles[ids[i]]
+            if imp_other[pos] < prof.get("nearest_impostor", np.inf):
+                prof["nearest_impostor"] = float(imp_other[pos])
+                prof["threshold"] = derive_threshold(prof.get("genuine_p95", T_DIST), prof["nearest_impostor"])
+
+    return profiles
+
+def load_from_db(school_id=None):
+    """Returns (matrix, identities) from face_embeddings."""
+    from server.config.database import get_db_connection
+    from server.utils.embedding_engine import active_model_name
+
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Database connection failed")
+    try:
+        cursor = conn.cursor()
+        sql = """
+            SELECT fe.student_id, fe.embedding
+            FROM face_embeddings fe
+            JOIN students s ON fe.student_id = s.student_id
+            WHERE COALESCE(s.is_active, 1) = 1
+              AND fe.model_name = %s
+        """
+        params = (active_model_name(),)
+        if school_id:
+            sql += " AND s.school_id = %s"
+            params += (school_id,)
+        cursor.execute(sql, params)
+        ids = []
+        vectors = []
+        for sid, emb in cursor:
+            if not emb:
+                continue
+            try:
+                vectors.append(json.loads(emb))
+                ids.append(str(sid))
+            except Exception:
+                continue
+        matrix = np.asarray(vectors, dtype=np.float32).reshape(-1, 128)
+        return matrix, np.array(ids)
+    finally:
+        conn.close()
+
+def save_profiles(profiles, path=DEFAULT_PROFILES_PATH):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(profiles, f)
+    os.replace(tmp_path, path)
+
+def load_profiles(path=DEFAULT_PROFILES_PATH):
+    if not os.path.exists(path):
+        return {}
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build identity_profiles.pkl")
+    parser.add_argument("--embeddings", default=DEFAULT_EMBEDDINGS_DIR, help="extract_embeddings output directory")
+    parser.add_argument("--from-db", action="store_true", help="Read embeddings from face_embeddings instead")
+    parser.add_argument("--school-id", type=int, default=None)
+    parser.add_argument("--out", default=DEFAULT_PROFILES_PATH)
+    parser.add_argument("--incremental", action="store_true",
+                        help="Keep existing profiles; recompute new identities and --ids only")
+    parser.add_argument("--ids", nargs="*", default=[], help="Identities to recompute in incremental mode")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.from_db:
+        matrix, identities = load_from_db(args.school_id)
+    else:
+        from server.ml.extract_embeddings import load_embeddings
+        matrix, identities, _ = load_embeddings(args.embeddings)
+    print(f"[INFO] Loaded {matrix.shape[0]} embeddings for {len(set(identities))} identities.")
+
+    existing = load_profiles(args.out) if args.incremental else None
+    profiles = build_profiles(matrix, identities, existing=existing, targets=args.ids if args.incremental else None)
+    save_profiles(profiles, args.out)
+
+    thresholds = np.array([p["threshold"] for p in profiles.values()]) if profiles else np.zeros(1)
+    print(f"[RESULT] {len(profiles)} profiles -> {args.out} in {time.perf_counter() - start:.1f}s "
+          f"(threshold median={np.median(thresholds):.4f}, min={thresholds.min():.4f}, max={thresholds.max():.4f})")
+
+if __name__ == "__main__":
+    main()
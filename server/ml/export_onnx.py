@@ -0,0 +1,52 @@
+"""
+Export DeepFace's Facenet (Keras) to ONNX for the onnx inference backend.
+
+Writes <out> (fp32) and, with --int8, <out minus .onnx>.int8.onnx using ONNX
+Runtime dynamic quantization (weights int8, activations quantized at run time).
+
+Needs tensorflow, deepface and tf2onnx (export only; serving needs just onnxruntime).
+
+Usage (from the repository root):
+    python -m server.ml.export_onnx --int8
+    INFERENCE_BACKEND=onnx ONNX_INT8=1 ONNX_INTRA_OP_THREADS=2 uvicorn server.main:app
+"""
+import argparse
+import os
+
+from server.utils.embedding_engine import ONNX_MODEL_PATH, FACENET_INPUT_SIZE, int8_model_path
+
+def export_fp32(out_path, opset):
+    import tensorflow as tf
+    import tf2onnx
+    from deepface import DeepFace
+
+    model = DeepFace.build_model("Facenet")
+    keras_model = getattr(model, "model", model)
+    spec = (tf.TensorSpec((None, FACENET_INPUT_SIZE, FACENET_INPUT_SIZE, 3), tf.float32, name="input"),)
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    tf2onnx.convert.from_keras(keras_model, input_signature=spec, opset=opset, output_path=out_path)
+    print(f"[INFO] Wrote {out_path} ({os.path.getsize(out_path) / 1e6:.1f} MB)")
+
+def quantize_int8(fp32_path):
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    out_path = int8_model_path(fp32_path)
+    quantize_dynamic(fp32_path, out_path, weight_type=QuantType.QInt8)
+    print(f"[INFO] Wrote {out_path} ({os.path.getsize(out_path) / 1e6:.1f} MB)")
+    return out_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Export Facenet to ONNX")
+    parser.add_argument("--out", default=ONNX_MODEL_PATH)
+    parser.add_argument("--opset", type=int, default=13)
+    parser.add_argument("--int8", action="store_true", help="Also write a dynamically quantized int8 model")
+    parser.add_argument("--skip-export", action="store_true", help="Only quantize an existing fp32 model")
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        export_fp32(args.out, args.opset)
+    if args.int8:
+        quantize_int8(args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,236 @@
+"""
+Offline batch embedding extractor for dataset/DataSet.
+
+Walks person_<id>/ folders, runs detect + embed on a process pool and writes:
+    <out>/embeddings.npy   float32 (N, 128) matrix, open with np.load(..., mmap_mode="r")
+    <out>/labels.csv       row,identity,path (one line per matrix row)
+    <out>/shards/          resumable per-shard checkpoints
+Optionally bulk-loads the vectors into face_embeddings.
+
+Usage (from the repository root):
+    python -m server.ml.extract_embeddings --workers 8
+    python -m server.ml.extract_embeddings --load-db
+"""
+import argparse
+import csv
+import glob
+import hashlib
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_DATASET = os.path.join(BASE_DIR, "dataset", "DataSet")
+DEFAULT_OUTPUT = os.path.join(BASE_DIR, "ml", "output", "embeddings")
+EMBEDDING_DIM = 128
+SHARD_SIZE = 256
+DB_INSERT_CHUNK = 1000
+PERSON_DIR = re.compile(r"^person_(.+)$")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+def list_dataset(dataset_dir):
+    """Returns a stable, sorted list of (identity, path) pairs."""
+    items = []
+    for entry in sorted(os.listdir(dataset_dir)):
+        m = PERSON_DIR.match(entry)
+        person_dir = os.path.join(dataset_dir, entry)
+        if not m or not os.path.isdir(person_dir):
+            continue
+        for name in sorted(os.listdir(person_dir)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                items.append((m.group(1), os.path.join(person_dir, name)))
+    return items
+
+def _load_manifest(out_dir, items, shard_size):
+    """
+    Shards are only reusable if the file list, shard size and embedding model
+    match the previous run. A mismatching manifest invalidates old checkpoints.
+    """
+    from server.utils.embedding_engine import active_model_name
+
+    digest = hashlib.sha1("\n".join(p for _, p in items).encode("utf-8")).hexdigest()
+    manifest = {"files_sha1": digest, "count": len(items), "shard_size": shard_size,
+                "model_name": active_model_name()}
+    path = os.path.join(out_dir, "manifest.json")
+    shard_dir = os.path.join(out_dir, "shards")
+    if os.path.exists(path):
+        with open(path) as f:
+            previous = json.load(f)
+        if previous != manifest:
+            print("[INFO] Dataset changed since last run, discarding checkpoints.")
+            for old in glob.glob(os.path.join(shard_dir, "*.npz")):
+                os.remove(old)
+    os.makedirs(shard_dir, exist_ok=True)
+    with open(path, "w") as f:
+        json.dump(manifest, f)
+    return shard_dir
+
+def _shard_path(shard_dir, shard_no):
+    return os.path.join(shard_dir, f"shard_{shard_no:05d}.npz")
+
+def _embed_shard(shard_no, batch, shard_dir):
+    """
+    Worker: embed one shard and checkpoint it. Runs in a child process,
+    so the heavy face_utils import (TensorFlow) happens once per worker.
+    """
+    import cv2
+    from server.utils import face_utils
+
+    embeddings = []
+    rows = []
+    failed = 0
+    for identity, path in batch:
+        img = cv2.imread(path)
+        if img is None:
+            failed += 1
+            continue
+        pairs = face_utils.get_face_encodings_and_boxes_from_image(img)
+        if not pairs:
+            failed += 1
+            continue
+        # Dataset images are single-person: keep the largest face
+        emb, _ = max(pairs, key=lambda p: (p[1][2] - p[1][0]) * (p[1][1] - p[1][3]))
+        embeddings.append(np.asarray(emb, dtype=np.float32))
+        rows.append((identity, path))
+
+    matrix = np.stack(embeddings) if embeddings else np.zeros((0, EMBEDDING_DIM), dtype=np.float32)
+    tmp_path = _shard_path(shard_dir, shard_no) + ".tmp.npz"
+    np.savez(tmp_path,
+             embeddings=matrix,
+             identities=np.array([r[0] for r in rows], dtype=str),
+             paths=np.array([r[1] for r in rows], dtype=str))
+    # Atomic rename: a half-written shard is never mistaken for a checkpoint
+    os.replace(tmp_path, _shard_path(shard_dir, shard_no))
+    return shard_no, len(batch), len(rows), failed
+
+def extract(dataset_dir, out_dir, workers, shard_size=SHARD_SIZE, limit=None):
+    items = list_dataset(dataset_dir)
+    if limit:
+        items = items[:limit]
+    os.makedirs(out_dir, exist_ok=True)
+    shard_dir = _load_manifest(out_dir, items, shard_size)
+
+    shards = [items[i:i + shard_size] for i in range(0, len(items), shard_size)]
+    pending = [n for n in range(len(shards)) if not os.path.exists(_shard_path(shard_dir, n))]
+    print(f"[INFO] {len(items)} images, {len(shards)} shards, {len(shards) - len(pending)} already done.")
+
+    done_images = 0
+    failed_images = 0
+    pending_images = sum(len(shards[n]) for n in pending)
+    start = time.perf_counter()
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_embed_shard, n, shards[n], shard_dir) for n in pending]
+            for f in as_completed(futures):
+                shard_no, total, ok, failed = f.result()
+                done_images += total
+                failed_images += failed
+                elapsed = time.perf_counter() - start
+                rate = done_images / elapsed if elapsed > 0 else 0.0
+                print(f"[PROGRESS] shard {shard_no}: {ok}/{total} ok | "
+                      f"{done_images}/{pending_images} images | {rate:.2f} img/s")
+
+    elapsed = time.perf_counter() - start
+    if done_images:
+        print(f"[RESULT] {done_images} images in {elapsed:.1f}s "
+              f"({done_images / elapsed:.2f} img/s, {workers} workers), {failed_images} without a face.")
+
+    return assemble(out_dir, shard_dir, len(shards))
+
+def assemble(out_dir, shard_dir, shard_count):
+    """Concatenate shards into one memory-mappable matrix plus a label index."""
+    counts = []
+    for n in range(shard_count):
+        with np.load(_shard_path(shard_dir, n)) as z:
+            counts.append(z["embeddings"].shape[0])
+    total = int(sum(counts))
+
+    matrix_path = os.path.join(out_dir, "embeddings.npy")
+    labels_path = os.path.join(out_dir, "labels.csv")
+    matrix = np.lib.format.open_memmap(matrix_path, mode="w+", dtype=np.float32, shape=(total, EMBEDDING_DIM))
+    row = 0
+    with open(labels_path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["row", "identity", "path"])
+        for n in range(shard_count):
+            with np.load(_shard_path(shard_dir, n)) as z:
+                emb = z["embeddings"]
+                matrix[row:row + emb.shape[0]] = emb
+                for identity, path in zip(z["identities"], z["paths"]):
+                    writer.writerow([row, identity, path])
+                    row += 1
+    matrix.flush()
+    del matrix
+    print(f"[INFO] Wrote {total} embeddings to {matrix_path}")
+    return matrix_path, labels_path
+
+def load_embeddings(out_dir=DEFAULT_OUTPUT):
+    """Returns (memory-mapped matrix, identities array, paths list)."""
+    matrix = np.load(os.path.join(out_dir, "embeddings.npy"), mmap_mode="r")
+    identities = []
+    paths = []
+    with open(os.path.join(out_dir, "labels.csv"), newline="") as f:
+        for rec in csv.DictReader(f):
+            identities.append(rec["identity"])
+            paths.append(rec["path"])
+    return matrix, np.array(identities), paths
+
+def bulk_load_to_db(out_dir, source="dataset"):
+    """Insert vectors into face_embeddings for identities that exist as students."""
+    from server.config.database import get_db_connection
+
+    matrix, identities, _ = load_embeddings(out_dir)
+    # Tag rows with the model that produced them, not the one active now
+    with open(os.path.join(out_dir, "manifest.json")) as f:
+        model_name = json.load(f)["model_name"]
+    conn = get_db_connection()
+    if not conn:
+        print("[ERROR] Database connection failed.")
+        return 0
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT student_id FROM students")
+        known = {str(r[0]) for r in cursor.fetchall()}
+        sql = "INSERT INTO face_embeddings (student_id, embedding, embedding_type, model_name) VALUES (%s, %s, %s, %s)"
+        inserted = 0
+        batch = []
+        for i, identity in enumerate(identities):
+            if identity not in known:
+                continue
+            batch.append((identity, json.dumps(matrix[i].tolist()), source, model_name))
+            if len(batch) >= DB_INSERT_CHUNK:
+                cursor.executemany(sql, batch)
+                inserted += len(batch)
+                batch = []
+        if batch:
+            cursor.executemany(sql, batch)
+            inserted += len(batch)
+        conn.commit()
+        print(f"[INFO] Inserted {inserted} embeddings ({len(set(identities) - known)} identities without a student row skipped).")
+        return inserted
+    except Exception as e:
+        print(f"[ERROR] Bulk load failed: {e}")
+        conn.rollback()
+        return 0
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract Facenet embeddings from dataset/DataSet")
+    parser.add_argument("--dataset", default=DEFAULT_DATASET)
+    parser.add_argument("--out", default=DEFAULT_OUTPUT)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) - 1))
+    parser.add_argument("--shard-size", type=int, default=SHARD_SIZE)
+    parser.add_argument("--limit", type=int, default=None, help="Only process the first N images")
+    parser.add_argument("--load-db", action="store_true", help="Bulk-load results into face_embeddings")
+    args = parser.parse_args()
+
+    extract(args.dataset, args.out, args.workers, args.shard_size, args.limit)
+    if args.load_db:
+        bulk_load_to_db(args.out)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+One-time migration: tag face_embeddings rows written before model_name existed.
+
+Before vectors were tagged, two models wrote into face_embeddings:
+  - DeepFace Facenet: photo enrollment (process_student_photos) and active
+    learning from scans (source = 'active_learning')
+  - dlib (face_recognition): the single photo_url / face_encoding vector of
+    student create/update, stored with the same embedding_type as Facenet rows
+
+Active-learning rows are Facenet by construction. The remaining rows are told
+apart by vector norm: DeepFace returns raw (unnormalized) Facenet outputs with
+norms well above 1, while dlib descriptors are about unit length or shorter.
+Check the dry-run report for a clean gap before applying. Rows at or below
+--dlib-max-norm are tagged DLIB_EMBEDDING_MODEL, which no engine uses, so they
+are never searched again (those students re-enroll); the rest are tagged
+--facenet-model.
+
+Rows of the interim 'untagged' quarantine are migrated the same way.
+Without --apply nothing is written; the report shows the norm distribution
+of each group so the threshold can be checked first.
+
+Usage (from the repository root):
+    python -m server.ml.migrate_embedding_tags            # dry run
+    python -m server.ml.migrate_embedding_tags --apply
+"""
+import argparse
+import json
+import numpy as np
+
+from server.utils.embedding_engine import DLIB_EMBEDDING_MODEL
+
+# Quarantine tag used by an earlier init_db; treated like NULL here
+INTERIM_UNTAGGED = "untagged"
+UPDATE_BATCH = 1000
+
+def classify(source, embedding, dlib_max_norm, facenet_model):
+    """(model tag, vector norm or None) for one untagged row."""
+    try:
+        norm = float(np.linalg.norm(np.asarray(json.loads(embedding), dtype=np.float64)))
+    except (TypeError, ValueError):
+        return DLIB_EMBEDDING_MODEL, None
+    if source == "active_learning":
+        return facenet_model, norm
+    return (DLIB_EMBEDDING_MODEL if norm <= dlib_max_norm else facenet_model), norm
+
+def _norm_summary(norms):
+    if not norms:
+        return "-"
+    p = np.percentile(norms, [0, 5, 50, 95, 100])
+    return "min={:.3f} p5={:.3f} p50={:.3f} p95={:.3f} max={:.3f}".format(*p)
+
+def main():
+    parser = argparse.ArgumentParser(description="Tag legacy face_embeddings rows with their model")
+    parser.add_argument("--apply", action="store_true", help="Write the tags (default: report only)")
+    parser.add_argument("--facenet-model", default="Facenet", help="Tag for rows identified as DeepFace Facenet")
+    parser.add_argument("--dlib-max-norm", type=float, default=2.0,
+                        help="Enrollment rows with a vector norm at or below this are dlib")
+    args = parser.parse_args()
+
+    from server.config.database import get_db_connection
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Database connection failed")
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT id, source, embedding FROM face_embeddings WHERE model_name IS NULL OR model_name = %s",
+            (INTERIM_UNTAGGED,)
+        )
+        tags = {}
+        norms = {}
+        for row_id, source, embedding in cursor.fetchall():
+            tag, norm = classify(source, embedding, args.dlib_max_norm, args.facenet_model)
+            tags.setdefault(tag, []).append(row_id)
+            if norm is not None:
+                norms.setdefault((tag, source or "enrollment"), []).append(norm)
+
+        if not tags:
+            print("[INFO] No untagged face_embeddings rows.")
+            return
+        for (tag, source), values in sorted(norms.items()):
+            print(f"[{tag:>8s}] source={source:<15s} rows={len(values):<7d} norm {_norm_summary(values)}")
+        for tag, ids in sorted(tags.items()):
+            print(f"[RESULT] {len(ids)} rows -> model_name='{tag}'")
+
+        if not args.apply:
+            print("[INFO] Dry run; re-run with --apply to write these tags.")
+            return
+        for tag, ids in tags.items():
+            for i in range(0, len(ids), UPDATE_BATCH):
+                chunk = ids[i:i + UPDATE_BATCH]
+                placeholders = ", ".join(["%s"] * len(chunk))
+                cursor.execute(f"UPDATE face_embeddings SET model_name = %s WHERE id IN ({placeholders})",
+                               (tag, *chunk))
+        conn.commit()
+        print("[INFO] Tags written.")
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,127 +1,288 @@
-import mysql.connector
+import argparse
+import csv
+import json
+import os
 import random
-from config.database import get_db_connection
+import tempfile
+import time
+from datetime import datetime, timedelta
+import mysql.connector
+import numpy as np
+from server.config.database import get_db_connection, DB_CONFIG
 
 # Sample Data
 FIRST_NAMES = ["Ahmet", "Mehmet", "Ayşe", "Fatma", "Mustafa", "Zeynep", "Emre", "Elif", "Can", "Cem", "Deniz", "Ece", "Ali", "Veli", "Hakan", "Selin", "Murat", "Burak", "Esra", "Seda", "Kaan", "Gökhan", "İrem", "Ozan", "Pınar", "Sinan", "Tolga", "Umut", "Yağmur", "Eren"]
 LAST_NAMES = ["Yılmaz", "Kaya", "Demir", "Çelik", "Şahin", "Yıldız", "Yıldırım", "Öztürk", "Aydın", "Özdemir", "Arslan", "Doğan", "Kılıç", "Aslan", "Çetin", "Kara", "Koç", "Kurt", "Özkan", "Şimşek", "Polat", "Güler", "Bulut", "Keskin", "Ünal", "Turan", "Gül", "Erdoğan", "Sarı", "Yüksel"]
 
-def generate_name():
-    return random.choice(FIRST_NAMES), random.choice(LAST_NAMES)
+GRADES = [9, 10, 11, 12]
+SECTIONS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+BATCH_SIZE = 5000
+EMBEDDING_DIM = 128
+
+# Arrival window for generated attendance (school opens 08:00, late after 08:15)
+ARRIVAL_START = (7, 30)
+ARRIVAL_SPAN_MINUTES = 60
+LATE_AFTER = (8, 15)
+
+def generate_name(rng=random):
+    return rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
 
 def clear_data(cursor):
     print("Mevcut veriler temizleniyor...")
     # Order matters due to foreign keys
-    try:
-        cursor.execute("DELETE FROM attendance")
-    except: pass
-    try:
-        cursor.execute("DELETE FROM students")
-    except: pass
-    try:
-        cursor.execute("DELETE FROM classes")
-    except: pass
-    try:
-        cursor.execute("DELETE FROM teachers")
-    except: pass
+    for table in ["attendance", "face_embeddings", "students", "classes", "teachers"]:
+        try:
+            cursor.execute(f"DELETE FROM {table}")
+        except: pass
     print("Veriler temizlendi.")
 
-def populate():
+def insert_batches(cursor, conn, sql, rows, label):
+    """executemany in fixed-size batches, committing each one."""
+    total = 0
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            cursor.executemany(sql, batch)
+            conn.commit()
+            total += len(batch)
+            batch = []
+            print(f"{total} {label} eklendi...", end="\r")
+    if batch:
+        cursor.executemany(sql, batch)
+        conn.commit()
+        total += len(batch)
+    print(f"{total} {label} eklendi.    ")
+    return total
+
+def load_data_infile(table, columns, rows, label):
+    """
+    Write rows to a temporary TSV and bulk-load it with LOAD DATA LOCAL INFILE.
+    Needs local_infile enabled on the MySQL server.
+    """
+    conn = mysql.connector.connect(**DB_CONFIG, allow_local_infile=True)
+    tmp = tempfile.NamedTemporaryFile("w", suffix=".tsv", delete=False, newline="", encoding="utf-8")
+    try:
+        with tmp:
+            writer = csv.writer(tmp, delimiter="\t", lineterminator="\n")
+            count = 0
+            for row in rows:
+                writer.writerow(["\\N" if v is None else v for v in row])
+                count += 1
+        cursor = conn.cursor()
+        cursor.execute(
+            f"LOAD DATA LOCAL INFILE %s INTO TABLE {table} CHARACTER SET utf8mb4 "
+            f"FIELDS TERMINATED BY '\\t' LINES TERMINATED BY '\\n' ({', '.join(columns)})",
+            (tmp.name,)
+        )
+        conn.commit()
+        print(f"{count} {label} yüklendi (LOAD DATA).")
+        return count
+    finally:
+        conn.close()
+        os.remove(tmp.name)
+
+def bulk_insert(cursor, conn, table, columns, rows, label, use_load_data=False):
+    if use_load_data:
+        return load_data_infile(table, columns, rows, label)
+    placeholders = ", ".join(["%s"] * len(columns))
+    sql = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders})"
+    return insert_batches(cursor, conn, sql, rows, label)
+
+def get_or_create_schools(cursor, conn, count):
+    # Schema: school_id, school_name
+    cursor.execute("SELECT school_id FROM schools ORDER BY school_id LIMIT %s", (count,))
+    school_ids = [r[0] for r in cursor.fetchall()]
+    while len(school_ids) < count:
+        name = "HDSM Anadolu Lisesi" if not school_ids else f"HDSM Anadolu Lisesi {len(school_ids) + 1}"
+        print(f"Okul bulunamadı. Yeni okul oluşturuluyor: {name}")
+        cursor.execute("INSERT INTO schools (school_name) VALUES (%s)", (name,))
+        school_ids.append(cursor.lastrowid)
+    conn.commit()
+    return school_ids
+
+def next_student_number(cursor):
+    cursor.execute("SELECT COALESCE(MAX(CAST(student_id AS UNSIGNED)), 999) FROM students")
+    return int(cursor.fetchone()[0]) + 1
+
+def school_days(days, end_date):
+    """Weekdays in the last `days` calendar days, oldest first."""
+    for offset in range(days - 1, -1, -1):
+        day = end_date - timedelta(days=offset)
+        if day.weekday() < 5:
+            yield day
+
+def generate_attendance(rng, students, days, rate, school_id):
+    """
+    Yields (student_id, school_id, class_id, timestamp, status, method, confidence).
+    students: list of (student_id, class_id)
+    """
+    end_date = datetime.now().date()
+    late_minutes = LATE_AFTER[0] * 60 + LATE_AFTER[1]
+    start_minutes = ARRIVAL_START[0] * 60 + ARRIVAL_START[1]
+    for day in school_days(days, end_date):
+        midnight = datetime.combine(day, datetime.min.time())
+        for student_id, class_id in students:
+            if rng.random() >= rate:
+                continue
+            minute = start_minutes + rng.random() * ARRIVAL_SPAN_MINUTES
+            ts = midnight + timedelta(minutes=minute)
+            status = "late" if minute >= late_minutes else "present"
+            yield (student_id, school_id, class_id, ts.strftime("%Y-%m-%d %H:%M:%S"),
+                   status, "face", round(0.80 + rng.random() * 0.19, 4))
+
+def generate_embeddings(np_rng, student_ids, per_student, model_name, noise=0.15):
+    """
+    Synthetic Facenet-like vectors: one random identity direction plus per-sample noise.
+    Tagged with model_name so face_cache loads them for that engine.
+    """
+    for student_id in student_ids:
+        base = np_rng.standard_normal(EMBEDDING_DIM)
+        base /= np.linalg.norm(base)
+        for _ in range(per_student):
+            vec = base + noise * np_rng.standard_normal(EMBEDDING_DIM)
+            vec /= np.linalg.norm(vec)
+            yield (student_id, json.dumps(np.round(vec, 6).tolist()), "synthetic", model_name)
+
+def populate_school(cursor, conn, school_id, rng, np_rng, args, first_student_number):
+    # 2. Create Teachers (Supervisors)
+    # Schema: teacher_id, school_id, first_name, last_name, tc_no, birth_date, phone, email, is_active
+    print("Öğretmenler oluşturuluyor...")
+    teacher_rows = []
+    for i in range(args.teachers):
+        f_name, l_name = generate_name(rng)
+        teacher_rows.append((f_name, l_name, str(10000000000 + school_id * 100000 + i), school_id))
+    insert_batches(cursor, conn, """
+        INSERT INTO teachers (first_name, last_name, tc_no, school_id)
+        VALUES (%s, %s, %s, %s)
+    """, teacher_rows, "öğretmen")
+    cursor.execute("SELECT teacher_id FROM teachers WHERE school_id = %s ORDER BY teacher_id", (school_id,))
+    teacher_ids = [r[0] for r in cursor.fetchall()]
+
+    # 3. Create Classes
+    # Schema: class_id, school_id, class_name, grade_level, teacher_id, room_number, capacity, branch, schedule_time
+    print("Sınıflar oluşturuluyor...")
+    class_rows = []
+    for grade in GRADES:
+        for i in range(args.classes_per_grade):
+            section = SECTIONS[i % len(SECTIONS)]
+            class_rows.append((f"{grade}-{section}", grade, section, rng.choice(teacher_ids) if teacher_ids else None,
+                               school_id, 30, f"{grade}0{i+1}"))
+    insert_batches(cursor, conn, """
+        INSERT INTO classes (class_name, grade_level, branch, teacher_id, school_id, capacity, room_number)
+        VALUES (%s, %s, %s, %s, %s, %s, %s)
+    """, class_rows, "sınıf")
+    cursor.execute("SELECT class_id FROM classes WHERE school_id = %s ORDER BY class_id", (school_id,))
+    class_ids = [r[0] for r in cursor.fetchall()]
+
+    # 4. Distribute Students
+    # Schema: student_id, school_id, first_name, last_name, tc_no, class_id, is_active
+    print("Öğrenciler oluşturuluyor ve dağıtılıyor...")
+    students = []
+    student_rows = []
+    for i in range(args.students):
+        student_number = first_student_number + i
+        f_name, l_name = generate_name(rng)
+        # Distribute evenly
+        class_id = class_ids[i % len(class_ids)]
+        students.append((str(student_number), class_id))
+        student_rows.append((student_number, f_name, l_name, class_id, school_id, str(20000000000 + student_number)))
+    insert_batches(cursor, conn, """
+        INSERT INTO students (student_id, first_name, last_name, class_id, school_id, tc_no)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, student_rows, "öğrenci")
+
+    # 5. Synthetic embeddings
+    if args.embeddings_per_student > 0:
+        print("Sentetik yüz vektörleri oluşturuluyor...")
+        bulk_insert(cursor, conn, "face_embeddings", ["student_id", "embedding", "embedding_type", "model_name"],
+                    generate_embeddings(np_rng, [s for s, _ in students], args.embeddings_per_student,
+                                        args.model_name),
+                    "yüz vektörü", args.load_data)
+
+    # 6. Attendance history
+    if args.days > 0:
+        print(f"{args.days} günlük yoklama geçmişi oluşturuluyor...")
+        bulk_insert(cursor, conn, "attendance",
+                    ["student_id", "school_id", "class_id", "timestamp", "status", "verification_method", "confidence_score"],
+                    generate_attendance(rng, students, args.days, args.attendance_rate, school_id),
+                    "yoklama kaydı", args.load_data)
+
+    return len(students)
+
+def populate(args=None):
+    if args is None:
+        args = build_parser().parse_args([])
+    if not args.model_name:
+        # Only the tag is read; no model is loaded
+        from server.utils.embedding_engine import active_model_name
+        args.model_name = active_model_name()
+
     conn = get_db_connection()
     if not conn:
         print("Veritabanı bağlantısı başarısız.")
         return
 
     cursor = conn.cursor()
+    # Same seed -> same names, classes, embeddings and attendance
+    rng = random.Random(args.seed)
+    np_rng = np.random.default_rng(args.seed)
+    start = time.perf_counter()
 
     try:
-        # 1. Get School ID
-        # Schema: school_id, school_name
-        cursor.execute("SELECT school_id FROM schools LIMIT 1")
-        school = cursor.fetchone()
-        if not school:
-            print("Okul bulunamadı. Yeni okul oluşturuluyor...")
-            cursor.execute("INSERT INTO schools (school_name) VALUES ('HDSM Anadolu Lisesi')")
-            school_id = cursor.lastrowid
-        else:
-            school_id = school[0]
-        
-        print(f"İşlem yapılacak Okul ID: {school_id}")
+        if args.fast:
+            cursor.execute("SET SESSION unique_checks = 0")
+            cursor.execute("SET SESSION foreign_key_checks = 0")
+
+        # 1. Get School IDs
+        school_ids = get_or_create_schools(cursor, conn, args.schools)
+        print(f"İşlem yapılacak Okul ID'leri: {school_ids}")
 
         # Clear old data
-        clear_data(cursor)
-
-        # 2. Create Teachers (Supervisors)
-        # Schema: teacher_id, school_id, first_name, last_name, tc_no, birth_date, phone, email, is_active
-        print("Öğretmenler oluşturuluyor...")
-        teacher_ids = []
-        for i in range(100): # 100 Teachers
-            f_name, l_name = generate_name()
-            tc_no = str(10000000000 + i)
-            cursor.execute("""
-                INSERT INTO teachers (first_name, last_name, tc_no, school_id)
-                VALUES (%s, %s, %s, %s)
-            """, (f_name, l_name, tc_no, school_id))
-            teacher_ids.append(cursor.lastrowid)
-        print(f"{len(teacher_ids)} öğretmen oluşturuldu.")
-
-        # 3. Create Classes
-        # Schema: class_id, school_id, class_name, grade_level, teacher_id, room_number, capacity, branch, schedule_time
-        print("Sınıflar oluşturuluyor...")
-        grades = [9, 10, 11, 12] # Int based on schema 'grade_level' int
-        sections = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
-        class_ids = []
-        
-        total_students = 2000
-        classes_per_grade = 17 
-        
-        count = 0
-        for grade in grades:
-            for i in range(classes_per_grade):
-                section = sections[i]
-                class_name = f"{grade}-{section}"
-                
-                # Assign a random teacher as supervisor
-                teacher_id = random.choice(teacher_ids)
-                
-                cursor.execute("""
-                    INSERT INTO classes (class_name, grade_level, branch, teacher_id, school_id, capacity, room_number)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s)
-                """, (class_name, grade, section, teacher_id, school_id, 30, f"{grade}0{i+1}"))
-                class_ids.append(cursor.lastrowid)
-                count += 1
-        
-        print(f"{len(class_ids)} sınıf oluşturuldu.")
-
-        # 4. Distribute 2000 Students
-        # Schema: student_id, school_id, first_name, last_name, tc_no, class_id, is_active
-        print("Öğrenciler oluşturuluyor ve dağıtılıyor...")
-        
-        for i in range(total_students):
-            student_number = 1000 + i # Explicit ID
-            f_name, l_name = generate_name()
-            
-            # Distribute evenly
-            class_id = class_ids[i % len(class_ids)]
-            
-            cursor.execute("""
-                INSERT INTO students (student_id, first_name, last_name, class_id, school_id, tc_no)
-                VALUES (%s, %s, %s, %s, %s, %s)
-            """, (student_number, f_name, l_name, class_id, school_id, str(20000000000 + i)))
-            
-            if i % 100 == 0:
-                print(f"{i} öğrenci eklendi...", end="\r")
-                
-        print(f"\nToplam {total_students} öğrenci başarıyla eklendi.")
+        if not args.keep_existing:
+            clear_data(cursor)
+            conn.commit()
+
+        student_number = next_student_number(cursor)
+        total_students = 0
+        for school_id in school_ids:
+            print(f"--- Okul {school_id} ---")
+            created = populate_school(cursor, conn, school_id, rng, np_rng, args, student_number)
+            student_number += created
+            total_students += created
 
         conn.commit()
-        print("İşlem tamamlandı!")
+        print(f"\nToplam {total_students} öğrenci başarıyla eklendi.")
+        print(f"İşlem tamamlandı! ({time.perf_counter() - start:.1f} sn)")
 
     except Exception as e:
         print(f"Hata oluştu: {e}")
         conn.rollback()
     finally:
+        if args.fast:
+            try:
+                cursor.execute("SET SESSION unique_checks = 1")
+                cursor.execute("SET SESSION foreign_key_checks = 1")
+            except Exception:
+                pass
         conn.close()
 
+def build_parser():
+    parser = argparse.ArgumentParser(description="Sentetik okul verisi üretici (yük ve benchmark testleri için)")
+    parser.add_argument("--schools", type=int, default=1)
+    parser.add_argument("--students", type=int, default=2000, help="Okul başına öğrenci")
+    parser.add_argument("--teachers", type=int, default=100, help="Okul başına öğretmen")
+    parser.add_argument("--classes-per-grade", type=int, default=17)
+    parser.add_argument("--days", type=int, default=0, help="Geriye dönük yoklama geçmişi (gün)")
+    parser.add_argument("--attendance-rate", type=float, default=0.92)
+    parser.add_argument("--embeddings-per-student", type=int, default=0)
+    parser.add_argument("--model-name", default=None,
+                        help="Sentetik vektörlerin model etiketi (varsayılan: INFERENCE_BACKEND motorunun model_name değeri)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--load-data", action="store_true", help="Büyük tablolar için LOAD DATA LOCAL INFILE kullan")
+    parser.add_argument("--fast", action="store_true", help="Yükleme sırasında unique/foreign key kontrollerini kapat")
+    parser.add_argument("--keep-existing", action="store_true", help="Mevcut verileri silme")
+    return parser
+
 if __name__ == "__main__":
-    populate()
+    populate(build_parser().parse_args())
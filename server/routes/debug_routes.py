@@ -0,0 +1,41 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+from server.config.security import get_current_admin
+from server.utils import profiler
+
+router = APIRouter()
+
+@router.get("/profile", tags=["Debug"])
+def profile_worker(
+    seconds: float = Query(10.0, gt=0, le=profiler.MAX_PROFILE_SECONDS),
+    hz: int = Query(profiler.DEFAULT_SAMPLE_HZ, ge=1, le=1000),
+    format: str = Query("collapsed", pattern="^(collapsed|speedscope)$"),
+    current_user: dict = Depends(get_current_admin)
+):
+    """
+    Bu worker sürecini `seconds` saniye boyunca örnekleyerek profiller (Yöneticiler için).
+    Tüm thread'ler dahildir; sonuç collapsed-stack veya speedscope formatındadır.
+    Sync endpoint olduğu için threadpool'da çalışır ve event loop'u bloklamaz.
+    """
+    try:
+        capture = profiler.sample_stacks(seconds, hz)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if format == "speedscope":
+        return profiler.to_speedscope(capture)
+    return PlainTextResponse(profiler.to_collapsed(capture))
+
+@router.get("/memory", tags=["Debug"])
+def memory_usage(
+    top: int = Query(25, ge=1, le=200),
+    keep: bool = Query(False, description="Raporu aldıktan sonra tracemalloc'u açık bırak"),
+    current_user: dict = Depends(get_current_admin)
+):
+    """
+    tracemalloc en büyük ayırmaları ve önbellek/model boyutları (Yöneticiler için).
+    tracemalloc her ayırmayı yavaşlattığı için varsayılan olarak kapalıdır:
+    `keep=true` ile başlatılır ve açık kalır; sonraki normal çağrı o andan
+    itibaren yapılan ayırmaları raporlar ve izlemeyi durdurur.
+    """
+    return profiler.memory_report(top=top, keep_tracing=keep)
@@ -1,12 +1,18 @@
-from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, UploadFile, File
 from pydantic import BaseModel
 from typing import Optional, Union
-from server.controllers import student_controller
+from server.controllers import student_controller, import_controller
 from server.config.security import get_current_user, get_current_admin
 import json
+import shutil
+import tempfile
 import numpy as np
 
+# Yüz vektörü üreten endpoint'ler (fotoğraf kaydı, toplu içe aktarma) gömme
+# modelini yükler; bu yüzden `inference_router` üzerindedir ve SERVER_ROLE=api
+# süreçleri modeli hiç tutmaz. Geri kalanı düz CRUD olarak `router` üzerindedir.
 router = APIRouter()
+inference_router = APIRouter()
 
 class StudentModel(BaseModel):
     full_name: str
@@ -18,6 +24,10 @@ class StudentModel(BaseModel):
     tc_no: Optional[str] = None
     birth_date: Optional[str] = None
 
+class StudentFacesModel(BaseModel):
+    photos: Optional[list[str]] = None
+    photo_url: Optional[str] = None
+
 class StudentUpdateModel(BaseModel):
     full_name: Optional[str] = None
     student_id: Optional[Union[str, int]] = None
@@ -64,16 +74,8 @@ def add_new_student(student: StudentModel, background_tasks: BackgroundTasks, cu
     if student.tc_no and len(student.tc_no) > 11:
         raise HTTPException(status_code=400, detail="TC Kimlik No 11 haneden uzun olamaz")
 
-    # Compute face encoding if photo is provided
+    # Fotoğraflardan yüz verisi POST /{student_id}/faces ile (inference rolü) çıkarılır
     encoding_json = student.face_encoding
-    if not encoding_json and student.photo_url:
-        try:
-            from server.utils import face_utils
-            encoding = face_utils.get_face_encoding_from_base64(student.photo_url)
-            if encoding:
-                encoding_json = json.dumps(encoding)
-        except Exception:
-            pass
 
     # Split full name
     parts = student.full_name.strip().split(" ")
@@ -93,19 +95,12 @@ def add_new_student(student: StudentModel, background_tasks: BackgroundTasks, cu
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result["message"])
     
-    quality_summary = None
-    if encoding_json and (not student.photos or len(student.photos) == 0):
+    if encoding_json:
         try:
             student_controller._insert_face_embedding(student.student_id, json.loads(encoding_json), "enrollment")
-            student_controller._upsert_face_profile(student.student_id, encoding_json, 1)
+            student_controller._refresh_face_profile(student.student_id)
         except Exception:
             pass
-    if student.photos and len(student.photos) > 0:
-        quality_summary = student_controller.process_student_photos(student.student_id, student.photos)
-
-        
-    if quality_summary:
-        result["quality_summary"] = quality_summary
     return result
 
 @router.put("/{student_id}", tags=["Students"])
@@ -128,30 +123,8 @@ def update_student(student_id: int, student: StudentUpdateModel, current_user: d
         data['first_name'] = " ".join(parts) if parts else data['full_name']
         del data['full_name']
 
-    # If photo is updated, update encoding
-    if 'photo_url' in data and 'face_encoding' not in data:
-        if data['photo_url']:
-            try:
-                from server.utils import face_utils
-                encoding = face_utils.get_face_encoding_from_base64(data['photo_url'])
-                if encoding:
-                    data['face_encoding'] = json.dumps(encoding)
-            except Exception:
-                pass
-        else:
-             # Photo removed? Maybe remove encoding too?
-             pass
-
-    # Process multiple photos if provided
-    quality_summary = None
-    if student.photos and len(student.photos) > 0:
-        # Use the new ID if being updated, otherwise the existing one
-        target_id = data.get('student_id', student_id)
-        quality_summary = student_controller.process_student_photos(target_id, student.photos)
-
+    # Yeni fotoğraflar POST /{student_id}/faces ile (inference rolü) işlenir
     result = student_controller.update_student(student_id, data)
-    if quality_summary:
-        result["quality_summary"] = quality_summary
     
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result["message"])
@@ -171,3 +144,51 @@ def delete_student(student_id: int, current_user: dict = Depends(get_current_adm
     if not result["success"]:
         raise HTTPException(status_code=400, detail=result["message"])
     return result
+
+@inference_router.post("/import", tags=["Students"])
+def import_students(
+    roster: UploadFile = File(...),
+    photos: UploadFile = File(...),
+    current_user: dict = Depends(get_current_admin)
+):
+    """
+    Toplu öğrenci içe aktarma (CSV liste + person_<id>/ klasörlü ZIP arşivi).
+    Öğrenciler hemen eklenir; yüz verileri arka planda çıkarılır.
+    """
+    school_id = current_user.get("school_id")
+    if not school_id:
+        raise HTTPException(status_code=400, detail="Yönetici bir okula ait olmalıdır")
+
+    # Keep the archive as a single file for the job; members are read one by one
+    tmp = tempfile.NamedTemporaryFile(prefix="student-import-", suffix=".zip", delete=False)
+    with tmp:
+        shutil.copyfileobj(photos.file, tmp, length=1024 * 1024)
+
+    return import_controller.start_import(school_id, roster.file.read(), tmp.name)
+
+@inference_router.get("/import/{job_id}", tags=["Students"])
+def get_import_status(job_id: str, current_user: dict = Depends(get_current_admin)):
+    """Toplu içe aktarma işinin ilerleme durumunu getir"""
+    job = import_controller.get_import_job(job_id, current_user.get("school_id"))
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+@inference_router.post("/{student_id}/faces", tags=["Students"])
+def enroll_student_faces(student_id: int, faces: StudentFacesModel, current_user: dict = Depends(get_current_admin)):
+    """
+    Öğrenci fotoğraflarından yüz verisi çıkar ve kaydet (Yöneticiler için).
+    `photos` ve/veya `photo_url` base64 resim olmalıdır; kalite özeti döner.
+    """
+    existing = student_controller.get_student_by_id(student_id)
+    if not existing:
+        raise HTTPException(status_code=404, detail="Öğrenci bulunamadı")
+
+    if existing['school_id'] != current_user.get('school_id'):
+        raise HTTPException(status_code=403, detail="Yetkisiz erişim")
+
+    photos = list(faces.photos or [])
+    if faces.photo_url:
+        photos.append(faces.photo_url)
+    quality_summary = student_controller.process_student_photos(student_id, photos)
+    return {"success": True, "quality_summary": quality_summary}
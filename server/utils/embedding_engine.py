@@ -0,0 +1,289 @@
+"""
+Pluggable face embedding engines.
+
+Every embedding the system stores or searches (enrollment, bulk import,
+student photo_url, scans, active learning, offline extraction) comes from
+get_engine(), so exactly one model is resident per process. Each stored
+vector is tagged with the engine's model_name; face_cache only searches
+vectors that match the active model.
+
+Select the engine with INFERENCE_BACKEND (default "deepface", "onnx" or
+"stub"). New backends subclass EmbeddingEngine and call register_engine().
+"""
+import os
+import threading
+import time
+import numpy as np
+
+# Inference backend: "deepface" (default), "onnx" or "stub" (fixed latency, no model; for load tests)
+INFERENCE_BACKEND = os.environ.get("INFERENCE_BACKEND", "deepface")
+STUB_INFERENCE_LATENCY_MS = float(os.environ.get("STUB_INFERENCE_LATENCY_MS", "30"))
+
+# ONNX Runtime backend (model exported by: python -m server.ml.export_onnx)
+BASE_ML_OUTPUT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ml", "output")
+ONNX_MODEL_PATH = os.environ.get("ONNX_MODEL_PATH", os.path.join(BASE_ML_OUTPUT, "facenet.onnx"))
+ONNX_INT8 = os.environ.get("ONNX_INT8", "0") == "1"
+ONNX_INTRA_OP_THREADS = int(os.environ.get("ONNX_INTRA_OP_THREADS", "0"))  # 0 = ONNX Runtime default
+FACENET_INPUT_SIZE = 160
+
+# Rows written before model_name was recorded are NULL and never searched until
+# server.ml.migrate_embedding_tags tags them: Facenet rows get their model name,
+# legacy dlib vectors get this one. No engine uses it, so they stay quarantined.
+DLIB_EMBEDDING_MODEL = "dlib"
+
+class EmbeddingEngine:
+    """
+    Contract: represent(img, detector=None) takes a BGR uint8 image and returns
+    a list of (embedding as list of floats, box as (top, right, bottom, left)),
+    one entry per detected face, or [] when no face is found. With a detector
+    (see face_detectors) boxes come from it and only the crops are embedded;
+    without one the engine uses its own detection path.
+    """
+    name = "base"
+    model_name = None
+    dim = 128
+
+    def load(self):
+        """Load weights eagerly (startup warmup). Must be idempotent."""
+
+    def represent(self, img, detector=None):
+        if detector is None:
+            return self._represent_native(img)
+        try:
+            boxes = detector.detect(img)
+        except Exception as e:
+            print(f"DEBUG: {detector.name} detector error: {e}")
+            return []
+        if not boxes:
+            return []
+        try:
+            embeddings = self.embed_faces(img, boxes)
+        except FileNotFoundError:
+            raise
+        except Exception as e:
+            # One bad crop (DeepFace/cv2 error, empty region) costs this frame, not a 500
+            print(f"DEBUG: {self.name} embedding error: {e}")
+            return []
+        return [(list(map(float, emb)), box) for emb, box in zip(embeddings, boxes)]
+
+    def _represent_native(self, img):
+        raise NotImplementedError
+
+    def embed_faces(self, img, boxes):
+        """One embedding per (top, right, bottom, left) box of img."""
+        raise NotImplementedError
+
+class DeepFaceEngine(EmbeddingEngine):
+    name = "deepface"
+    model_name = "Facenet"
+    detector_backend = "opencv"
+
+    def _deepface(self):
+        # Imported on first use: pulling in TensorFlow costs seconds and hundreds of MB
+        from deepface import DeepFace
+        return DeepFace
+
+    def load(self):
+        self._keras_model()
+
+    def _keras_model(self):
+        # build_model caches the model; older DeepFace returns the Keras model itself
+        model = self._deepface().build_model(self.model_name)
+        return getattr(model, "model", model)
+
+    # Context kept around a detected box so DeepFace can re-find and align the face
+    crop_margin = 0.25
+
+    def embed_faces(self, img, boxes):
+        """
+        Cut each box (plus margin) out of img at its native resolution and let
+        DeepFace detect + align inside that small crop only (the plain crop
+        when the face is not re-detected). The aligned faces are letterboxed
+        like DeepFace.represent does and embedded in one Facenet forward pass.
+        """
+        DeepFace = self._deepface()
+        h, w = img.shape[:2]
+        faces = []
+        for top, right, bottom, left in boxes:
+            my = int((bottom - top) * self.crop_margin)
+            mx = int((right - left) * self.crop_margin)
+            crop = img[max(0, top - my):min(h, bottom + my), max(0, left - mx):min(w, right + mx)]
+            objs = DeepFace.extract_faces(
+                img_path=crop,
+                detector_backend=self.detector_backend,
+                enforce_detection=False,
+                align=True
+            )
+            best = max(objs, key=lambda o: o["facial_area"]["w"] * o["facial_area"]["h"])
+            # extract_faces returns RGB in [0, 1]; Facenet was fed BGR by represent
+            faces.append(letterbox(best["face"][:, :, ::-1]))
+        batch = np.stack(faces).astype(np.float32)
+        return self._keras_model()(batch, training=False).numpy()
+
+    def _represent_native(self, img):
+        try:
+            # detector_backend='opencv' is faster for real-time video
+            embedding_objs = self._deepface().represent(
+                img_path=img,
+                model_name=self.model_name,
+                detector_backend=self.detector_backend,
+                enforce_detection=True,
+                align=True
+            )
+
+            result = []
+            for obj in embedding_objs:
+                # DeepFace area: {'x': int, 'y': int, 'w': int, 'h': int}
+                # Convert to (top, right, bottom, left) for compatibility
+                area = obj["facial_area"]
+                x, y, w, h = area['x'], area['y'], area['w'], area['h']
+                result.append((obj["embedding"], (y, x + w, y + h, x)))
+            return result
+        except ValueError:
+            # DeepFace raises ValueError if face not detected with enforce_detection=True
+            return []
+        except Exception as e:
+            print(f"DEBUG: DeepFace error: {e}")
+            return []
+
+class StubEngine(EmbeddingEngine):
+    """
+    Fixed-latency stand-in for detection + embedding. Returns one centered face
+    with an embedding derived from the frame content, so identical frames map
+    to identical vectors. Lets load tests measure the web and DB layers alone.
+    """
+    name = "stub"
+    model_name = "stub"
+
+    def _thumb_embedding(self, img):
+        import cv2
+        thumb = cv2.resize(img, (16, 8), interpolation=cv2.INTER_AREA).astype(np.float32).reshape(-1)
+        return thumb[:128] - thumb[:128].mean()
+
+    def _represent_native(self, img):
+        time.sleep(STUB_INFERENCE_LATENCY_MS / 1000.0)
+        h, w = img.shape[:2]
+        box = (int(h * 0.25), int(w * 0.75), int(h * 0.75), int(w * 0.25))
+        return [(self._thumb_embedding(img).tolist(), box)]
+
+    def embed_faces(self, img, boxes):
+        time.sleep(STUB_INFERENCE_LATENCY_MS / 1000.0)
+        return [self._thumb_embedding(img[t:b, l:r]) for t, r, b, l in boxes]
+
+def int8_model_path(model_path):
+    root, ext = os.path.splitext(model_path)
+    return f"{root}.int8{ext}"
+
+def letterbox(face, size=FACENET_INPUT_SIZE):
+    """Scale a face to fit size x size keeping its aspect ratio, zero-padded (DeepFace's resize)."""
+    import cv2
+    ch, cw = face.shape[:2]
+    factor = min(size / ch, size / cw)
+    resized = cv2.resize(face, (max(1, int(cw * factor)), max(1, int(ch * factor))))
+    out = np.zeros((size, size, 3), dtype=np.float32)
+    dy = (size - resized.shape[0]) // 2
+    dx = (size - resized.shape[1]) // 2
+    out[dy:dy + resized.shape[0], dx:dx + resized.shape[1]] = resized
+    return out
+
+def preprocess_face(img, box, size=FACENET_INPUT_SIZE):
+    """
+    Crop a (top, right, bottom, left) box and letterbox it to size x size,
+    scaled to [0, 1] in BGR order -- the same input DeepFace feeds Facenet.
+    """
+    top, right, bottom, left = box
+    h, w = img.shape[:2]
+    crop = img[max(0, int(top)):min(h, int(bottom)), max(0, int(left)):min(w, int(right))]
+    return letterbox(crop, size) / 255.0
+
+class OnnxFacenetEngine(EmbeddingEngine):
+    """
+    Facenet exported to ONNX, run by ONNX Runtime on CPU. No TensorFlow import.
+    Without an explicit detector, faces are found with OpenCV's Haar cascade at
+    full resolution (DeepFace's "opencv" detector) and letterboxed like
+    DeepFace, without eye alignment. ONNX_INT8=1 runs the dynamically
+    quantized copy of the model. Same weights as DeepFaceEngine, but the
+    preprocessing (no alignment) and int8 quantization change the vectors, so
+    they are tagged "Facenet-onnx" / "Facenet-onnx-int8" and never mixed with
+    TensorFlow vectors. Students are re-embedded when a deployment switches
+    over; ONNX_MODEL_NAME overrides the tag only after
+    benchmarks/onnx_parity_benchmark shows the vectors are interchangeable.
+    """
+    name = "onnx"
+
+    def __init__(self, model_path=None, int8=None, intra_op_threads=None):
+        self.model_path = model_path or ONNX_MODEL_PATH
+        self.int8 = ONNX_INT8 if int8 is None else int8
+        self.model_name = os.environ.get("ONNX_MODEL_NAME") or (
+            "Facenet-onnx-int8" if self.int8 else "Facenet-onnx"
+        )
+        self.intra_op_threads = ONNX_INTRA_OP_THREADS if intra_op_threads is None else intra_op_threads
+        self._session = None
+        self._input_name = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        if self._session is not None:
+            return
+        with self._lock:
+            if self._session is not None:
+                return
+            import onnxruntime as ort
+            path = int8_model_path(self.model_path) if self.int8 else self.model_path
+            if not os.path.exists(path):
+                raise FileNotFoundError(f"ONNX model not found at {path}. Run: python -m server.ml.export_onnx")
+            options = ort.SessionOptions()
+            if self.intra_op_threads:
+                options.intra_op_num_threads = self.intra_op_threads
+            options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+            session = ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+            self._input_name = session.get_inputs()[0].name
+            self._session = session
+
+    def embed_batch(self, faces):
+        """(N, 160, 160, 3) preprocessed faces -> (N, 128) float32 embeddings."""
+        self.load()
+        batch = np.ascontiguousarray(faces, dtype=np.float32)
+        return self._session.run(None, {self._input_name: batch})[0]
+
+    def embed_faces(self, img, boxes):
+        return self.embed_batch(np.stack([preprocess_face(img, box) for box in boxes]))
+
+    def _represent_native(self, img):
+        from server.utils.face_detectors import get_detector
+        try:
+            return self.represent(img, detector=get_detector("haar", 0))
+        except FileNotFoundError:
+            raise
+        except Exception as e:
+            print(f"DEBUG: ONNX Runtime error: {e}")
+            return []
+
+_ENGINES = {
+    DeepFaceEngine.name: DeepFaceEngine,
+    OnnxFacenetEngine.name: OnnxFacenetEngine,
+    StubEngine.name: StubEngine,
+}
+_engine = None
+_engine_lock = threading.Lock()
+
+def register_engine(engine_cls):
+    _ENGINES[engine_cls.name] = engine_cls
+
+def available_engines():
+    return sorted(_ENGINES)
+
+def get_engine():
+    """The process-wide engine selected by INFERENCE_BACKEND (created on first use)."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                engine_cls = _ENGINES.get(INFERENCE_BACKEND)
+                if engine_cls is None:
+                    raise ValueError(f"Unknown INFERENCE_BACKEND '{INFERENCE_BACKEND}' (available: {available_engines()})")
+                _engine = engine_cls()
+    return _engine
+
+def active_model_name():
+    return get_engine().model_name
@@ -0,0 +1,144 @@
+"""
+CPU face detector backends.
+
+Each detector resizes the frame so its longest side is `input_size` (0 keeps
+the original resolution), detects there and maps boxes back to the frame, so
+callers always get (top, right, bottom, left) in original-image pixels.
+
+    haar   OpenCV Haar cascade (what DeepFace's "opencv" detector uses)
+    yunet  OpenCV FaceDetectorYN (YuNet ONNX model, OpenCV >= 4.8)
+    ssd    OpenCV DNN ResNet-10 SSD (res10_300x300 Caffe model)
+
+Model files for yunet/ssd live in ml/output/detectors (override with
+YUNET_MODEL_PATH / SSD_PROTOTXT_PATH / SSD_MODEL_PATH).
+"""
+import os
+import threading
+import numpy as np
+
+DETECTOR_MODEL_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "ml", "output", "detectors")
+YUNET_MODEL_PATH = os.environ.get("YUNET_MODEL_PATH", os.path.join(DETECTOR_MODEL_DIR, "face_detection_yunet_2023mar.onnx"))
+SSD_PROTOTXT_PATH = os.environ.get("SSD_PROTOTXT_PATH", os.path.join(DETECTOR_MODEL_DIR, "deploy.prototxt"))
+SSD_MODEL_PATH = os.environ.get("SSD_MODEL_PATH", os.path.join(DETECTOR_MODEL_DIR, "res10_300x300_ssd_iter_140000.caffemodel"))
+
+class FaceDetector:
+    name = "base"
+    default_input_size = 0
+    model_files = ()  # files that must exist before the detector can run
+
+    def __init__(self, input_size=None, score_threshold=None):
+        self.input_size = self.default_input_size if input_size is None else int(input_size)
+        self.score_threshold = score_threshold
+        # cv2 detector objects are not safe to share between threads
+        self._local = threading.local()
+
+    def _resize(self, img):
+        """Returns (resized image, scale from resized back to original)."""
+        import cv2
+        h, w = img.shape[:2]
+        if not self.input_size or max(h, w) <= self.input_size:
+            return img, 1.0
+        factor = self.input_size / float(max(h, w))
+        small = cv2.resize(img, (max(1, int(w * factor)), max(1, int(h * factor))), interpolation=cv2.INTER_AREA)
+        return small, 1.0 / factor
+
+    def detect(self, img):
+        small, scale = self._resize(img)
+        h, w = img.shape[:2]
+        boxes = []
+        for x, y, bw, bh in self._detect_xywh(small):
+            top = max(0, int(round(y * scale)))
+            left = max(0, int(round(x * scale)))
+            bottom = min(h, int(round((y + bh) * scale)))
+            right = min(w, int(round((x + bw) * scale)))
+            if bottom > top and right > left:
+                boxes.append((top, right, bottom, left))
+        return boxes
+
+    def _detect_xywh(self, img):
+        raise NotImplementedError
+
+class HaarDetector(FaceDetector):
+    name = "haar"
+    default_input_size = 640
+
+    def _detect_xywh(self, img):
+        import cv2
+        cascade = getattr(self._local, "cascade", None)
+        if cascade is None:
+            cascade = cv2.CascadeClassifier(cv2.data.haarcascades + "haarcascade_frontalface_default.xml")
+            self._local.cascade = cascade
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        return cascade.detectMultiScale(gray, scaleFactor=1.1, minNeighbors=10)
+
+class YuNetDetector(FaceDetector):
+    name = "yunet"
+    default_input_size = 320
+    model_files = (YUNET_MODEL_PATH,)
+
+    def _detect_xywh(self, img):
+        import cv2
+        h, w = img.shape[:2]
+        net = getattr(self._local, "net", None)
+        if net is None:
+            if not os.path.exists(YUNET_MODEL_PATH):
+                raise FileNotFoundError(f"YuNet model not found at {YUNET_MODEL_PATH}")
+            net = cv2.FaceDetectorYN.create(YUNET_MODEL_PATH, "", (w, h), self.score_threshold or 0.8, 0.3, 50)
+            self._local.net = net
+        net.setInputSize((w, h))
+        _, faces = net.detect(img)
+        if faces is None:
+            return []
+        return [tuple(f[:4]) for f in faces]
+
+class SsdDetector(FaceDetector):
+    name = "ssd"
+    default_input_size = 300
+    model_files = (SSD_PROTOTXT_PATH, SSD_MODEL_PATH)
+
+    def _detect_xywh(self, img):
+        import cv2
+        net = getattr(self._local, "net", None)
+        if net is None:
+            if not (os.path.exists(SSD_PROTOTXT_PATH) and os.path.exists(SSD_MODEL_PATH)):
+                raise FileNotFoundError(f"SSD model not found at {SSD_MODEL_PATH}")
+            net = cv2.dnn.readNetFromCaffe(SSD_PROTOTXT_PATH, SSD_MODEL_PATH)
+            self._local.net = net
+        h, w = img.shape[:2]
+        blob = cv2.dnn.blobFromImage(img, 1.0, (300, 300), (104.0, 177.0, 123.0))
+        net.setInput(blob)
+        detections = net.forward()[0, 0]
+        threshold = self.score_threshold or 0.5
+        out = []
+        for det in detections[detections[:, 2] >= threshold]:
+            x1, y1, x2, y2 = np.clip(det[3:7], 0.0, 1.0) * np.array([w, h, w, h])
+            out.append((x1, y1, x2 - x1, y2 - y1))
+        return out
+
+_DETECTORS = {
+    HaarDetector.name: HaarDetector,
+    YuNetDetector.name: YuNetDetector,
+    SsdDetector.name: SsdDetector,
+}
+_instances = {}
+_instances_lock = threading.Lock()
+
+def available_detectors():
+    return sorted(_DETECTORS)
+
+def missing_model_files(name):
+    """Model files of a backend that are not on disk ([] when it can run)."""
+    return [path for path in _DETECTORS[name].model_files if not os.path.exists(path)]
+
+def get_detector(name, input_size=None):
+    """Shared detector instance per (backend, input size)."""
+    key = (name, input_size)
+    detector = _instances.get(key)
+    if detector is None:
+        if name not in _DETECTORS:
+            raise ValueError(f"Unknown face detector '{name}' (available: {available_detectors()})")
+        with _instances_lock:
+            detector = _instances.get(key)
+            if detector is None:
+                detector = _instances[key] = _DETECTORS[name](input_size)
+    return detector
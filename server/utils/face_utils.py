@@ -3,11 +3,19 @@ warnings.filterwarnings("ignore", category=UserWarning, message="pkg_resources i
 warnings.filterwarnings("ignore", category=UserWarning, module="face_recognition_models")
 import numpy as np
 import base64
-import cv2
 import json
 import os
 import pickle
-from deepface import DeepFace
+import threading
+import time
+from server.utils import metrics
+from server.utils.embedding_engine import get_engine, active_model_name, INFERENCE_BACKEND
+
+# Two-resolution scan pipeline: detect on a reduced JPEG decode whose longest
+# side is at least DETECTION_MAX_SIDE, embed crops from the full-resolution frame.
+# Faces must cover >= 4% of the frame (quality gate), so they stay large enough.
+TWO_RES_DETECTION = os.environ.get("TWO_RES_DETECTION", "1") == "1"
+DETECTION_MAX_SIDE = int(os.environ.get("DETECTION_MAX_SIDE", "640"))
 
 # Global loaded model variables
 _face_recognizer = None
@@ -30,54 +38,72 @@ def predict_face_from_base64(base64_string, threshold=0.5):
     """
     return None, 0.0
 
+def decode_image_bytes(data):
+    """Encoded JPEG/PNG bytes -> BGR image, or None if they cannot be decoded."""
+    cv2 = _import_cv2()
+    return cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+
+def decode_base64_bytes(base64_string):
+    # Remove header if present (e.g., "data:image/jpeg;base64,")
+    if "," in base64_string:
+        base64_string = base64_string.split(",")[1]
+    return base64.b64decode(base64_string)
+
 def decode_base64_image(base64_string):
     try:
-        # Remove header if present (e.g., "data:image/jpeg;base64,")
-        if "," in base64_string:
-            base64_string = base64_string.split(",")[1]
-            
-        image_bytes = base64.b64decode(base64_string)
-        nparr = np.frombuffer(image_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-        return img
+        return decode_image_bytes(decode_base64_bytes(base64_string))
     except Exception as e:
         print(f"Hata: Base64 resim çözülemedi: {e}")
         return None
 
-def _import_fr():
-    try:
-        import face_recognition as fr
-        return fr
-    except (ImportError, ModuleNotFoundError):
-        print("Hata: 'face_recognition' kütüphanesi kurulu değil. Lütfen 'pip install face_recognition' komutu ile kurun.")
-        return None
-    except Exception as e:
-        print(f"Hata: 'face_recognition' kütüphanesi yüklenirken beklenmedik bir hata oluştu: {e}")
-        return None
+def decode_for_detection(image_bytes, max_side=DETECTION_MAX_SIDE):
+    """
+    Returns (full-resolution image, detection image). The detection image is
+    decoded with libjpeg DCT scaling (IMREAD_REDUCED_COLOR_2/4/8), choosing the
+    largest factor that keeps its longest side >= max_side; it is the full
+    image itself when no reduction applies.
+    """
+    cv2 = _import_cv2()
+    full = decode_image_bytes(image_bytes)
+    if full is None:
+        return None, None
+    longest = max(full.shape[:2])
+    for factor, flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4), (2, cv2.IMREAD_REDUCED_COLOR_2)):
+        if longest / factor >= max_side:
+            small = cv2.imdecode(np.frombuffer(image_bytes, np.uint8), flag)
+            if small is not None:
+                return full, small
+            break
+    return full, full
+
+def scale_boxes(boxes, from_shape, to_shape):
+    """Map (top, right, bottom, left) boxes between two resolutions of the same frame."""
+    sy = to_shape[0] / float(from_shape[0])
+    sx = to_shape[1] / float(from_shape[1])
+    h, w = to_shape[:2]
+    out = []
+    for top, right, bottom, left in boxes:
+        out.append((
+            max(0, int(round(top * sy))), min(w, int(round(right * sx))),
+            min(h, int(round(bottom * sy))), max(0, int(round(left * sx)))
+        ))
+    return out
+
+def _import_cv2():
+    # Imported on first use so CRUD-only workers never load OpenCV
+    import cv2
+    return cv2
 
 def get_face_encoding_from_base64(base64_string):
+    """Embedding (list) of the first face in the image, from the active engine."""
     img = decode_base64_image(base64_string)
     if img is None:
         return None
-        
-    # Convert from BGR (OpenCV) to RGB (face_recognition)
-    rgb_img = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    
-    # Find face locations first (faster)
-    fr = _import_fr()
-    if fr is None:
-        return None
-    face_locations = fr.face_locations(rgb_img)
-    if not face_locations:
+    pairs = get_face_encodings_and_boxes_from_image(img)
+    if not pairs:
         return None
-        
-    # Get encodings
-    encodings = fr.face_encodings(rgb_img, face_locations)
-    if encodings:
-        # Convert numpy array to list for JSON serialization
-        return encodings[0].tolist()
-        
-    return None
+    emb = pairs[0][0]
+    return emb.tolist() if isinstance(emb, np.ndarray) else list(emb)
 
 def recognize_face_from_base64(base64_string, known_encodings_dict, tolerance=0.5):
     unknown_encoding_list = get_face_encoding_from_base64(base64_string)
@@ -87,16 +113,13 @@ def recognize_face_from_base64(base64_string, known_encodings_dict, tolerance=0.
     unknown_encoding = np.array(unknown_encoding_list)
     
     known_ids = list(known_encodings_dict.keys())
-    known_encodings = [np.array(enc) for enc in known_encodings_dict.values()]
+    known_encodings = [l2_normalize(enc) for enc in known_encodings_dict.values()]
     
     if not known_encodings:
         return None
         
-    # Compare faces
-    fr = _import_fr()
-    if fr is None:
-        return None
-    distances = fr.face_distance(known_encodings, unknown_encoding)
+    # Compare faces (euclidean distance between L2-normalized embeddings)
+    distances = np.linalg.norm(np.stack(known_encodings) - l2_normalize(unknown_encoding), axis=1)
     min_distance_index = np.argmin(distances)
     min_distance = distances[min_distance_index]
     
@@ -107,41 +130,129 @@ def recognize_face_from_base64(base64_string, known_encodings_dict, tolerance=0.
         
     return None
 
-def get_face_encodings_and_boxes_from_base64(base64_string):
-    img = decode_base64_image(base64_string)
-    if img is None:
-        return []
-    
+def get_face_encodings_and_boxes_from_base64(base64_string, detector=None):
+    """
+    [(embedding, (top, right, bottom, left)), ...] for every face in the image.
+    `detector` is a face_detectors instance; None uses the engine's own detector
+    (Haar in two-resolution mode). Boxes are always in original-frame pixels.
+    """
     try:
-        # Use DeepFace with Facenet model
-        # detector_backend='opencv' is faster for real-time video
-        embedding_objs = DeepFace.represent(
-            img_path=img,
-            model_name="Facenet",
-            detector_backend="opencv",
-            enforce_detection=True,
-            align=True
-        )
-        
-        result = []
-        for obj in embedding_objs:
-            embedding = obj["embedding"]
-            # DeepFace area: {'x': int, 'y': int, 'w': int, 'h': int}
-            # Convert to (top, right, bottom, left) for compatibility
-            area = obj["facial_area"]
-            x, y, w, h = area['x'], area['y'], area['w'], area['h']
-            box = (y, x + w, y + h, x)
-            
-            result.append((embedding, box))
-            
-        return result
-    except ValueError as ve:
-        # DeepFace raises ValueError if face not detected with enforce_detection=True
-        # print(f"DEBUG: Face detection failed (ValueError): {ve}")
-        return []
+        image_bytes = decode_base64_bytes(base64_string)
     except Exception as e:
-        print(f"DEBUG: DeepFace error: {e}")
+        print(f"Hata: Base64 resim çözülemedi: {e}")
+        return []
+    return get_face_encodings_and_boxes_from_bytes(image_bytes, detector)
+
+def get_face_encodings_and_boxes_from_bytes(image_bytes, detector=None, quality_path=None):
+    """
+    Same as the base64 variant, for encoded JPEG/PNG bytes. With quality_path
+    (metrics label, e.g. "scan") faces failing the ROI quality gate are
+    dropped before the embedding model runs.
+    """
+    return get_gated_encodings_and_boxes_from_bytes(image_bytes, detector, quality_path)[0]
+
+def get_gated_encodings_and_boxes_from_bytes(image_bytes, detector=None, quality_path=None):
+    """
+    Returns (encodings and boxes, number of faces dropped by the quality gate),
+    so callers can tell "no face" apart from "faces, all too poor to embed".
+    """
+    with metrics.stage("decode"):
+        try:
+            if TWO_RES_DETECTION:
+                full, small = decode_for_detection(image_bytes)
+            else:
+                full = small = decode_image_bytes(image_bytes)
+        except Exception as e:
+            print(f"Hata: Resim çözülemedi: {e}")
+            return [], 0
+    if full is None:
+        return [], 0
+    if not TWO_RES_DETECTION and not quality_path:
+        return get_face_encodings_and_boxes_from_image(full, detector), 0
+    return _two_res_gated(full, small, detector, quality_path)
+
+def get_face_encodings_and_boxes_two_res(full, small, detector=None, quality_path=None):
+    """Detect on `small`, embed the matching crops of `full` (same frame, any two resolutions)."""
+    return _two_res_gated(full, small, detector, quality_path)[0]
+
+def _two_res_gated(full, small, detector=None, quality_path=None):
+    boxes = detect_faces_two_res(full, small, detector)
+    detected = len(boxes)
+    if boxes and quality_path:
+        boxes = filter_quality(full, boxes, quality_path)
+    if not boxes:
+        return [], detected
+    return list(zip(embed_faces(full, boxes), boxes)), detected - len(boxes)
+
+def detect_faces_two_res(full, small, detector=None):
+    """Boxes found on `small`, in `full` pixel coordinates. Haar when no detector is given."""
+    if detector is None:
+        from server.utils.face_detectors import get_detector
+        detector = get_detector("haar", 0)
+    with metrics.stage("detect"):
+        try:
+            boxes = detector.detect(small)
+        except Exception as e:
+            print(f"Hata: Yüz algılama başarısız ({detector.name}): {e}")
+            return []
+    if boxes and small is not full:
+        boxes = scale_boxes(boxes, small.shape, full.shape)
+    return boxes
+
+def detect_faces_from_bytes(image_bytes, detector=None):
+    """
+    Detection only, for callers that decide per face whether to embed
+    (face tracker). Returns (full-resolution image or None, boxes).
+    """
+    with metrics.stage("decode"):
+        try:
+            if TWO_RES_DETECTION:
+                full, small = decode_for_detection(image_bytes)
+            else:
+                full = small = decode_image_bytes(image_bytes)
+        except Exception as e:
+            print(f"Hata: Resim çözülemedi: {e}")
+            return None, []
+    if full is None:
+        return None, []
+    return full, detect_faces_two_res(full, small, detector)
+
+def detect_faces(img, detector=None):
+    """Boxes in img (single resolution); Haar when no detector is given."""
+    return detect_faces_two_res(img, img, detector)
+
+def embed_faces(img, boxes):
+    """Embeddings (lists) for the given boxes of img, from the active engine."""
+    if not boxes:
         return []
+    with metrics.stage("embed"):
+        try:
+            embeddings = get_engine().embed_faces(img, boxes)
+        except FileNotFoundError:
+            # Missing model file: a deployment error, not a bad frame
+            raise
+        except Exception as e:
+            print(f"Hata: Yüz vektörü çıkarılamadı: {e}")
+            return []
+    return [list(map(float, emb)) for emb in embeddings]
+
+def get_face_encodings_and_boxes_from_image(img, detector=None):
+    """Same as the base64 variant, for callers that already hold a decoded BGR image."""
+    with metrics.stage("detect_embed"):
+        return _detect_and_embed(img, detector)
+
+def warmup():
+    """
+    Load OpenCV and the embedding model now instead of on the first scan.
+    Called at startup by inference workers; returns the seconds it took.
+    """
+    start = time.perf_counter()
+    _import_cv2()
+    get_engine().load()
+    return time.perf_counter() - start
+
+def _detect_and_embed(img, detector=None):
+    return get_engine().represent(img, detector)
 
 def predict_from_embedding(embedding, threshold=0.5):
     global _face_recognizer, _class_names
@@ -183,50 +294,95 @@ def l2_normalize(v):
     return v / (norm + 1e-8)
 
 def get_face_encoding_from_image_path(image_path):
+    cv2 = _import_cv2()
     img = cv2.imread(image_path)
     if img is None:
         return None
-    rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-    fr = _import_fr()
-    if fr is None:
+    pairs = get_face_encodings_and_boxes_from_image(img)
+    if not pairs:
         return None
-    boxes = fr.face_locations(rgb)
-    if not boxes:
-        return None
-    encs = fr.face_encodings(rgb, boxes)
-    if len(encs) == 0:
-        return None
-    return encs[0]
+    return np.asarray(pairs[0][0])
 
-def is_face_quality_ok(img, box):
+# Quality gate applied to the face ROI before it is embedded
+QUALITY_MIN_AREA_RATIO = 0.04   # face box / frame area
+QUALITY_MIN_BLUR = 80.0         # variance of the Laplacian
+QUALITY_MIN_BRIGHTNESS = 40.0   # mean gray level (0-255)
+QUALITY_MAX_BRIGHTNESS = 215.0
+
+# Per-thread scratch buffers: the gray ROI and its Laplacian are written into
+# these instead of allocating new arrays for every face
+_quality_buffers = threading.local()
+
+def _scratch(name, size, dtype):
+    buf = getattr(_quality_buffers, name, None)
+    if buf is None or buf.size < size:
+        buf = np.empty(max(size, 1), dtype=dtype)
+        setattr(_quality_buffers, name, buf)
+    return buf[:size]
+
+def _face_roi_gray(img, box):
+    """
+    Crop the face box (clamped to the frame) and convert only that region to
+    grayscale. The result is a view of this thread's scratch buffer, valid
+    until the next call.
+    """
+    cv2 = _import_cv2()
     top, right, bottom, left = box
     h, w = img.shape[:2]
-    fh = bottom - top
-    fw = right - left
-    if fh <= 0 or fw <= 0:
-        return False
-    face_area_ratio = (fh * fw) / (w * h + 1e-8)
-    if face_area_ratio < 0.04:
-        return False
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    blur = cv2.Laplacian(gray, cv2.CV_64F).var()
-    if blur < 80.0:
-        return False
-    brightness = float(np.mean(gray))
-    if brightness < 40 or brightness > 215:
-        return False
-    return True
+    top, bottom = max(0, int(top)), min(h, int(bottom))
+    left, right = max(0, int(left)), min(w, int(right))
+    if bottom <= top or right <= left:
+        return None
+    roi = img[top:bottom, left:right]
+    gray = _scratch("gray", roi.shape[0] * roi.shape[1], np.uint8).reshape(roi.shape[:2])
+    cv2.cvtColor(roi, cv2.COLOR_BGR2GRAY, dst=gray)
+    return gray
 
 def get_quality_metrics(img, box):
+    """Size, blur and brightness of one face, measured on its ROI only."""
+    cv2 = _import_cv2()
     top, right, bottom, left = box
     h, w = img.shape[:2]
     fh = bottom - top
     fw = right - left
+    if fh <= 0 or fw <= 0:
+        return {"area_ratio": 0.0, "blur": 0.0, "brightness": 0.0}
     area_ratio = (fh * fw) / (w * h + 1e-8)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    blur = float(cv2.Laplacian(gray, cv2.CV_64F).var())
-    brightness = float(np.mean(gray))
-    return {"area_ratio": float(area_ratio), "blur": float(blur), "brightness": float(brightness)}
+    gray = _face_roi_gray(img, box)
+    if gray is None:
+        return {"area_ratio": float(area_ratio), "blur": 0.0, "brightness": 0.0}
+    lap = _scratch("laplacian", gray.size, np.float64).reshape(gray.shape)
+    cv2.Laplacian(gray, cv2.CV_64F, dst=lap)
+    blur = float(cv2.meanStdDev(lap)[1][0][0] ** 2)
+    brightness = float(cv2.mean(gray)[0])
+    return {"area_ratio": float(area_ratio), "blur": blur, "brightness": brightness}
+
+def face_quality_reason(quality):
+    """Reject reason for get_quality_metrics output, or None if the face is usable."""
+    if quality["area_ratio"] < QUALITY_MIN_AREA_RATIO:
+        return "face_too_small"
+    if quality["blur"] < QUALITY_MIN_BLUR:
+        return "blurry"
+    if quality["brightness"] < QUALITY_MIN_BRIGHTNESS:
+        return "too_dark"
+    if quality["brightness"] > QUALITY_MAX_BRIGHTNESS:
+        return "too_bright"
+    return None
+
+def check_face_quality(img, box, path):
+    """(reject reason or None, quality metrics); counted per path in metrics."""
+    with metrics.stage("quality"):
+        quality = get_quality_metrics(img, box)
+    reason = face_quality_reason(quality)
+    metrics.FACE_QUALITY_CHECKS.inc(path=path, result=reason or "ok")
+    return reason, quality
+
+def filter_quality(img, boxes, path):
+    """Boxes whose face passes the quality gate; the rest are never embedded."""
+    return [box for box in boxes if check_face_quality(img, box, path)[0] is None]
+
+def is_face_quality_ok(img, box):
+    return face_quality_reason(get_quality_metrics(img, box)) is None
 
 def best_match_by_cosine(embedding, known_enc_dict):
     if not known_enc_dict:
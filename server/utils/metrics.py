@@ -0,0 +1,206 @@
+"""
+Minimal in-process Prometheus metrics (text exposition format 0.0.4).
+
+Counters, gauges and histograms are plain Python objects guarded by a lock;
+observing a value is a dict lookup plus a bisect, so instrumenting the hot
+scan path costs microseconds. render() is served at GET /metrics.
+"""
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Tuned for the scan path: 0.5 ms (cache hit) .. 10 s (cold model load)
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_registry = []
+_registry_lock = threading.Lock()
+
+def _label_key(labelnames, labels):
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+def _format_labels(labelnames, key, extra=None):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(labelnames, key)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(self.labelnames, labels), 0)
+
+    def collect(self):
+        lines = self._header()
+        with self._lock:
+            items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Gauge(_Metric):
+    """Either set() explicitly or computed at scrape time from a callback."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+        self._callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(self.labelnames, labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def collect(self):
+        lines = self._header()
+        if self._callback is not None:
+            try:
+                result = self._callback()
+            except Exception:
+                result = None
+            if isinstance(result, dict):
+                # { label_value or (label_values...): value }
+                items = [(tuple(str(x) for x in (k if isinstance(k, tuple) else (k,))), v) for k, v in result.items()]
+            elif result is not None:
+                items = [((), result)]
+            else:
+                items = []
+        else:
+            with self._lock:
+                items = list(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+
+    def observe(self, value, **labels):
+        key = _label_key(self.labelnames, labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][idx] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def collect(self):
+        lines = self._header()
+        with self._lock:
+            items = [(k, (list(s[0]), s[1], s[2])) for k, s in self._series.items()]
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (float("inf"),), counts):
+                cumulative += c
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+def render():
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.collect())
+    return "\n".join(lines) + "\n"
+
+# ----------------------------------------------------
+# Application metrics
+# ----------------------------------------------------
+
+STAGE_SECONDS = Histogram(
+    "attendance_stage_seconds",
+    "Latency of each attendance pipeline stage in seconds.",
+    ["stage"]
+)
+DECISIONS = Counter(
+    "attendance_decisions_total",
+    "Per-frame recognition outcomes (accept, reject, unknown, pending).",
+    ["decision"]
+)
+FACE_CACHE_REQUESTS = Counter(
+    "face_cache_requests_total",
+    "Face encoding cache lookups by result (hit, miss).",
+    ["result"]
+)
+FACE_CACHE_REBUILDS = Counter(
+    "face_cache_rebuilds_total",
+    "Face encoding cache rebuilds from the database."
+)
+FACE_QUALITY_CHECKS = Counter(
+    "face_quality_checks_total",
+    "Face ROI quality checks before embedding by path (scan, enrollment) and result (ok or reject reason).",
+    ["path", "result"]
+)
+DB_CONNECT_SECONDS = Histogram(
+    "db_connect_seconds",
+    "Time to open a database connection in seconds."
+)
+DB_CONNECTIONS = Counter(
+    "db_connections_total",
+    "Database connection attempts by result (ok, error).",
+    ["result"]
+)
+
+@contextmanager
+def stage(name):
+    """Time a block as one pipeline stage."""
+    with STAGE_SECONDS.time(stage=name):
+        yield
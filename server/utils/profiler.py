@@ -0,0 +1,233 @@
+"""
+On-demand diagnostics for a live worker process.
+
+sample_stacks() is a statistical profiler: the calling thread reads
+sys._current_frames() at a fixed rate and counts identical stacks for every
+other thread, including the Starlette/AnyIO worker threads that run sync endpoints
+such as scan_face. Nothing is instrumented, so overhead exists only while a
+capture is running.
+
+memory_report() returns tracemalloc top allocations plus sizes of the
+long-lived recognition state (face cache, decision sessions, loaded models).
+tracemalloc only runs when a caller explicitly keeps it on between two reports.
+"""
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter as StackCounter
+
+MAX_PROFILE_SECONDS = 60
+DEFAULT_SAMPLE_HZ = 100
+_profile_lock = threading.Lock()
+
+def _frame_label(frame):
+    code = frame.f_code
+    return code.co_name, code.co_filename, frame.f_lineno
+
+def _stack_of(frame):
+    """Root-first list of (function, file, line)."""
+    stack = []
+    while frame is not None:
+        stack.append(_frame_label(frame))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+def sample_stacks(seconds, hz=DEFAULT_SAMPLE_HZ):
+    """
+    Sample every other thread's stack for `seconds`. Returns a dict whose
+    "stacks" entry maps (thread_name, stack) -> count. Raises RuntimeError
+    if another capture is already running in this process.
+    """
+    if not _profile_lock.acquire(blocking=False):
+        raise RuntimeError("Profiler already running")
+    try:
+        seconds = max(0.1, min(float(seconds), MAX_PROFILE_SECONDS))
+        interval = 1.0 / max(1, hz)
+        counts = StackCounter()
+        me = threading.get_ident()
+        samples = 0
+        deadline = time.perf_counter() + seconds
+        next_tick = time.perf_counter()
+        while True:
+            now = time.perf_counter()
+            if now >= deadline:
+                break
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                counts[(names.get(ident, f"thread-{ident}"), _stack_of(frame))] += 1
+            samples += 1
+            next_tick += interval
+            time.sleep(max(0.0, next_tick - time.perf_counter()))
+        return {"seconds": seconds, "hz": hz, "samples": samples, "interval": interval, "stacks": counts}
+    finally:
+        _profile_lock.release()
+
+def to_collapsed(capture):
+    """Brendan Gregg collapsed-stack format (flamegraph.pl / speedscope / inferno)."""
+    lines = []
+    for (thread, stack), count in sorted(capture["stacks"].items(), key=lambda kv: -kv[1]):
+        frames = [thread.replace(";", ":").replace(" ", "_")]
+        frames += [f"{fn} ({os.path.basename(path)}:{line})".replace(";", ":") for fn, path, line in stack]
+        lines.append(f"{';'.join(frames)} {count}")
+    return "\n".join(lines) + "\n"
+
+def to_speedscope(capture, name="attendance-worker"):
+    """speedscope.app file format, one sampled profile per thread."""
+    frame_index = {}
+    frames = []
+    per_thread = {}
+    for (thread, stack), count in capture["stacks"].items():
+        idx = []
+        for fn, path, line in stack:
+            key = (fn, path, line)
+            if key not in frame_index:
+                frame_index[key] = len(frames)
+                frames.append({"name": fn, "file": path, "line": line})
+            idx.append(frame_index[key])
+        entry = per_thread.setdefault(thread, {"samples": [], "weights": []})
+        entry["samples"].append(idx)
+        entry["weights"].append(count * capture["interval"])
+    profiles = []
+    for thread, entry in sorted(per_thread.items()):
+        profiles.append({
+            "type": "sampled",
+            "name": thread,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(entry["weights"]),
+            "samples": entry["samples"],
+            "weights": entry["weights"],
+        })
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "shared": {"frames": frames},
+        "profiles": profiles,
+        "name": name,
+        "exporter": "server.utils.profiler",
+    }
+
+def _rss_bytes():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        # ru_maxrss is KB on Linux, bytes on macOS (peak, not current)
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except Exception:
+        return None
+
+def _nbytes(value):
+    nbytes = getattr(value, "nbytes", None)
+    if nbytes is not None:
+        return int(nbytes)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(_nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+def _face_cache_report():
+    from server.controllers.attendance import face_cache
+    schools = {}
+    for school_id, entry in list(face_cache.encodings_cache.items()):
+        data = entry.get("data", {})
+        legacy = data.get("legacy_dict", {})
+        index = data.get("faiss_index")
+        cascade = data.get("cascade")
+        if cascade is not None:
+            index_bytes = sum(cascade.memory_bytes().values())
+        else:
+            index_bytes = int(index.ntotal * index.d * 4) if index is not None else 0
+        schools[str(school_id)] = {
+            "students": len(legacy),
+            "legacy_bytes": sum(_nbytes(v) for v in legacy.values()),
+            "index_bytes": index_bytes,
+            "last_updated": str(entry.get("last_updated")),
+        }
+    return {
+        "schools": schools,
+        "total_bytes": sum(s["legacy_bytes"] + s["index_bytes"] for s in schools.values()),
+    }
+
+def _temporal_report():
+    from server.controllers.attendance import decision_engine
+    return {
+        "sessions": decision_engine.sessions.stats(),
+        "identity_profiles": len(decision_engine.identity_profiles),
+    }
+
+def _models_report():
+    """Which heavy ML modules are imported, and Keras models found in DeepFace's cache."""
+    heavy = ["tensorflow", "keras", "deepface", "face_recognition", "dlib", "cv2", "faiss", "onnxruntime"]
+    report = {"imported_modules": [m for m in heavy if m in sys.modules], "models": []}
+    modeling = sys.modules.get("deepface.modules.modeling")
+    cache = getattr(modeling, "cached_models", None) or getattr(modeling, "model_obj", None)
+    if isinstance(cache, dict):
+        for task, models in cache.items():
+            items = models.items() if isinstance(models, dict) else [(task, models)]
+            for model_name, model in items:
+                keras_model = getattr(model, "model", model)
+                params = None
+                if hasattr(keras_model, "count_params"):
+                    try:
+                        params = int(keras_model.count_params())
+                    except Exception:
+                        pass
+                report["models"].append({
+                    "name": str(model_name),
+                    "params": params,
+                    "approx_bytes": params * 4 if params else None,
+                })
+    return report
+
+def memory_report(top=25, keep_tracing=False):
+    """
+    tracemalloc top allocations (by line) plus recognition state sizes.
+    Tracing slows every allocation, so it only runs between a call with
+    keep_tracing=True (which starts it) and the next call without it (which
+    reports the allocations made in between and stops it). Allocations made
+    before tracing started are not attributed.
+    """
+    tracing = tracemalloc.is_tracing()
+    if not tracing and keep_tracing:
+        tracemalloc.start(10)
+    allocations = []
+    traced = None
+    if tracemalloc.is_tracing():
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        for stat in snapshot.statistics("lineno")[:top]:
+            frame = stat.traceback[0]
+            allocations.append({
+                "location": f"{frame.filename}:{frame.lineno}",
+                "size_bytes": stat.size,
+                "count": stat.count,
+            })
+        current, peak = tracemalloc.get_traced_memory()
+        traced = {"current_bytes": current, "peak_bytes": peak}
+        if not keep_tracing:
+            tracemalloc.stop()
+
+    return {
+        "rss_bytes": _rss_bytes(),
+        "tracemalloc": {
+            "was_tracing": tracing,
+            "tracing": tracemalloc.is_tracing(),
+            "traced": traced,
+            "top_allocations": allocations,
+        },
+        "face_cache": _face_cache_report(),
+        "decision_state": _temporal_report(),
+        "models": _models_report(),
+    }